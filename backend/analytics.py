@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from database import db
+from models import User, Course, Enrollment
+import daily_metrics
+
+# Windows the admin dashboard can ask for. Anything else falls back to 30.
+ALLOWED_WINDOWS = (7, 30, 90, 365)
+DEFAULT_WINDOW = 30
+
+
+def parse_window(raw):
+    try:
+        days = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_WINDOW
+    return days if days in ALLOWED_WINDOWS else DEFAULT_WINDOW
+
+
+def _bucket_for(days):
+    # A year of daily points is unreadable on the chart - roll up to weeks.
+    return 'week' if days > 90 else 'day'
+
+
+def _bucket_starts(days, bucket):
+    """Every bucket start in the window, oldest first, so days with no
+    activity still show up on the chart as zero."""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    first = today - timedelta(days=days - 1)
+    if bucket == 'week':
+        # Postgres date_trunc('week') starts weeks on Monday
+        first = first - timedelta(days=first.weekday())
+        step = timedelta(days=7)
+    else:
+        step = timedelta(days=1)
+    starts = []
+    cur = first
+    while cur <= today:
+        starts.append(cur)
+        cur += step
+    return first, starts
+
+
+def _series(rows, starts, value_key, cast=int):
+    by_bucket = {r[0].replace(tzinfo=None): r[1] for r in rows if r[0] is not None}
+    return [{
+        "date": s.strftime('%b %d'),
+        value_key: cast(by_bucket.get(s) or 0)
+    } for s in starts]
+
+
+def _live_courses_filter():
+    return (Course.is_deleted == False) | (Course.is_deleted == None)
+
+
+def user_growth(days, bucket=None):
+    bucket = bucket or _bucket_for(days)
+    since, starts = _bucket_starts(days, bucket)
+    return _series(daily_metrics.bucketed('signups', since, bucket), starts, "users")
+
+
+def revenue_series(days, bucket=None):
+    bucket = bucket or _bucket_for(days)
+    since, starts = _bucket_starts(days, bucket)
+    return _series(daily_metrics.bucketed('revenue', since, bucket), starts, "revenue", cast=float)
+
+
+def course_performance():
+    """Live courses joined (in Python) with their all-time rollup totals."""
+    totals = daily_metrics.per_course_totals()
+    courses = db.session.query(Course.id, Course.title).filter(_live_courses_filter()).all()
+
+    output = []
+    for course_id, title in courses:
+        total_enr, completed, revenue = totals.get(course_id, (0, 0, 0.0))
+        output.append({
+            "title": title,
+            "enrolled": total_enr,
+            "completed": completed,
+            "completion_rate": round(completed / total_enr * 100, 1) if total_enr > 0 else 0,
+            "revenue": revenue
+        })
+    output.sort(key=lambda x: x['enrolled'], reverse=True)
+    return output
+
+
+def funnel_and_key_metrics():
+    total_registered = db.session.query(func.count(User.id))\
+        .filter(User.is_admin == False, User.is_deleted == False).scalar() or 0
+    total_courses = db.session.query(func.count(Course.id))\
+        .filter(Course.is_deleted == False).scalar() or 0
+
+    # Per-user rollup in a subquery, then a single pass over it for every
+    # enrollment-derived counter the dashboard shows.
+    per_user = db.session.query(
+        Enrollment.user_id.label('user_id'),
+        func.count(Enrollment.course_id).label('courses'),
+        func.max(case((Enrollment.progress == 0, 1), else_=0)).label('has_unstarted'),
+        func.max(case(((Enrollment.progress > 0) & (Enrollment.status != 'completed'), 1), else_=0)).label('has_in_progress'),
+    ).group_by(Enrollment.user_id).subquery()
+
+    total_paid, bundle_buyers, never_started, never_completed = db.session.query(
+        func.count(per_user.c.user_id),
+        func.coalesce(func.sum(case((per_user.c.courses >= total_courses, 1), else_=0)), 0),
+        func.coalesce(func.sum(per_user.c.has_unstarted), 0),
+        func.coalesce(func.sum(per_user.c.has_in_progress), 0),
+    ).one()
+
+    total_revenue = daily_metrics.total_revenue()
+
+    return {
+        "total_registered": total_registered,
+        "total_paid": int(total_paid or 0),
+        "bundle_buyers": int(bundle_buyers or 0),
+        "purchased_never_started": int(never_started or 0),
+        "started_never_completed": int(never_completed or 0),
+        "total_revenue": total_revenue,
+    }
+
+
+def build_admin_analytics(days=DEFAULT_WINDOW):
+    """Everything /api/admin/analytics returns, in a fixed number of grouped
+    queries no matter how wide the window is."""
+    m = funnel_and_key_metrics()
+    total_registered = m["total_registered"]
+    total_paid = m["total_paid"]
+    bundle_buyers = m["bundle_buyers"]
+    total_revenue = m["total_revenue"]
+
+    return {
+        "window_days": days,
+        "funnel": [
+            { "stage": "Registered", "count": total_registered, "pct": 100 },
+            { "stage": "Purchased", "count": total_paid, "pct": round(total_paid / total_registered * 100, 1) if total_registered > 0 else 0 },
+            { "stage": "Bundle Buyers", "count": bundle_buyers, "pct": round(bundle_buyers / total_registered * 100, 1) if total_registered > 0 else 0 },
+        ],
+        "conversion_rate": round((total_paid / total_registered * 100), 1) if total_registered > 0 else 0,
+        "bundle_rate": round((bundle_buyers / total_paid * 100), 1) if total_paid > 0 else 0,
+        "growth": user_growth(days),
+        "revenue_chart": revenue_series(days),
+        "course_performance": course_performance(),
+        "key_metrics": {
+            "never_purchased": total_registered - total_paid,
+            "purchased_never_started": m["purchased_never_started"],
+            "started_never_completed": m["started_never_completed"],
+            "total_revenue": total_revenue,
+            "avg_revenue_per_user": round(total_revenue / total_paid, 2) if total_paid > 0 else 0
+        }
+    }
@@ -1,32 +1,56 @@
-from flask import Flask, jsonify, request, send_from_directory, redirect
-from openai import OpenAI
+from flask import Flask, jsonify, request, send_file, send_from_directory, redirect, g
 from datetime import datetime, timedelta
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
 from dotenv import load_dotenv
+
+# Load environment variables - before the local imports below, whose
+# tunables (and cert_ids' signing key) are read from the environment
+load_dotenv()
+
 from flask_migrate import Migrate
-from models import User, Course, Enrollment, ContactMessage, AuditLog, SystemSetting, FlaggedPayment
+from models import User, Course, Enrollment, ContactMessage, AuditLog, FlaggedPayment, RoleplaySession, StripeEvent, Payment
 from database import db
+from analytics import build_admin_analytics, parse_window, revenue_series
+import daily_metrics
+from enrollments import grant_courses, owned_course_ids, rebuild_owned_courses, record_paid_checkout
+from auth import admin_required, current_user, init_auth, issue_token, revoke_tokens
+from email_outbox import enqueue_email, start_email_workers
+import stripe_events
+import stripe_sessions
+from pagination import keyset_args, date_range_args, keyset_page, page_rows, paged_response, NEXT_CURSOR_HEADER
+from course_cache import bump_course_version, catalog_response, curriculum_response
+import llm
+import chat_cache
+import roleplay
+import hot_queries
+import pricing
+import payments
+import progress
+import system_metrics
+import system_settings
+import certificates
+import cert_ids
+import scorm
 from sqlalchemy import func
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_mail import Mail, Message
-import threading
 import resend 
 import os
+import sys
 import uuid
 import stripe
 import time
-import psutil
-from collections import defaultdict
+from rate_limit import RateLimiter, rate_limited
 
-# --- LOGIN RATE LIMITER ---
-# Tracks failed login attempts per IP: {ip: [timestamp, ...]}
-_login_attempts = defaultdict(list)
+# --- RATE LIMITERS ---
+# Shared across gunicorn workers (see rate_limit.py), keyed per client IP.
 LOGIN_MAX_ATTEMPTS = 5
 LOGIN_WINDOW_SECONDS = 1800  # 30 minute lockout window
-
-# Load environment variables
-load_dotenv() 
+login_limiter = RateLimiter('login', LOGIN_MAX_ATTEMPTS, LOGIN_WINDOW_SECONDS)
+forgot_password_limiter = RateLimiter('forgot_password', 5, 3600)
+contact_limiter = RateLimiter('contact', 5, 3600)
+chat_limiter = RateLimiter('chat', 20, 60)
 
 # ==========================================
 # 1. INITIALIZATION & CONFIGURATION
@@ -79,26 +103,13 @@ app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY", "fallback-secret-key"
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
 
 # --- API KEYS ---
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+stripe_sessions.configure_stripe()
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 resend.api_key = os.getenv("RESEND_API_KEY")
 
 # --- DOMAIN ---
 DOMAIN = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
-# --- STRIPE PRICE IDs ---
-# Stable Price IDs per course for GTM conversion tracking.
-STRIPE_COURSE_PRICE_IDS = {
-    "AI for Human Resources / Talent / People Ops via Prompts": "price_1TYrRQLs3W3AEhCNuV7RiObK",
-    "Prompt-Based Tools for Education & Learning":              "price_1TYrSfLs3W3AEhCN2a836gZE",
-    "Prompting for Automation and Workflow Efficiency":         "price_1TYrUdLs3W3AEhCNA5UvTrOX",
-    "Prompt-Based Analytics and Reports for Business":          "price_1TYrUuLs3W3AEhCNN8I0FmJu",
-    "Prompt Engineering for Non-Profits and Social Impact":     "price_1TYrV9Ls3W3AEhCNZip5Qp33",
-    "Prompt-Based AI for Local Government and Public Services": "price_1TYrVPLs3W3AEhCNwxVxOzmU",
-}
-# Stable Product ID for Pro Bundle - dynamic price preserves discount logic
-STRIPE_BUNDLE_PRODUCT_ID = "prod_UXxT1JUivTu9Qt"
-
 # --- FILE PATHS ---
 app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'uploads')
 app.config['COURSES_FOLDER'] = os.path.join(app.static_folder, 'courses')
@@ -107,6 +118,29 @@ app.config['COURSES_FOLDER'] = os.path.join(app.static_folder, 'courses')
 db.init_app(app)
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
+init_auth(jwt)
+
+def init_background_workers(flask_app):
+    """Starts this web process's background threads. Called by the server -
+    gunicorn.conf.py's post_worker_init hook, or the __main__ block below -
+    never at import, so scripts that `from app import app` (flask db upgrade,
+    reset_db.py, render_certificates.py's process pool...) don't start
+    pollers against tables that may not exist yet."""
+    # Background email delivery. EMAIL_WORKER_MODE=process moves it out of the
+    # web workers entirely - run `python email_worker.py` alongside gunicorn.
+    if os.getenv('EMAIL_WORKER_MODE', 'thread') == 'thread':
+        start_email_workers(flask_app)
+
+    # Same for Stripe webhook events: STRIPE_EVENT_WORKER_MODE=process means run
+    # `python stripe_event_worker.py` alongside gunicorn instead.
+    if os.getenv('STRIPE_EVENT_WORKER_MODE', 'thread') == 'thread':
+        stripe_events.start_stripe_event_workers(flask_app)
+
+    # CPU/memory/DB/latency sampler for /api/admin/system-health
+    system_metrics.start_system_metrics(flask_app)
+
+    # Keeps this process's copy of the site settings current (LISTEN/NOTIFY)
+    system_settings.start_settings_listener(flask_app)
 
 # Create Folders
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -122,55 +156,29 @@ def health():
     return jsonify({"status": "awake"}), 200
 
 @app.route('/api/admin/system-health', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_system_health():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id)
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
-    # Database check + response time
-    db_start = time.time()
-    db_ok = False
-    try:
-        db.session.execute(db.text('SELECT 1'))
-        db_ok = True
-    except Exception:
-        db_ok = False
-    db_ms = round((time.time() - db_start) * 1000, 1)
-
-    # API response time (self-measured from this request start)
-    api_ms = round((time.time() - db_start) * 1000 + db_ms, 1)
-
-    # System metrics
-    try:
-        cpu = psutil.cpu_percent(interval=0.1)
-        mem = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        memory_pct = mem.percent
-        disk_pct = disk.percent
-    except Exception:
-        cpu = 0
-        memory_pct = 0
-        disk_pct = 0
-
-    # Total users and enrollments
-    total_users = User.query.filter_by(is_deleted=False).count()
-    total_enrollments = Enrollment.query.count()
-
-    # Stripe check - just verify key is set
-    stripe_ok = bool(os.getenv('STRIPE_SECRET_KEY'))
+    # Everything comes from the background sampler's ring buffer (see
+    # system_metrics.py) - nothing here blocks or scans tables
+    sample, history, counts = system_metrics.latest()
+    if sample is None:
+        # Sampler hasn't ticked yet in this process
+        sample = system_metrics.take_sample()
+        history = [sample]
+    if counts["total_users"] is None:
+        system_metrics.ensure_row_counts()
+        _, _, counts = system_metrics.latest()
 
     return jsonify({
-        "db_connected": db_ok,
-        "db_response_ms": db_ms,
-        "api_response_ms": api_ms,
-        "cpu_percent": cpu,
-        "memory_percent": memory_pct,
-        "disk_percent": disk_pct,
-        "stripe_active": stripe_ok,
-        "total_users": total_users,
-        "total_enrollments": total_enrollments,
-        "timestamp": datetime.utcnow().isoformat()
+        **sample,
+        # Stripe check - just verify key is set
+        "stripe_active": bool(os.getenv('STRIPE_SECRET_KEY')),
+        "total_users": counts["total_users"],
+        "total_enrollments": counts["total_enrollments"],
+        "chat_cache": chat_cache.stats(),
+        "cert_verify_cache": cert_ids.stats(),
+        "history": [{k: h[k] for k in ("timestamp", "cpu_percent", "memory_percent", "db_response_ms", "api_response_ms", "api_p95_ms", "requests")}
+                    for h in history],
     })
     try:
         pat = os.getenv('HASHNODE_PAT', '').strip()
@@ -196,6 +204,10 @@ def get_system_health():
 
 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
 @app.before_request
 def enforce_https():
     # OPTIONS preflight must pass through to Flask-CORS completely untouched
@@ -206,6 +218,32 @@ def enforce_https():
         url = request.url.replace('http://', 'https://', 1)
         return redirect(url, code=301)
 
+# Reachable during maintenance: the settings check itself, admin login, and
+# Stripe (events are only recorded, and must not be lost)
+MAINTENANCE_EXEMPT_PATHS = ('/api/health', '/api/settings', '/api/login', '/api/webhook')
+
+@app.before_request
+def maintenance_gate():
+    # In-memory flag - no database round-trip either way
+    if request.method == 'OPTIONS' or not request.path.startswith('/api/') or not system_settings.maintenance_on():
+        return None
+    if request.path in MAINTENANCE_EXEMPT_PATHS:
+        return None
+    try:
+        # Admins keep working; the token's is_admin claim is enough here
+        verify_jwt_in_request(optional=True)
+        if get_jwt().get('is_admin'):
+            return None
+    except Exception:
+        pass
+    return jsonify({"msg": "The site is down for maintenance. Please try again soon.", "maintenance": True}), 503
+
+@app.after_request
+def record_request_latency(response):
+    if 'request_started' in g:
+        system_metrics.record_request((time.perf_counter() - g.request_started) * 1000)
+    return response
+
 @app.after_request
 def add_cors_headers(response):
     # Belt-and-suspenders: ensure CORS headers are always present on every response
@@ -216,26 +254,31 @@ def add_cors_headers(response):
         response.headers['Access-Control-Allow-Credentials'] = 'true'
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        response.headers['Access-Control-Expose-Headers'] = NEXT_CURSOR_HEADER
     return response
 
 # ==========================================
 # 2. HELPER FUNCTIONS
 # ==========================================
 
-def send_email(to_email, subject, html_content, sender_name="AICourseHubPro", sender_email="info@aicoursehubpro.com"):
+def send_email(to_email, subject, html_content, sender_name="AICourseHubPro", sender_email="info@aicoursehubpro.com", dedup_key=None):
+    """Queues the email in the outbox - delivery (and retries) happen on the
+    background worker pool in email_outbox.py, never on the request thread.
+    Emails sharing a dedup_key are only ever sent once."""
     try:
-        r = resend.Emails.send({
-            "from": f"{sender_name} <{sender_email}>", 
-            "to": to_email,
-            "subject": subject,
-            "html": html_content
-        })
-        print(f"--- EMAIL SUCCESS: Sent to {to_email} ---", flush=True)
-        return True
+        return enqueue_email(to_email, subject, html_content, sender_name, sender_email, dedup_key=dedup_key)
     except Exception as e:
-        print(f"--- EMAIL ERROR: Failed to send to {to_email}: {e} ---", file=sys.stderr, flush=True)
+        print(f"--- EMAIL ERROR: Failed to queue email to {to_email}: {e} ---", file=sys.stderr, flush=True)
         return False
 
+def log_action(admin_email, action, details=""):
+    try:
+        db.session.add(AuditLog(admin_email=admin_email, action=action, details=details))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Audit log write failed: {e}", flush=True)
+
 def get_email_template(title, body_content, button_text=None, button_url=None):
     button_html = ""
     if button_text and button_url:
@@ -276,6 +319,9 @@ def signup():
         password = data.get('password')
         name = data.get('name')
 
+        if not system_settings.get('registrations'):
+            return jsonify({"msg": "Registrations are currently closed"}), 403
+
         if not email or not password or not name:
             return jsonify({"msg": "All fields are required"}), 400
 
@@ -295,6 +341,7 @@ def signup():
         )
         
         db.session.add(new_user)
+        daily_metrics.record_signup()
         db.session.commit()
         
         try:
@@ -309,7 +356,7 @@ def signup():
         try:
             html_body = f"""<p>Hello {name},</p><p>Welcome to AICourseHubPro! Your account has been created successfully.</p>"""
             email_content = get_email_template("Welcome! 🚀", html_body, "Login Now", f"{DOMAIN}/login")
-            send_email(email, "Welcome to AICourseHubPro!", email_content)
+            send_email(email, "Welcome to AICourseHubPro!", email_content, dedup_key=f"welcome:{user_id}" if user_id else None)
         except Exception as e:
             print(f"--- EMAIL WARNING: {e} ---")
 
@@ -321,40 +368,22 @@ def signup():
         return jsonify({"msg": "Signup failed on server", "error": str(e)}), 500
 
 @app.route('/api/login', methods=['POST'])
+@rate_limited(login_limiter, count_on=(401, 429), reset_on=(200, 403),
+              message="Account temporarily locked. Please try again in {minutes} minute(s).")
 def login():
     data = request.json
     email = data['email'].strip().lower()
     password = data['password']
 
-    # --- RATE LIMITING ---
-    ip = request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0].strip()
-    now = time.time()
-    attempts = _login_attempts[ip]
-
-    # If already at max attempts, check if lockout window has passed from FIRST attempt
-    if len(attempts) >= LOGIN_MAX_ATTEMPTS:
-        lockout_started = attempts[0]
-        if now - lockout_started < LOGIN_WINDOW_SECONDS:
-            remaining_secs = int(LOGIN_WINDOW_SECONDS - (now - lockout_started))
-            remaining_mins = max(1, remaining_secs // 60)
-            return jsonify({"msg": f"Account temporarily locked. Please try again in {remaining_mins} minute(s)."}), 429
-        else:
-            # Lockout window has fully expired — reset
-            _login_attempts[ip] = []
-
     user = User.query.filter_by(email=email).first()
     
-    # 1. Credential Check
+    # 1. Credential Check (only failed attempts count toward the lockout)
     if not user or not check_password_hash(user.password, password):
-        _login_attempts[ip].append(now)  # Record failed attempt
-        attempts_left = LOGIN_MAX_ATTEMPTS - len(_login_attempts[ip])
+        attempts_left = g.rate_limit_remaining - 1
         if attempts_left > 0:
             return jsonify({"msg": f"Incorrect credentials. {attempts_left} attempt(s) remaining."}), 401
         return jsonify({"msg": "Account temporarily locked. Please try again in 30 minutes."}), 429
 
-    # Successful login — clear failed attempts for this IP
-    _login_attempts[ip] = []
-
     # 2. Status Check
     if user.is_deleted:
         return jsonify({"msg": "Account deactivated"}), 403
@@ -372,7 +401,7 @@ def login():
         db.session.rollback()
 
     # 4. Token Generation
-    token = create_access_token(identity=str(user.id))
+    token = issue_token(user)
     role = "admin" if user.is_admin else "student"
     
     return jsonify({
@@ -387,6 +416,7 @@ def login():
 # ==========================================
 
 @app.route('/api/contact', methods=['POST'])
+@rate_limited(contact_limiter)
 def contact_form():
     data = request.json
     name = data.get('firstName', 'User')
@@ -412,34 +442,44 @@ def contact_form():
 # ==========================================
 
 @app.route('/api/users', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id) # FIXED: Modern syntax
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
-    users = User.query.filter_by(is_deleted=(request.args.get('type') == 'deleted')).order_by(User.id.desc()).all()
-    
-    return jsonify([{
+    # Keyset-paginated, filtered in SQL (see the users indexes migration):
+    #   ?email=   prefix match on lower(email)
+    #   ?name=    substring match on lower(name)
+    #   ?q=       either of the above - what the admin search box sends
+    #   ?signup_source=, ?status=banned|active
+    after_id, limit = keyset_args()
+    now = datetime.utcnow()
+    query = User.query.filter_by(is_deleted=(request.args.get('type') == 'deleted'))
+
+    email = (request.args.get('email') or '').strip().lower()
+    name = (request.args.get('name') or '').strip().lower()
+    q = (request.args.get('q') or '').strip().lower()
+    if email: query = query.filter(func.lower(User.email).startswith(email, autoescape=True))
+    if name: query = query.filter(func.lower(User.name).contains(name, autoescape=True))
+    if q:
+        query = query.filter(func.lower(User.email).startswith(q, autoescape=True) | func.lower(User.name).contains(q, autoescape=True))
+    if request.args.get('signup_source'): query = query.filter(User.signup_source == request.args['signup_source'])
+    if request.args.get('status') == 'banned': query = query.filter(User.ban_expiry > now)
+    elif request.args.get('status') == 'active': query = query.filter((User.ban_expiry == None) | (User.ban_expiry <= now))
+
+    users, has_more = keyset_page(query, User.id, after_id, limit)
+    return paged_response([{
         "id": u.id, "name": u.name, "email": u.email,
         "role": "Admin" if u.is_admin else "Student",
-        "status": "Banned" if u.ban_expiry and u.ban_expiry > datetime.utcnow() else "Active",
+        "status": "Banned" if u.ban_expiry and u.ban_expiry > now else "Active",
         "ban_expiry": str(u.ban_expiry) if u.ban_expiry else None,
         "account_setup_complete": bool(u.account_setup_complete),
         "signup_source": u.signup_source
-    } for u in users])
+    } for u in users], has_more)
 
 @app.route('/api/users/<int:user_id>/grant-course', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_grant_course(user_id):
     """Support tool: manually create an enrollment when a customer paid but
     never got unlocked (e.g. both the browser call and the webhook somehow
     failed for the same payment - rare, but this is the manual fallback)."""
-    admin_id = get_jwt_identity()
-    admin = db.session.get(User, admin_id)
-    if not admin or not admin.is_admin:
-        return jsonify({"msg": "Admin only"}), 403
-
     data = request.json or {}
     course_id = data.get('course_id')
     course = db.session.get(Course, course_id)
@@ -450,34 +490,23 @@ def admin_grant_course(user_id):
     if not target_user:
         return jsonify({"msg": "User not found"}), 404
 
-    if Enrollment.query.filter_by(user_id=user_id, course_id=course_id).first():
+    if not grant_courses(user_id, [course.id]):
         return jsonify({"msg": f"{target_user.name} already has access to {course.title}"}), 200
-
-    db.session.add(Enrollment(
-        user_id=user_id, course_id=course_id,
-        status='in-progress', progress=0,
-        enrolled_at=datetime.utcnow()
-    ))
     db.session.commit()
 
     return jsonify({"msg": f"Access to {course.title} granted to {target_user.name}"}), 200
 
 @app.route('/api/users/<int:user_id>/send-reset', methods=['POST'])
-@jwt_required()
+@admin_required
 def admin_send_reset(user_id):
     """Support tool: trigger the same password-reset email as the self-service
     Forgot Password form, on a customer's behalf - for 'I can't log in' support
     requests, works for guest accounts and full accounts alike."""
-    admin_id = get_jwt_identity()
-    admin = db.session.get(User, admin_id)
-    if not admin or not admin.is_admin:
-        return jsonify({"msg": "Admin only"}), 403
-
     target_user = db.session.get(User, user_id)
     if not target_user:
         return jsonify({"msg": "User not found"}), 404
 
-    token = create_access_token(identity=str(target_user.id), expires_delta=timedelta(minutes=15))
+    token = issue_token(target_user, expires_delta=timedelta(minutes=15))
     link = f"{DOMAIN}/reset-password?token={token}"
     body_content = f"""
     <p>Hi {target_user.name},</p>
@@ -501,22 +530,20 @@ def admin_send_reset(user_id):
     return jsonify({"msg": f"Password reset email sent to {target_user.email}"}), 200
 
 @app.route('/api/flagged-payments', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_flagged_payments():
     """Admin queue of 'paid for a course already owned' incidents needing manual
     refund review - populated by resolve_guest_checkout, never auto-refunded."""
-    admin_id = get_jwt_identity()
-    admin = db.session.get(User, admin_id)
-    if not admin or not admin.is_admin:
-        return jsonify({"msg": "Admin only"}), 403
-
     show_resolved = request.args.get('resolved') == 'true'
-    flags = FlaggedPayment.query.filter_by(resolved=show_resolved).order_by(FlaggedPayment.created_at.desc()).all()
+    after_id, limit = keyset_args()
+    start, end = date_range_args()
 
+    rows, has_more = page_rows(hot_queries.flagged_payments(
+        show_resolved, after_id, limit, start, end,
+        course_id=request.args.get('course_id', type=int), email=request.args.get('email')
+    ), limit)
     output = []
-    for f in flags:
-        user = db.session.get(User, f.user_id)
-        course = db.session.get(Course, f.course_id)
+    for f, user, course in rows:
         output.append({
             "id": f.id,
             "user_name": user.name if user else "Unknown",
@@ -528,18 +555,13 @@ def get_flagged_payments():
             "resolved": f.resolved,
             "resolved_at": str(f.resolved_at) if f.resolved_at else None
         })
-    return jsonify(output), 200
+    return paged_response(output, has_more), 200
 
 @app.route('/api/flagged-payments/<int:flag_id>/resolve', methods=['POST'])
-@jwt_required()
+@admin_required
 def resolve_flagged_payment(flag_id):
     """Admin marks a flagged duplicate-payment as handled, after refunding it
     manually in Stripe Dashboard. Doesn't touch Stripe itself - just tracking."""
-    admin_id = get_jwt_identity()
-    admin = db.session.get(User, admin_id)
-    if not admin or not admin.is_admin:
-        return jsonify({"msg": "Admin only"}), 403
-
     flag = db.session.get(FlaggedPayment, flag_id)
     if not flag:
         return jsonify({"msg": "Flagged payment not found"}), 404
@@ -571,18 +593,15 @@ def update_profile():
     return jsonify({"msg": "Profile updated successfully", "name": user.name, "account_setup_complete": bool(user.account_setup_complete)})
 
 @app.route('/api/users/<int:user_id>/ban', methods=['POST'])
-@jwt_required()
+@admin_required
 def ban_user(user_id):
-    current_user_id = get_jwt_identity()
-    admin = db.session.get(User, current_user_id) # FIXED
-    if not admin or not admin.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     user = db.session.get(User, user_id) # FIXED
     if not user: return jsonify({"msg": "User not found"}), 404
     
     days = request.json.get('days')
     if days:
         user.ban_expiry = datetime.utcnow() + timedelta(days=int(days))
+        revoke_tokens(user)  # log them out everywhere, not just block the next login
         msg = f"User banned for {days} days"
     else:
         user.ban_expiry = None
@@ -592,30 +611,16 @@ def ban_user(user_id):
     return jsonify({"msg": msg})
 
 @app.route('/api/admin/stats', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_admin_stats():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id) # FIXED
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
-    total_revenue = db.session.query(func.sum(Course.price))\
-        .join(Enrollment, Course.id == Enrollment.course_id).scalar() or 0.0
+    total_revenue = daily_metrics.total_revenue()
 
     total_students = User.query.filter_by(is_admin=False, is_deleted=False).count()
     total_courses = Course.query.filter_by(is_deleted=False).count()
 
-    chart_data = []
-    end_date = datetime.utcnow()
-    for i in range(6, -1, -1):
-        day = end_date - timedelta(days=i)
-        day_revenue = db.session.query(func.sum(Course.price))\
-            .join(Enrollment, Course.id == Enrollment.course_id)\
-            .filter(func.date(Enrollment.enrolled_at) == day.date())\
-            .scalar() or 0
-        chart_data.append({ "name": day.strftime('%b %d'), "revenue": float(day_revenue) })
-
-    recent_msgs = ContactMessage.query.filter_by(is_read=False)\
-        .order_by(ContactMessage.created_at.desc()).limit(5).all()
+    chart_data = [{ "name": p["date"], "revenue": p["revenue"] } for p in revenue_series(7)]
+
+    recent_msgs = hot_queries.unread_messages().all()
     
     messages_preview = [{
         "id": m.id, "name": m.name, "subject": m.subject, "time": m.created_at.strftime('%H:%M')
@@ -631,104 +636,16 @@ def get_admin_stats():
     })
 
 @app.route('/api/admin/analytics', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_admin_analytics():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id)
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
-    # --- CONVERSION FUNNEL ---
-    total_registered = User.query.filter_by(is_admin=False, is_deleted=False).count()
-    enrolled_user_ids = db.session.query(Enrollment.user_id).distinct().all()
-    total_paid = len(enrolled_user_ids)
-    # Count users enrolled in all 6 courses (bundle equivalent)
-    total_courses = Course.query.filter_by(is_deleted=False).count()
-    bundle_buyers = db.session.query(Enrollment.user_id)\
-        .group_by(Enrollment.user_id)\
-        .having(func.count(Enrollment.course_id) >= total_courses).count()
-
-    conversion_rate = round((total_paid / total_registered * 100), 1) if total_registered > 0 else 0
-    bundle_rate = round((bundle_buyers / total_paid * 100), 1) if total_paid > 0 else 0
-
-    funnel = [
-        { "stage": "Registered", "count": total_registered, "pct": 100 },
-        { "stage": "Purchased", "count": total_paid, "pct": round(total_paid / total_registered * 100, 1) if total_registered > 0 else 0 },
-        { "stage": "Bundle Buyers", "count": bundle_buyers, "pct": round(bundle_buyers / total_registered * 100, 1) if total_registered > 0 else 0 },
-    ]
-
-    # --- USER GROWTH (last 30 days) ---
-    growth = []
-    for i in range(29, -1, -1):
-        day = datetime.utcnow() - timedelta(days=i)
-        count = User.query.filter(
-            User.is_admin == False,
-            User.is_deleted == False,
-            func.date(User.created_at) == day.date()
-        ).count()
-        growth.append({ "date": day.strftime('%b %d'), "users": count })
-
-    # --- REVENUE CHART (last 30 days, real data) ---
-    revenue_chart = []
-    for i in range(29, -1, -1):
-        day = datetime.utcnow() - timedelta(days=i)
-        day_revenue = db.session.query(func.sum(Course.price))\
-            .join(Enrollment, Course.id == Enrollment.course_id)\
-            .filter(func.date(Enrollment.enrolled_at) == day.date())\
-            .scalar() or 0
-        revenue_chart.append({ "date": day.strftime('%b %d'), "revenue": float(day_revenue) })
-
-    # --- COURSE PERFORMANCE ---
-    courses = Course.query.filter_by(is_deleted=False).all()
-    course_performance = []
-    for c in courses:
-        enrollments = Enrollment.query.filter_by(course_id=c.id).all()
-        total_enr = len(enrollments)
-        completed = len([e for e in enrollments if e.status == 'completed'])
-        completion_rate = round(completed / total_enr * 100, 1) if total_enr > 0 else 0
-        revenue = total_enr * c.price
-        course_performance.append({
-            "title": c.title,
-            "enrolled": total_enr,
-            "completed": completed,
-            "completion_rate": completion_rate,
-            "revenue": revenue
-        })
-    course_performance.sort(key=lambda x: x['enrolled'], reverse=True)
-
-    # --- KEY METRICS ---
-    never_purchased = total_registered - total_paid
-    purchased_never_started = db.session.query(Enrollment.user_id).filter(Enrollment.progress == 0).distinct().count()
-    started_never_completed = db.session.query(Enrollment.user_id).filter(
-        Enrollment.progress > 0, Enrollment.status != 'completed'
-    ).distinct().count()
-
-    total_revenue = db.session.query(func.sum(Course.price))\
-        .join(Enrollment, Course.id == Enrollment.course_id).scalar() or 0
-
-    return jsonify({
-        "funnel": funnel,
-        "conversion_rate": conversion_rate,
-        "bundle_rate": bundle_rate,
-        "growth": growth,
-        "revenue_chart": revenue_chart,
-        "course_performance": course_performance,
-        "key_metrics": {
-            "never_purchased": never_purchased,
-            "purchased_never_started": purchased_never_started,
-            "started_never_completed": started_never_completed,
-            "total_revenue": float(total_revenue),
-            "avg_revenue_per_user": round(float(total_revenue) / total_paid, 2) if total_paid > 0 else 0
-        }
-    })
+    # Grouped aggregates in analytics.py - query count no longer grows with the window
+    days = parse_window(request.args.get('days'))
+    return jsonify(build_admin_analytics(days))
 
 @app.route('/api/admin/reset-test-data', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def reset_test_data():
     """Delete all enrollments and non-admin users created before a given cutoff date."""
-    current_user_id = get_jwt_identity()
-    admin = db.session.get(User, current_user_id)
-    if not admin or not admin.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     cutoff_str = request.json.get('cutoff_date')
     if not cutoff_str:
         return jsonify({"msg": "cutoff_date required"}), 400
@@ -743,20 +660,27 @@ def reset_test_data():
         users_to_delete = User.query.filter(
             User.created_at < cutoff,
             User.is_admin == False,
-            User.id != int(current_user_id)
+            User.id != current_user.id
         ).all()
         user_ids = [u.id for u in users_to_delete]
 
-        # Step 2: Delete ALL enrollments before cutoff date
-        deleted_enrollments = Enrollment.query.filter(
-            Enrollment.enrolled_at < cutoff
+        # Step 2: Delete ALL enrollments (and their payments) before cutoff date
+        deleted_enrollments = hot_queries.enrollments_before(cutoff).delete(synchronize_session='fetch')
+        Payment.query.filter(
+            Payment.paid_at < cutoff
         ).delete(synchronize_session='fetch')
 
-        # Step 3: Delete any remaining enrollments for those users
+        # Step 3: Delete any remaining enrollments (roleplay sessions, payments) for those users
         if user_ids:
             Enrollment.query.filter(
                 Enrollment.user_id.in_(user_ids)
             ).delete(synchronize_session='fetch')
+            RoleplaySession.query.filter(
+                RoleplaySession.user_id.in_(user_ids)
+            ).delete(synchronize_session='fetch')
+            Payment.query.filter(
+                Payment.user_id.in_(user_ids)
+            ).delete(synchronize_session='fetch')
 
         db.session.flush()
 
@@ -765,8 +689,13 @@ def reset_test_data():
         for u in users_to_delete:
             db.session.delete(u)
 
+        # Bulk deletes bypass the incremental rollup and the per-user owned
+        # course lists - recompute both from what's left
+        db.session.flush()
+        daily_metrics.rebuild_all()
+        rebuild_owned_courses()
         db.session.commit()
-        log_action(admin.email, "RESET_TEST_DATA", f"Deleted {deleted_enrollments} enrollments and {deleted_users} users before {cutoff_str}")
+        log_action(current_user.email, "RESET_TEST_DATA", f"Deleted {deleted_enrollments} enrollments and {deleted_users} users before {cutoff_str}")
 
         return jsonify({
             "msg": "Test data cleared",
@@ -779,45 +708,43 @@ def reset_test_data():
         return jsonify({"msg": f"Failed: {str(e)}"}), 500
 
 @app.route('/api/users/<int:user_id>/role', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_user_role(user_id):
-    current_user_id = get_jwt_identity()
-    admin = db.session.get(User, current_user_id) # FIXED
-    if not admin or not admin.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     user = db.session.get(User, user_id) # FIXED
     if not user: return jsonify({"msg": "User not found"}), 404
     
     data = request.json
     if 'is_admin' in data:
+        if bool(data['is_admin']) != bool(user.is_admin) and not user.is_deleted:
+            # Admins aren't counted as signups either
+            daily_metrics.record_signup(user.created_at, count=-1 if data['is_admin'] else 1)
         user.is_admin = data['is_admin']
+        revoke_tokens(user)  # old tokens carry the old is_admin claim
         db.session.commit()
         return jsonify({"msg": "Role updated"})
     return jsonify({"msg": "No changes"}), 400
 
 @app.route('/api/users/<int:user_id>/delete', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def soft_delete_user(user_id):
-    current_user_id = get_jwt_identity()
-    admin = db.session.get(User, current_user_id) # FIXED
-    if not admin or not admin.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     user = db.session.get(User, user_id) # FIXED
     if not user: return jsonify({"msg": "User not found"}), 404
     
+    if not user.is_deleted and not user.is_admin:
+        # Signup counts exclude deleted users - take them back off the rollup
+        daily_metrics.record_signup(user.created_at, count=-1)
     user.is_deleted = True
+    revoke_tokens(user)
     db.session.commit()
     return jsonify({"msg": "User deleted"})
 
 @app.route('/api/users/<int:user_id>/restore', methods=['POST'])
-@jwt_required()
+@admin_required
 def restore_user(user_id):
-    current_user_id = get_jwt_identity()
-    admin = db.session.get(User, current_user_id) # FIXED
-    if not admin or not admin.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     user = db.session.get(User, user_id) # FIXED
     if user:
+        if user.is_deleted and not user.is_admin:
+            daily_metrics.record_signup(user.created_at, count=1)
         user.is_deleted = False
         db.session.commit()
     return jsonify({"msg": "User restored"})
@@ -828,24 +755,27 @@ def restore_user(user_id):
 
 @app.route('/api/courses', methods=['GET'])
 def get_courses():
+    # ?view=catalog returns summary fields only (no curriculum) - what every
+    # listing page actually needs. Default stays the full list for the admin
+    # course editor. Both are served from the versioned cache in course_cache.py.
+    try:
+        return catalog_response(request.args.get('view', 'full'))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/courses/<int:course_id>/curriculum', methods=['GET'])
+def get_course_curriculum(course_id):
     try:
-        courses = Course.query.filter((Course.is_deleted == False) | (Course.is_deleted == None)).all()
-        output = [{
-            'id': c.id, 'title': c.title, 'description': c.description,
-            'price': c.price, 'category': c.category,
-            'modules': c.course_data.get('modules', []) if c.course_data else []
-        } for c in courses]
-        return jsonify(output), 200
+        resp = curriculum_response(course_id)
+        if resp is None:
+            return jsonify({"msg": "Course not found"}), 404
+        return resp
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/courses', methods=['POST'])
-@jwt_required()
+@admin_required
 def create_course():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id) # FIXED
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     data = request.json
     if not data.get('title'): return jsonify({"msg": "Title required"}), 400
 
@@ -854,20 +784,18 @@ def create_course():
         description=data.get('description', ''),
         price=float(data.get('price', 29.0)),
         category=data.get('category', 'General'),
+        stripe_price_id=data.get('stripe_price_id') or None,
         course_data={"modules": data.get('modules', [])},
         is_active=True, is_deleted=False
     )
     db.session.add(new_course)
+    bump_course_version()
     db.session.commit()
     return jsonify(new_course.to_dict()), 201
 
 @app.route('/api/courses/<int:course_id>', methods=['PUT'])
-@jwt_required()
+@admin_required
 def update_course(course_id):
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id) # FIXED
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     course = db.session.get(Course, course_id) # FIXED
     if not course: return jsonify({"msg": "Course not found"}), 404
 
@@ -876,25 +804,68 @@ def update_course(course_id):
     if 'description' in data: course.description = data['description']
     if 'price' in data: course.price = float(data['price'])
     if 'category' in data: course.category = data['category']
+    if 'stripe_price_id' in data: course.stripe_price_id = data['stripe_price_id'] or None
     if 'modules' in data: course.course_data = {"modules": data['modules']}
 
+    bump_course_version()
     db.session.commit()
     return jsonify({"msg": "Updated", "course": course.to_dict()})
 
 @app.route('/api/courses/<int:course_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_course(course_id):
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id) # FIXED
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
-
     course = db.session.get(Course, course_id) # FIXED
     if not course: return jsonify({"msg": "Course not found"}), 404
 
     course.is_deleted = True
+    bump_course_version()
     db.session.commit()
     return jsonify({"msg": "Archived"})
 
+@app.route('/api/courses/<int:course_id>/scorm', methods=['POST'])
+@admin_required
+def upload_scorm(course_id):
+    """Attaches a SCORM zip to a course (see scorm.py for the ingest)."""
+    course = db.session.get(Course, course_id)
+    if not course: return jsonify({"msg": "Course not found"}), 404
+    if request.content_length and request.content_length > scorm.SCORM_MAX_TOTAL_BYTES:
+        return jsonify({"msg": "Package too large"}), 413
+    upload = request.files.get('file')
+    if not upload or not upload.filename.lower().endswith('.zip'):
+        return jsonify({"msg": "A .zip file is required"}), 400
+
+    zip_path = os.path.join(app.config['UPLOAD_FOLDER'], f"scorm-{uuid.uuid4().hex}.zip")
+    upload.save(zip_path)
+    try:
+        package = scorm.ingest(zip_path, app.config['COURSES_FOLDER'])
+    except scorm.ScormRejected as e:
+        return jsonify({"msg": str(e)}), 400
+    finally:
+        os.remove(zip_path)
+
+    course.folder_name = package.folder_name
+    course.launch_file = package.launch_file
+    bump_course_version()
+    db.session.commit()
+    log_action(current_user.email, "UPLOAD_SCORM", f"Course {course_id}: {package.files} files, {package.new_bytes} new bytes")
+    return jsonify({
+        "msg": "Package uploaded",
+        "launch_url": f"/courses/{package.folder_name}/{package.launch_file}",
+        "title": package.title,
+        "files": package.files,
+        "total_bytes": package.total_bytes,
+        "new_bytes": package.new_bytes,
+    })
+
+@app.route('/courses/<folder_name>/<path:filename>', methods=['GET'])
+def serve_scorm_asset(folder_name, filename):
+    # Precompressed variants stored at ingest - nothing is compressed per request
+    if folder_name.startswith(('.', '_')): return jsonify({"msg": "Not found"}), 404
+    resp = scorm.send_asset(os.path.join(app.config['COURSES_FOLDER'], folder_name), filename,
+                            request.headers.get('Accept-Encoding'))
+    if resp is None: return jsonify({"msg": "Not found"}), 404
+    return resp
+
 # ==========================================
 # 7. ENROLLMENT & STRIPE ROUTES
 # ==========================================
@@ -907,40 +878,14 @@ def create_checkout_session():
     user_id = get_jwt_identity()  # None for guests
 
     data = request.json
-    course = db.session.get(Course, data.get('course_id')) # FIXED
+    try:
+        course = pricing.get_price_map().get(int(data.get('course_id')))
+    except (TypeError, ValueError):
+        course = None
     if not course: return jsonify({'message': 'Course not found'}), 404
 
     try:
-        session_kwargs = dict(
-            payment_method_types=['card'],
-            line_items=[{
-                # Use stable Stripe Price ID if available for this course (enables GTM tracking).
-                # Falls back to dynamic price_data if course title not in the map.
-                **(
-                    {'price': STRIPE_COURSE_PRICE_IDS[course.title], 'quantity': 1}
-                    if course.title in STRIPE_COURSE_PRICE_IDS
-                    else {
-                        'price_data': {
-                            'currency': 'usd',
-                            'product_data': {'name': course.title},
-                            'unit_amount': int(course.price * 100),
-                        },
-                        'quantity': 1,
-                    }
-                ),
-            }],
-            mode='payment',
-            success_url=f"{DOMAIN}/payment-success?session_id={{CHECKOUT_SESSION_ID}}&course_id={course.id}&amount={course.price}&price_id={STRIPE_COURSE_PRICE_IDS.get(course.title, '')}&guest={'false' if user_id else 'true'}",
-            cancel_url=f"{DOMAIN}/courses",
-            metadata={"course_id": course.id},
-        )
-
-        if user_id:
-            session_kwargs['client_reference_id'] = str(user_id)
-            session_kwargs['metadata']['user_id'] = user_id
-        else:
-            session_kwargs['metadata']['guest'] = 'true'
-
+        session_kwargs = pricing.course_checkout_params(course, DOMAIN, user_id)
         checkout_session = stripe.checkout.Session.create(**session_kwargs)
         return jsonify({'id': checkout_session.id, 'url': checkout_session.url})
     except Exception as e:
@@ -953,42 +898,18 @@ def create_checkout_session():
 def create_bundle_checkout():
     user_id = get_jwt_identity()
     
-    # 1. Calculate how many distinct courses they own
-    owned_enrollments = Enrollment.query.filter_by(user_id=user_id).all()
-    owned_course_ids = set([e.course_id for e in owned_enrollments])
-    owned_count = len(owned_course_ids)
-    
-    # 2. Total courses in system
-    total_courses = Course.query.filter((Course.is_deleted == False) | (Course.is_deleted == None)).count()
-    
-    if owned_count >= total_courses:
+    # 1. Live courses from the price cache, and how many of them they own
+    live_ids = pricing.get_price_map().live_ids
+    owned_count = len(owned_course_ids(user_id) & live_ids)
+
+    if owned_count >= len(live_ids):
         return jsonify({'error': 'You already own all available courses!'}), 400
 
-    # 3. Calculate dynamic price (159 - (owned * 29))
-    base_bundle_price = 159.0
-    discount = owned_count * 29.0
-    final_price = max(base_bundle_price - discount, 0.0)
+    # 2. Dynamic price (159 - (owned * 29))
+    final_price = pricing.bundle_price(owned_count)
 
     try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': 'usd',
-                    # Use stable Product ID so GTM can track bundle conversions.
-                    # Dynamic unit_amount preserves the per-user discount logic.
-                    'product': STRIPE_BUNDLE_PRODUCT_ID,
-                    'unit_amount': int(final_price * 100),
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=f"{DOMAIN}/payment-success?session_id={{CHECKOUT_SESSION_ID}}&bundle=true&amount={final_price}&price_id={STRIPE_BUNDLE_PRODUCT_ID}",
-            cancel_url=f"{DOMAIN}/pricing",
-            client_reference_id=str(user_id),
-            # NEW: Tag this as a bundle purchase!
-            metadata={"user_id": user_id, "is_bundle": "true"}
-        )
+        checkout_session = stripe.checkout.Session.create(**pricing.bundle_checkout_params(final_price, DOMAIN, user_id))
         return jsonify({'id': checkout_session.id, 'url': checkout_session.url})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -996,7 +917,7 @@ def create_bundle_checkout():
 
 
 
-def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payment_intent_id=None):
+def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payment_intent_id=None, payment=None):
     """Shared by /api/verify-payment (browser) and the Stripe webhook (server-side
     safety net) so a guest's payment is never lost even if their browser tab
     closes before verify-payment runs - Stripe fires the webhook regardless.
@@ -1015,7 +936,7 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
         return None
 
     # Already processed by whichever path got here first (browser or webhook)?
-    already_processed = Enrollment.query.filter_by(stripe_session_id=session_id).first()
+    already_processed = hot_queries.checkout_enrollment(session_id).first()
     if already_processed:
         user = db.session.get(User, already_processed.user_id)
         status = 'guest_enrolled' if not user.account_setup_complete else 'existing_account'
@@ -1030,7 +951,9 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
         # Applies regardless of account_setup_complete - a still-incomplete guest
         # re-paying for a course they already have needs this exact same check,
         # not just fully-set-up accounts.
-        already_owns_this_course = Enrollment.query.filter_by(user_id=existing_user.id, course_id=course_id).first()
+        # Read the enrollment itself, not the owned_course_ids mirror - this
+        # decides whether a payment gets flagged for a refund
+        already_owns_this_course = Enrollment.query.filter_by(user_id=existing_user.id, course_id=course_id).first() is not None
 
         if already_owns_this_course:
             # They paid for a course they already own. Guest checkout can't know who's
@@ -1046,6 +969,10 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
                 stripe_session_id=session_id, payment_intent_id=payment_intent_id,
                 created_at=datetime.utcnow(), resolved=False
             ))
+            # The charge went through even though it bought nothing new -
+            # it belongs in the ledger until someone refunds it
+            if payment is not None:
+                record_paid_checkout(existing_user.id, payment, [])
             db.session.commit()
 
             internal_alert_html = (
@@ -1058,11 +985,8 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
                 f"No refund has been issued automatically — review in the admin panel's Flagged Payments tab, "
                 f"or in Stripe Dashboard directly, and refund if appropriate.</p>"
             )
-            threading.Thread(
-                target=send_email,
-                args=("support@shirotechnologies.com", f"Duplicate Purchase — Review Needed ({course_title})", internal_alert_html, "AICourseHubPro Alerts", "no-reply@aicoursehubpro.com"),
-                daemon=True
-            ).start()
+            send_email("support@shirotechnologies.com", f"Duplicate Purchase — Review Needed ({course_title})", internal_alert_html,
+                       "AICourseHubPro Alerts", "no-reply@aicoursehubpro.com", dedup_key=f"flagged-alert:{session_id}")
 
             print(f"Guest {guest_email} paid for course_id={course_id} they already own (payment_intent={payment_intent_id}). Flagged in admin panel + internal alert sent.", flush=True)
 
@@ -1075,13 +999,13 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
                     f"about your refund. In the meantime, please log in to access your course.",
                     "Log In", f"{DOMAIN}/login"
                 )
-                threading.Thread(target=send_email, args=(guest_email, "We're Reviewing Your Payment", customer_email_content), daemon=True).start()
+                send_email(guest_email, "We're Reviewing Your Payment", customer_email_content, dedup_key=f"flagged-customer:{session_id}")
                 return {"status": "already_owned_flagged", "user": existing_user}
 
             # Still-incomplete guest: they have no working password, so "log in" is a
             # dead end. Give them a fresh token straight back into the course they
             # already own - the duplicate charge is still flagged above regardless.
-            resume_token = create_access_token(identity=str(existing_user.id), expires_delta=timedelta(days=30))
+            resume_token = issue_token(existing_user, expires_delta=timedelta(days=30))
             resume_link = f"{DOMAIN}/resume?token={resume_token}&course_id={course_id}"
             customer_email_content = get_email_template(
                 "You Already Own This Course",
@@ -1090,19 +1014,15 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
                 f"Here's a link straight back to your course in the meantime.",
                 "Go To Course", resume_link
             )
-            threading.Thread(target=send_email, args=(guest_email, "We're Reviewing Your Payment", customer_email_content), daemon=True).start()
+            send_email(guest_email, "We're Reviewing Your Payment", customer_email_content, dedup_key=f"flagged-customer:{session_id}")
             return {"status": "already_owned_flagged_guest", "user": existing_user, "token": resume_token}
 
     if existing_user and existing_user.account_setup_complete:
         # Real, already-set-up account, genuinely new course. Don't auto-login -
         # attach enrollment, ask them to log in.
-        if not Enrollment.query.filter_by(user_id=existing_user.id, course_id=course_id).first():
-            db.session.add(Enrollment(
-                user_id=existing_user.id, course_id=course_id,
-                status='in-progress', progress=0,
-                enrolled_at=datetime.utcnow(), stripe_session_id=session_id
-            ))
-            db.session.commit()
+        grant_courses(existing_user.id, [course_id], stripe_session_id=session_id, payment=payment)
+        # Unconditionally - a repeat purchase adds no course but is still booked
+        db.session.commit()
 
         course = db.session.get(Course, course_id)
         email_content = get_email_template(
@@ -1111,7 +1031,7 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
             f"This email address already has an AICourseHubPro account — please log in to access it.",
             "Log In", f"{DOMAIN}/login"
         )
-        threading.Thread(target=send_email, args=(guest_email, "Course Unlocked — Log In to Access", email_content), daemon=True).start()
+        send_email(guest_email, "Course Unlocked — Log In to Access", email_content, dedup_key=f"enrolled:{session_id}")
         return {"status": "existing_account", "user": existing_user}
 
     # Brand-new guest, OR the same still-incomplete guest buying another course.
@@ -1131,18 +1051,14 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
             signup_source='guest_checkout'
         )
         db.session.add(guest_user)
+        daily_metrics.record_signup()
         db.session.commit()
         db.session.refresh(guest_user)
 
-    if not Enrollment.query.filter_by(user_id=guest_user.id, course_id=course_id).first():
-        db.session.add(Enrollment(
-            user_id=guest_user.id, course_id=course_id,
-            status='in-progress', progress=0,
-            enrolled_at=datetime.utcnow(), stripe_session_id=session_id
-        ))
-        db.session.commit()
+    grant_courses(guest_user.id, [course_id], stripe_session_id=session_id, payment=payment)
+    db.session.commit()
 
-    resume_token = create_access_token(identity=str(guest_user.id), expires_delta=timedelta(days=30))
+    resume_token = issue_token(guest_user, expires_delta=timedelta(days=30))
     resume_link = f"{DOMAIN}/resume?token={resume_token}&course_id={course_id}"
 
     course = db.session.get(Course, course_id)
@@ -1167,7 +1083,7 @@ def resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payme
             f"pick up exactly where you left off. To download your certificate later, you'll just need to set a password first.",
             "Start Learning Now", resume_link
         )
-    threading.Thread(target=send_email, args=(guest_email, email_subject_line, email_content), daemon=True).start()
+    send_email(guest_email, email_subject_line, email_content, dedup_key=f"enrolled:{session_id}")
 
     return {"status": "guest_enrolled", "user": guest_user}
 
@@ -1185,18 +1101,20 @@ def verify_payment():
     is_bundle = data.get('bundle') == 'true'
 
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
+        # Local copy once the session is known paid - repeat verifies (page
+        # refreshes, the webhook having got there first) skip the Stripe call
+        session = stripe_sessions.get_checkout_session(session_id)
         if session.payment_status != 'paid':
             return jsonify({"msg": "Payment failed"}), 400
 
         # --- GUEST CHECKOUT: no logged-in user, resolve/create account by Stripe email ---
         if not user_id:
-            guest_email = session.customer_details.email if session.customer_details else None
-            guest_name = session.customer_details.name if session.customer_details else None
+            guest_email = session.customer_email
+            guest_name = session.customer_name
             if not guest_email:
                 return jsonify({"msg": "Could not determine payer email from Stripe session"}), 400
 
-            result = resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payment_intent_id=session.payment_intent)
+            result = resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payment_intent_id=session.payment_intent, payment=session)
             if not result:
                 return jsonify({"msg": "Could not determine payer email from Stripe session"}), 400
 
@@ -1225,7 +1143,7 @@ def verify_payment():
             # whether the account/enrollment was just created here or already existed
             # (e.g. the webhook got there first) - tokens are stateless and cheap to reissue.
             guest_user = result["user"]
-            resume_token = create_access_token(identity=str(guest_user.id), expires_delta=timedelta(days=30))
+            resume_token = issue_token(guest_user, expires_delta=timedelta(days=30))
             return jsonify({
                 "msg": "Enrolled",
                 "status": "guest_enrolled",
@@ -1237,45 +1155,28 @@ def verify_payment():
         # --- LOGGED-IN USER FLOW (unchanged) ---
         if True:
             # --- BUNDLE LOGIC ---
-            if is_bundle or (session.metadata["is_bundle"] if "is_bundle" in session.metadata else "") == "true":
-                all_courses = Course.query.filter((Course.is_deleted == False) | (Course.is_deleted == None)).all()
-                owned = [e.course_id for e in Enrollment.query.filter_by(user_id=user_id).all()]
-                
-                enrolled_count = 0
-                for course in all_courses:
-                    if course.id not in owned:
-                        new_enr = Enrollment(
-                            user_id=user_id, course_id=course.id, 
-                            status='in-progress', progress=0, 
-                            enrolled_at=datetime.utcnow(), stripe_session_id=session_id
-                        )
-                        db.session.add(new_enr)
-                        enrolled_count += 1
-                
+            if is_bundle or session.metadata.get("is_bundle") == "true":
+                enrolled_count = len(grant_courses(user_id, all_courses=True, stripe_session_id=session_id, payment=session))
                 db.session.commit()
                 
                 user = db.session.get(User, user_id)
                 email_content = get_email_template("All-Access Pass Unlocked! 🚀", f"You have successfully unlocked all {enrolled_count} remaining courses.", "Go to Dashboard", f"{DOMAIN}/dashboard")
-                send_email(user.email, "Welcome to the All-Access Pass", email_content)
+                send_email(user.email, "Welcome to the All-Access Pass", email_content, dedup_key=f"enrolled:{session_id}")
                 
                 return jsonify({"msg": "Bundle Enrolled", "status": "enrolled", "courses_added": enrolled_count}), 200
 
             # --- SINGLE COURSE LOGIC ---
             else:
-                existing = Enrollment.query.filter_by(user_id=user_id, course_id=course_id).first()
-                if not existing:
-                    new_enrollment = Enrollment(
-                        user_id=user_id, course_id=course_id, 
-                        status='in-progress', progress=0, 
-                        enrolled_at=datetime.utcnow(), stripe_session_id=session_id
-                    )
-                    db.session.add(new_enrollment)
-                    db.session.commit()
-                    
+                # grant_courses is idempotent (ON CONFLICT DO NOTHING) - a repeat
+                # verify adds nothing and sends no second email
+                added = grant_courses(user_id, [course_id], stripe_session_id=session_id, payment=session)
+                # Even when nothing was added - the payment row must still land
+                db.session.commit()
+                if added:
                     user = db.session.get(User, user_id)
                     course = db.session.get(Course, course_id)
                     email_content = get_email_template("Course Unlocked! 🎓", f"You have successfully enrolled in {course.title}.", "Start Learning", f"{DOMAIN}/dashboard")
-                    send_email(user.email, f"Welcome to {course.title}", email_content)
+                    send_email(user.email, f"Welcome to {course.title}", email_content, dedup_key=f"enrolled:{session_id}")
 
                 return jsonify({"msg": "Enrolled", "status": "enrolled"}), 200
                 
@@ -1294,9 +1195,7 @@ def enroll_free():
     user_id = get_jwt_identity()
     course_id = request.json.get('course_id')
     
-    if not Enrollment.query.filter_by(user_id=user_id, course_id=course_id).first():
-        enr = Enrollment(user_id=user_id, course_id=course_id, status='in-progress', progress=0, score=0)
-        db.session.add(enr)
+    if grant_courses(user_id, [course_id]):
         db.session.commit()
     return jsonify({"msg": "Enrolled"}), 201
 
@@ -1305,21 +1204,33 @@ def enroll_free():
 def update_progress():
     user_id = get_jwt_identity()
     data = request.json
-    enr = Enrollment.query.filter_by(user_id=user_id, course_id=data.get('course_id')).first()
-    if not enr: return jsonify({"msg": "Not found"}), 404
-
-    if 'progress' in data: enr.progress = data['progress']
-    if 'status' in data: enr.status = data['status']
-    if 'score' in data: enr.score = data['score']
-    if 'module_idx' in data: enr.last_module_index = data['module_idx']
-    if 'lesson_idx' in data: enr.last_lesson_index = data['lesson_idx']
+    try:
+        course_id = int(data.get('course_id'))
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Not found"}), 404
 
-    if enr.status == 'completed' and not enr.certificate_id:
-        enr.certificate_id = f"AIC-{str(uuid.uuid4())[:8].upper()}"
-        enr.completion_date = datetime.utcnow()
+    found, certificate_id = progress.apply(user_id, course_id, progress.changes_from(data))
+    if not found: return jsonify({"msg": "Not found"}), 404
+    # A no-op save leaves nothing to commit - this just ends the read
+    db.session.commit()
+    return jsonify({"msg": "Updated", "certificate_id": certificate_id}), 200
 
+@app.route('/api/progress/batch', methods=['POST'])
+@jwt_required()
+def update_progress_batch():
+    """Several progress events at once (the player's debounced navigation
+    saves); events for the same course are coalesced, one commit overall."""
+    user_id = get_jwt_identity()
+    events = (request.get_json(silent=True) or {}).get('events')
+    if not isinstance(events, list) or len(events) > progress.MAX_BATCH_EVENTS:
+        return jsonify({"msg": f"events must be a list of at most {progress.MAX_BATCH_EVENTS}"}), 400
+
+    results = []
+    for course_id, changes in progress.coalesce(events):
+        found, certificate_id = progress.apply(user_id, course_id, changes)
+        results.append({"course_id": course_id, "status": "updated" if found else "not_found", "certificate_id": certificate_id})
     db.session.commit()
-    return jsonify({"msg": "Updated", "certificate_id": enr.certificate_id}), 200
+    return jsonify({"results": results}), 200
 
 @app.route('/api/my-enrollments', methods=['GET'])
 @jwt_required()
@@ -1343,66 +1254,19 @@ def get_my_enrollments():
 @jwt_required()
 def get_my_payments():
     user_id = get_jwt_identity()
-    # Join Enrollments and Courses to get the price and title
-    results = db.session.query(Enrollment, Course).join(Course, Enrollment.course_id == Course.id).filter(Enrollment.user_id == user_id).order_by(Enrollment.enrolled_at.desc()).all()
-    
-    grouped = {}
-    free_count = 0
-    
-    # 1. Group enrollments by their Stripe Receipt ID
-    for e, c in results:
-        key = e.stripe_session_id
-        if not key:
-            free_count += 1
-            key = f"free_{free_count}"
-            
-        if key not in grouped:
-            grouped[key] = {
-                "id": e.id,
-                "date_obj": e.enrolled_at or datetime.min,
-                "date": e.enrolled_at.strftime('%b %d, %Y') if e.enrolled_at else "N/A",
-                "status": "Paid",
-                "receipt": e.stripe_session_id if e.stripe_session_id else f"REC-FREE-{e.id}{user_id}",
-                "courses": []
-            }
-        grouped[key]["courses"].append(c)
-        
-    total_courses_in_db = Course.query.filter((Course.is_deleted == False) | (Course.is_deleted == None)).count()
-    
-    payments = []
-    for key, data in grouped.items():
-        if len(data["courses"]) > 1:
-            # 2. BUNDLE LOGIC: If one receipt unlocked multiple courses, show it as a bundle
-            prior_owned = total_courses_in_db - len(data["courses"])
-            paid_amount = max(159.0 - (prior_owned * 29.0), 0.0)
-            
-            payments.append({
-                "id": data["id"],
-                "course": f"All-Access Pro Bundle ({len(data['courses'])} courses)",
-                "amount": paid_amount,
-                "date_obj": data["date_obj"],
-                "date": data["date"],
-                "status": "Paid",
-                "receipt": data["receipt"]
-            })
-        else:
-            # 3. SINGLE COURSE LOGIC
-            payments.append({
-                "id": data["id"],
-                "course": data["courses"][0].title,
-                "amount": data["courses"][0].price,
-                "date_obj": data["date_obj"],
-                "date": data["date"],
-                "status": "Paid",
-                "receipt": data["receipt"]
-            })
-    
-    # Sort by date (newest first) and clean up before sending to frontend
-    payments.sort(key=lambda x: x["date_obj"], reverse=True)
-    for p in payments:
-        del p["date_obj"]
-        
-    return jsonify(payments), 200
+    after_id, limit = keyset_args()
+    # Straight from the ledger - amounts are what Stripe actually charged
+    rows, has_more = keyset_page(Payment.query.filter(Payment.user_id == user_id), Payment.id, after_id, limit)
+    prices = pricing.get_price_map()
+    return paged_response([{
+        "id": p.id,
+        "course": payments.describe(p, prices),
+        "amount": p.amount,
+        "currency": p.currency,
+        "date": p.paid_at.strftime('%b %d, %Y'),
+        "status": "Paid",
+        "receipt": p.stripe_session_id
+    } for p in rows], has_more), 200
 
 
 
@@ -1410,9 +1274,8 @@ def get_my_payments():
 @jwt_required()
 def get_enrollment_status(course_id):
     user_id = get_jwt_identity()
-    user = db.session.get(User, user_id) 
     
-    if user.is_admin:
+    if current_user and current_user.is_admin:
         return jsonify({"status": "completed", "progress": 100, "certificate_id": "ADMIN_PREVIEW"})
         
     # THE FIX: Order by progress descending so the backend ALWAYS grabs your highest score, ignoring bad duplicates!
@@ -1429,6 +1292,68 @@ def get_enrollment_status(course_id):
     })
 
 
+def handle_checkout_completed(event):
+    """Worker-side handler for checkout.session.completed (see
+    stripe_events.py). Safe to run more than once for the same event: every
+    path below checks for existing enrollments, and emails carry dedup keys."""
+    session = event['data']['object']
+    info = stripe_sessions.CheckoutSessionInfo.from_stripe(session)
+    stripe_sessions.remember(info)
+    
+    # Extract the data we passed in the checkout session
+    # Stripe SDK v5+ returns StripeObject, not dict — use attribute access not .get()
+    session_id = session['id']
+    metadata = session['metadata']
+    user_id = metadata['user_id'] if 'user_id' in metadata else None
+    is_bundle = (metadata['is_bundle'] if 'is_bundle' in metadata else '') == 'true'
+    course_id = int(metadata['course_id']) if 'course_id' in metadata and metadata['course_id'] else None
+    
+    if not user_id:
+        # Guest checkout (bundle checkout stays login-required, so this only
+        # applies to single-course purchases). This is the safety net: if the
+        # browser's own /api/verify-payment call already handled it, the shared
+        # helper below is idempotent on session_id and just no-ops here.
+        if is_bundle or not course_id:
+            print("Webhook: No user_id in metadata (bundle or missing course_id) — skipping", flush=True)
+            return
+
+        print(f"Webhook: guest checkout detected for session {session_id}, course_id={course_id} — resolving...", flush=True)
+        guest_email = session.customer_details.email if session.customer_details else None
+        guest_name = session.customer_details.name if session.customer_details else None
+        result = resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payment_intent_id=session.payment_intent, payment=info)
+        if not result:
+            print(f"Webhook: guest checkout for session {session_id} had no payer email — skipping", flush=True)
+        else:
+            print(f"Webhook: session {session_id} resolved as '{result['status']}' for user_id={result['user'].id} ({result['user'].email})", flush=True)
+        return
+
+    # --- BUNDLE UNLOCK LOGIC ---
+    if is_bundle:
+        # ON CONFLICT DO NOTHING makes racing the frontend verify route safe
+        enrolled_count = len(grant_courses(user_id, all_courses=True, stripe_session_id=session_id, payment=info))
+        db.session.commit()
+        
+        # Send welcome email silently in the background
+        user = db.session.get(User, user_id)
+        if user and enrolled_count > 0:
+            email_content = get_email_template("All-Access Pass Unlocked! 🚀", f"You have successfully unlocked all {enrolled_count} remaining courses.", "Go to Dashboard", f"{DOMAIN}/dashboard")
+            send_email(user.email, "Welcome to the All-Access Pass", email_content, dedup_key=f"enrolled:{session_id}")
+        
+    # --- SINGLE COURSE UNLOCK LOGIC ---
+    elif course_id:
+        added = grant_courses(user_id, [course_id], stripe_session_id=session_id, payment=info)
+        db.session.commit()
+        if added:
+            user = db.session.get(User, user_id)
+            course = db.session.get(Course, course_id)
+            if user and course:
+                email_content = get_email_template("Course Unlocked! 🎓", f"You have successfully enrolled in {course.title}.", "Start Learning", f"{DOMAIN}/dashboard")
+                send_email(user.email, f"Welcome to {course.title}", email_content, dedup_key=f"enrolled:{session_id}")
+
+
+stripe_events.register_handler('checkout.session.completed', handle_checkout_completed)
+
+
 @app.route('/api/webhook', methods=['POST'])
 def stripe_webhook():
     payload = request.data
@@ -1452,81 +1377,11 @@ def stripe_webhook():
         # Invalid signature
         return jsonify({'error': 'Invalid signature'}), 400
 
-    # Handle the checkout.session.completed event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        
-        # Extract the data we passed in the checkout session
-        # Stripe SDK v5+ returns StripeObject, not dict — use attribute access not .get()
-        session_id = session['id']
-        metadata = session['metadata']
-        user_id = metadata['user_id'] if 'user_id' in metadata else None
-        is_bundle = (metadata['is_bundle'] if 'is_bundle' in metadata else '') == 'true'
-        course_id = int(metadata['course_id']) if 'course_id' in metadata and metadata['course_id'] else None
-        
-        if not user_id:
-            # Guest checkout (bundle checkout stays login-required, so this only
-            # applies to single-course purchases). This is the safety net: if the
-            # browser's own /api/verify-payment call already handled it, the shared
-            # helper below is idempotent on session_id and just no-ops here.
-            if is_bundle or not course_id:
-                print("Webhook: No user_id in metadata (bundle or missing course_id) — skipping", flush=True)
-                return jsonify({'status': 'success'}), 200
-
-            print(f"Webhook: guest checkout detected for session {session_id}, course_id={course_id} — resolving...", flush=True)
-            guest_email = session.customer_details.email if session.customer_details else None
-            guest_name = session.customer_details.name if session.customer_details else None
-            result = resolve_guest_checkout(course_id, session_id, guest_email, guest_name, payment_intent_id=session.payment_intent)
-            if not result:
-                print(f"Webhook: guest checkout for session {session_id} had no payer email — skipping", flush=True)
-            else:
-                print(f"Webhook: session {session_id} resolved as '{result['status']}' for user_id={result['user'].id} ({result['user'].email})", flush=True)
-            return jsonify({'status': 'success'}), 200
-
-        # --- BUNDLE UNLOCK LOGIC ---
-        if is_bundle:
-            all_courses = Course.query.filter((Course.is_deleted == False) | (Course.is_deleted == None)).all()
-            owned = [e.course_id for e in Enrollment.query.filter_by(user_id=user_id).all()]
-            
-            enrolled_count = 0
-            for course in all_courses:
-                if course.id not in owned:
-                    # Double check to prevent race conditions with the frontend verify route
-                    existing = Enrollment.query.filter_by(user_id=user_id, course_id=course.id).first()
-                    if not existing:
-                        new_enr = Enrollment(
-                            user_id=user_id, course_id=course.id, 
-                            status='in-progress', progress=0, 
-                            enrolled_at=datetime.utcnow(), stripe_session_id=session_id
-                        )
-                        db.session.add(new_enr)
-                        enrolled_count += 1
-            
-            db.session.commit()
-            
-            # Send welcome email silently in the background
-            user = db.session.get(User, user_id)
-            if user and enrolled_count > 0:
-                email_content = get_email_template("All-Access Pass Unlocked! 🚀", f"You have successfully unlocked all {enrolled_count} remaining courses.", "Go to Dashboard", f"{DOMAIN}/dashboard")
-                send_email(user.email, "Welcome to the All-Access Pass", email_content)
-            
-        # --- SINGLE COURSE UNLOCK LOGIC ---
-        elif course_id:
-            existing = Enrollment.query.filter_by(user_id=user_id, course_id=course_id).first()
-            if not existing:
-                new_enrollment = Enrollment(
-                    user_id=user_id, course_id=course_id, 
-                    status='in-progress', progress=0, 
-                    enrolled_at=datetime.utcnow(), stripe_session_id=session_id
-                )
-                db.session.add(new_enrollment)
-                db.session.commit()
-                
-                user = db.session.get(User, user_id)
-                course = db.session.get(Course, course_id)
-                if user and course:
-                    email_content = get_email_template("Course Unlocked! 🎓", f"You have successfully enrolled in {course.title}.", "Start Learning", f"{DOMAIN}/dashboard")
-                    send_email(user.email, f"Welcome to {course.title}", email_content)
+    # Store and ack - the enrollment work happens in the stripe_events
+    # workers, so a slow database or email provider can never make Stripe
+    # time out and redeliver. Redeliveries of a stored event are no-ops.
+    if not stripe_events.record_event(event, payload):
+        print(f"Webhook: event {event['id']} already received - ignoring redelivery", flush=True)
 
     return jsonify({'status': 'success'}), 200
 
@@ -1535,18 +1390,41 @@ def stripe_webhook():
 # 8. ADMIN & MISC ROUTES
 # ==========================================
 
+@app.route('/api/admin/stripe-events', methods=['GET'])
+@admin_required
+def get_stripe_events():
+    """Webhook events by status - defaults to the dead-letter queue."""
+    after_id, limit = keyset_args()
+    query = db.session.query(StripeEvent.id, StripeEvent.event_id, StripeEvent.type, StripeEvent.status,
+                             StripeEvent.attempts, StripeEvent.last_error, StripeEvent.received_at)\
+        .filter(StripeEvent.status == request.args.get('status', 'dead'))
+    rows, has_more = keyset_page(query, StripeEvent.id, after_id, limit)
+    return paged_response([{
+        "id": r.id, "event_id": r.event_id, "type": r.type, "status": r.status, "attempts": r.attempts,
+        "last_error": r.last_error, "received_at": r.received_at.strftime('%Y-%m-%d %H:%M') if r.received_at else None
+    } for r in rows], has_more)
+
+@app.route('/api/admin/stripe-events/<int:id>/retry', methods=['POST'])
+@admin_required
+def retry_stripe_event(id):
+    event = db.session.get(StripeEvent, id)
+    if not event:
+        return jsonify({"msg": "Event not found"}), 404
+    if event.status != 'dead':
+        return jsonify({"msg": "Only dead-lettered events can be retried"}), 400
+    stripe_events.requeue_event(id)
+    log_action(current_user.email, "RETRY_STRIPE_EVENT", f"Requeued Stripe event {event.event_id}")
+    return jsonify({"msg": "Event requeued"})
+
 @app.route('/api/admin/messages', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_messages():
-    user = db.session.get(User, get_jwt_identity()) # FIXED
-    if not user.is_admin: return jsonify({"msg": "Admin only"}), 403
     msgs = ContactMessage.query.order_by(ContactMessage.created_at.desc()).all()
     return jsonify([{"id": m.id, "name": m.name, "subject": m.subject, "message": m.message, "is_read": m.is_read, "date": m.created_at.strftime('%Y-%m-%d')} for m in msgs])
 
 @app.route('/api/admin/messages/<int:id>/read', methods=['PUT'])
-@jwt_required()
+@admin_required
 def mark_message_read(id):
-    if not db.session.get(User, get_jwt_identity()).is_admin: return jsonify({"msg": "Admin only"}), 403 # FIXED
     msg = db.session.get(ContactMessage, id) # FIXED
     if msg: 
         msg.is_read = True
@@ -1554,30 +1432,36 @@ def mark_message_read(id):
     return jsonify({"msg": "Marked read"})
 
 @app.route('/api/admin/logs', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_audit_logs():
-    if not db.session.get(User, get_jwt_identity()).is_admin: return jsonify({"msg": "Admin only"}), 403 # FIXED
-    logs = AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(50).all()
+    logs = hot_queries.recent_audit_logs().all()
     return jsonify([{"action": l.action, "admin": l.admin_email, "details": l.details, "date": l.timestamp.strftime('%Y-%m-%d %H:%M')} for l in logs])
 
 @app.route('/api/admin/transactions', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_transactions():
-    if not db.session.get(User, get_jwt_identity()).is_admin: return jsonify({"msg": "Admin only"}), 403 # FIXED
-    enrollments = Enrollment.query.order_by(Enrollment.id.desc()).all()
-    data = []
-    for e in enrollments:
-        u = db.session.get(User, e.user_id) # FIXED
-        c = db.session.get(Course, e.course_id) # FIXED
-        if u and c:
-            data.append({"id": e.id, "user": u.name, "email": u.email, "course": c.title, "date": e.enrolled_at.strftime('%Y-%m-%d') if e.enrolled_at else "N/A", "status": "Paid"})
-    return jsonify(data)
+    after_id, limit = keyset_args()
+    start, end = date_range_args()
+
+    query = db.session.query(Payment, User.name, User.email).join(User, User.id == Payment.user_id)
+    if start: query = query.filter(Payment.paid_at >= start)
+    if end: query = query.filter(Payment.paid_at < end)
+    # @> so the GIN index on course_ids applies
+    if request.args.get('course_id', type=int): query = query.filter(Payment.course_ids.contains([request.args.get('course_id', type=int)]))
+    if request.args.get('email'): query = query.filter(func.lower(User.email).startswith(request.args['email'].strip().lower(), autoescape=True))
+
+    rows, has_more = keyset_page(query, Payment.id, after_id, limit)
+    prices = pricing.get_price_map()
+    data = [{"id": p.id, "user": name, "email": email, "course": payments.describe(p, prices), "amount": p.amount,
+             "currency": p.currency, "receipt": p.stripe_session_id, "date": p.paid_at.strftime('%Y-%m-%d'), "status": "Paid"}
+            for p, name, email in rows]
+    return paged_response(data, has_more)
 
 @app.route('/api/chat', methods=['POST'])
+@rate_limited(chat_limiter, message="You're sending messages too quickly. Please try again in {minutes} minute(s).", message_key="reply")
 def chat_support():
     msg = request.json.get('message', '')
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key: 
+    if not llm.is_configured(): 
         return jsonify({"reply": "Chat unavailable."}), 500
         
     # --- FIXED NOVA CONTEXT PROMPT ---
@@ -1597,17 +1481,23 @@ def chat_support():
     If the user asks about the certificate of completion, tell them that users get a verifiable certificate of course completion which can be downloaded in PDF format. But to receive the certificate, users must complete the course and appear for an assessment and pass it with minimum score of 70%.
     """
     
+    conversation = [
+        {"role": "system", "content": nova_context}, 
+        {"role": "user", "content": msg}
+    ]
     try:
-        client = OpenAI(api_key=api_key)
-        res = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": nova_context}, 
-                {"role": "user", "content": msg}
-            ],
-            temperature=0.7
-        )
-        return jsonify({"reply": res.choices[0].message.content})
+        # Repeat FAQs (pricing, refunds, certificates...) skip the model entirely
+        cached = chat_cache.lookup(msg)
+        if cached:
+            return llm.sse_text(cached) if llm.wants_stream() else jsonify({"reply": cached})
+        if llm.wants_stream():
+            return llm.sse_response(conversation, "gpt-4o-mini", log_prefix="Chatbot", temperature=0.7,
+                                    on_complete=lambda reply: chat_cache.store(msg, reply))
+        reply = llm.complete(conversation, "gpt-4o-mini", temperature=0.7)
+        chat_cache.store(msg, reply)
+        return jsonify({"reply": reply})
+    except llm.LLMBusy:
+        return jsonify({"reply": "Nova is busy right now. Please try again in a moment."}), 503
     except Exception as e:
         print(f"Chatbot Error: {e}")
         return jsonify({"reply": "I'm having trouble connecting right now."}), 500
@@ -1615,49 +1505,67 @@ def chat_support():
 @app.route('/api/settings', methods=['GET', 'POST'])
 @jwt_required(optional=True) 
 def settings():
+    # In-memory registry (system_settings.py) - no query per page load
     if request.method == 'GET':
-        m = SystemSetting.query.filter_by(key='maintenance_mode').first()
-        r = SystemSetting.query.filter_by(key='allow_registrations').first()
-        return jsonify({
-            "maintenance": m.value == 'true' if m else False,
-            "registrations": r.value == 'true' if r else True
-        })
+        return jsonify(system_settings.snapshot())
     
     # POST
-    user = db.session.get(User, get_jwt_identity()) # FIXED
-    if not user or not user.is_admin: return jsonify({"msg": "Admin only"}), 403
+    if not current_user or not current_user.is_admin: return jsonify({"msg": "Admin only"}), 403
     
-    data = request.json
-    for key, val in [('maintenance_mode', data.get('maintenance')), ('allow_registrations', data.get('registrations'))]:
-        if val is not None:
-            setting = SystemSetting.query.filter_by(key=key).first()
-            if not setting: 
-                setting = SystemSetting(key=key, value=str(val).lower())
-                db.session.add(setting)
-            else: 
-                setting.value = str(val).lower()
-    db.session.commit()
+    data = request.json or {}
+    system_settings.save({name: data.get(name) for name in system_settings.REGISTRY})
     return jsonify({"msg": "Settings updated"})
 
 @app.route('/api/verify-certificate/<cert_id>', methods=['GET'])
 def verify_cert(cert_id):
-    enr = Enrollment.query.filter_by(certificate_id=cert_id).first()
-    if not enr: return jsonify({"valid": False}), 404
-    u = db.session.get(User, enr.user_id) # FIXED
-    c = db.session.get(Course, enr.course_id) # FIXED
-    return jsonify({
-        "valid": True, 
-        "student_name": u.name, 
-        "course_title": c.title, 
-        "completion_date": enr.completion_date.strftime('%Y-%m-%d')
-    })
+    # Public and scraped: forged IDs are rejected by signature, lookups are
+    # cached (cert_ids.py) and responses are cacheable downstream too
+    result = cert_ids.verify(cert_id)
+    if not result:
+        resp = jsonify({"valid": False})
+        resp.status_code = 404
+        resp.headers['Cache-Control'] = f'public, max-age={cert_ids.CERT_VERIFY_NEGATIVE_TTL_SECONDS}'
+        return resp
+    resp = jsonify({"valid": True, **result})
+    resp.headers['Cache-Control'] = f'public, max-age={cert_ids.CERT_VERIFY_TTL_SECONDS}'
+    return resp
+
+@app.route('/api/certificates/<cert_id>/pdf', methods=['GET'])
+@jwt_required()
+def download_certificate(cert_id):
+    """The certificate PDF, from the disk cache (rendered on first request).
+    Conditional and Range requests are answered by send_file."""
+    found = certificates.fields_for(cert_id)
+    if not found: return jsonify({"msg": "Certificate not found"}), 404
+    fields, owner_id = found
+    if not current_user or (current_user.id != owner_id and not current_user.is_admin):
+        return jsonify({"msg": "Certificate not found"}), 404
+    # Same rule as the certificate page: guests set a password first
+    if current_user.id == owner_id and not current_user.account_setup_complete:
+        return jsonify({"msg": "Set a password to download your certificate"}), 403
+
+    def _send():
+        path, digest = certificates.get_or_render(fields)
+        return send_file(path, mimetype='application/pdf', conditional=True, etag=digest,
+                         download_name=f"Certificate_{fields.name.replace(' ', '_')}.pdf", as_attachment=True)
+    try:
+        resp = _send()
+    except FileNotFoundError:
+        # Evicted by another process between render and open - render again
+        resp = _send()
+    # Personal document: browsers may keep it but must revalidate (ETag)
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
 
 @app.route('/api/forgot-password', methods=['POST'])
+@rate_limited(forgot_password_limiter)
 def forgot_password():
     email = request.json.get('email')
     user = User.query.filter_by(email=email).first()
     if user:
-        token = create_access_token(identity=str(user.id), expires_delta=timedelta(minutes=15))
+        token = issue_token(user, expires_delta=timedelta(minutes=15))
         link = f"{DOMAIN}/reset-password?token={token}"
         
         # 1. Create the nice body content matching your screenshot
@@ -1771,7 +1679,7 @@ def complete_account_setup():
     db.session.commit()
 
     # Issue a fresh, standard-expiry token now that this is a full account.
-    token = create_access_token(identity=str(user.id))
+    token = issue_token(user)
     return jsonify({
         "msg": "Account setup complete",
         "token": token,
@@ -1783,33 +1691,91 @@ def complete_account_setup():
 #  AI ROLEPLAY ROUTES (NEW)
 # ==========================================
 
+@app.route('/api/roleplay/sessions', methods=['POST'])
+@jwt_required()
+def start_roleplay_session():
+    """
+    Starts a simulation attempt. Persona, opening line and objectives come
+    from the lesson itself, not the client.
+    """
+    data = request.json or {}
+    user_id = int(get_jwt_identity())
+    module_index, lesson_index = data.get('module_index'), data.get('lesson_index')
+    # Plain non-negative ints only - a negative index would quietly pick a
+    # lesson counted from the end (bool is an int subclass, so exclude it)
+    if not all(isinstance(i, int) and not isinstance(i, bool) and i >= 0 for i in (module_index, lesson_index)):
+        return jsonify({"msg": "module_index and lesson_index must be non-negative integers"}), 400
+    course = db.session.get(Course, data.get('course_id') or 0)
+    if not course:
+        return jsonify({"msg": "Course not found"}), 404
+    lesson = roleplay.find_lesson(course, module_index, lesson_index)
+    if not lesson:
+        return jsonify({"msg": "Roleplay lesson not found"}), 404
+    if not current_user.is_admin and course.id not in (current_user.owned_course_ids or ()):
+        return jsonify({"msg": "Not enrolled"}), 403
+
+    session = roleplay.start_session(user_id, course, module_index, lesson_index, lesson)
+    db.session.commit()
+    return jsonify({"session_id": session.id, "messages": session.turns}), 201
+
+
+def _save_roleplay_reply(session_id, reply):
+    session = db.session.get(RoleplaySession, session_id)
+    if session:
+        roleplay.append_turn(session, 'assistant', reply)
+        db.session.commit()
+
+
 @app.route('/api/roleplay/chat', methods=['POST'])
 @jwt_required()
 def roleplay_chat():
     """
     Handles the conversation for a simulation lesson.
+    With a session_id the client sends only its new `message`; without one
+    (older clients) it sends the whole `messages` history and a `persona`.
     """
     data = request.json
-    messages = data.get('messages', [])
-    persona = data.get('persona', 'You are a helpful assistant.')
-    
-    # Construct conversation: System Instruction + Chat History
-    conversation = [{"role": "system", "content": persona}] + messages
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key: 
+    if not llm.is_configured(): 
         return jsonify({"role": "assistant", "content": "AI Service Unavailable (Check Server Key)"}), 500
 
+    session = None
+    if 'message' in data:
+        session = roleplay.get_session(get_jwt_identity(), data.get('session_id'))
+        if not session:
+            return jsonify({"role": "assistant", "content": "This practice session has expired. Please restart the simulation."}), 404
+        if not isinstance(data['message'], str) or not data['message'].strip():
+            return jsonify({"role": "assistant", "content": "Please type a message."}), 400
+        try:
+            roleplay.append_turn(session, 'user', data['message'])
+        except roleplay.SessionFull:
+            return jsonify({"role": "assistant", "content": "This simulation has reached its length limit. Please finish and get your feedback."}), 400
+
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o", # Use GPT-4o or gpt-3.5-turbo for speed
-            messages=conversation,
-            temperature=0.7 
-        )
-        ai_reply = response.choices[0].message.content
+        # Construct conversation: System Instruction + (summary of older
+        # turns) + recent Chat History, kept within a token budget
+        if session:
+            conversation = roleplay.session_conversation(session)
+            # Persist the user's turn (and any summary update) before the
+            # slow call, so nothing is lost if the model fails
+            db.session.commit()
+            session_id = session.id
+        else:
+            messages = roleplay.clean_messages(data.get('messages', []))
+            conversation = roleplay.build_conversation(data.get('persona', 'You are a helpful assistant.'), messages)
+
+        # Use GPT-4o or gpt-3.5-turbo for speed
+        if llm.wants_stream():
+            return llm.sse_response(conversation, "gpt-4o", log_prefix="Roleplay", temperature=0.7,
+                                    on_complete=(lambda reply: _save_roleplay_reply(session_id, reply)) if session else None)
+        ai_reply = llm.complete(conversation, "gpt-4o", temperature=0.7)
+        if session:
+            _save_roleplay_reply(session_id, ai_reply)
         return jsonify({"role": "assistant", "content": ai_reply})
+    except llm.LLMBusy:
+        return jsonify({"role": "assistant", "content": "The simulation is busy right now. Please try again in a moment."}), 503
     except Exception as e:
+        db.session.rollback()
         print(f"Roleplay Error: {e}")
         return jsonify({"role": "assistant", "content": "I'm having trouble connecting. Please try again."}), 500
 
@@ -1833,16 +1799,20 @@ def roleplay_feedback():
     student_name = user.name if user else "The Student"
 
     # 4. Get Request Data
+    # Grade from the stored turns when there is a session; older clients
+    # post the transcript themselves
     data = request.json
-    messages = data.get('messages', [])
-    learning_objectives = data.get('objectives', 'Professional communication')
+    session = roleplay.get_session(current_user_id, data.get('session_id'))
+    if session:
+        transcript = roleplay.session_transcript(session)
+        learning_objectives = session.objectives or 'Professional communication'
+    else:
+        transcript = roleplay.transcript_for_grading(roleplay.clean_messages(data.get('messages', [])))
+        learning_objectives = data.get('objectives', 'Professional communication')
     
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not llm.is_configured():
         return jsonify({"error": "Server missing API Key"}), 500
 
-    client = OpenAI(api_key=api_key)
-
     # 5. Enhanced System Prompt with the Name
     analysis_prompt = f"""
     You are an expert instructor grading a roleplay simulation.
@@ -1869,16 +1839,17 @@ def roleplay_feedback():
     """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        feedback = llm.complete(
+            [
                 {"role": "system", "content": "You are a personalized roleplay grader. Output JSON only."},
-                {"role": "user", "content": f"{analysis_prompt}\n\nTRANSCRIPT:\n{str(messages)}"}
+                {"role": "user", "content": f"{analysis_prompt}\n\nTRANSCRIPT:\n{transcript}"}
             ],
+            "gpt-4o",
             response_format={ "type": "json_object" }
         )
-        feedback = response.choices[0].message.content
         return jsonify(feedback)
+    except llm.LLMBusy:
+        return jsonify({"error": "Grading is busy right now. Please try again in a moment."}), 503
     except Exception as e:
         print(f"Feedback Error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1887,6 +1858,7 @@ def roleplay_feedback():
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     print(f"--- Starting Server on Port {port} ---") 
+    init_background_workers(app)
     app.run(host='0.0.0.0', port=port)
 
 
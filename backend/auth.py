@@ -0,0 +1,122 @@
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request, g
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt, get_jwt_identity
+from sqlalchemy import event
+from werkzeug.local import LocalProxy
+from database import db
+from models import User
+
+# Every token carries the user's token_version ("tv") and admin flag.
+# Bumping users.token_version (role change, ban, delete) revokes every token
+# issued before it. Versions are cached per process for this long, so other
+# gunicorn workers honour a revocation within TOKEN_VERSION_TTL seconds; the
+# worker that made the change honours it immediately.
+TOKEN_VERSION_TTL = 30
+
+_versions = {}  # {user_id: (token_version or None if gone, fetched_at)}
+_invalidated_at = {}  # {user_id: when a revocation for them committed}
+_versions_lock = threading.Lock()
+
+
+def issue_token(user, expires_delta=None):
+    """create_access_token with the claims admin_required and the revocation
+    check rely on. Use this instead of calling create_access_token directly."""
+    return create_access_token(
+        identity=str(user.id),
+        expires_delta=expires_delta,
+        additional_claims={"is_admin": bool(user.is_admin), "tv": user.token_version or 0}
+    )
+
+
+def _token_version(user_id, refresh=False):
+    now = time.time()
+    with _versions_lock:
+        cached = _versions.get(user_id)
+    if cached and not refresh and now - cached[1] < TOKEN_VERSION_TTL:
+        return cached[0]
+    row = db.session.query(User.token_version, User.is_deleted).filter(User.id == user_id).first()
+    version = None if not row or row.is_deleted else (row.token_version or 0)
+    with _versions_lock:
+        # A read that started before a revocation committed may have seen the
+        # old version - use it for this request, but don't cache it
+        if _invalidated_at.get(user_id, 0) < now:
+            _versions[user_id] = (version, now)
+    return version
+
+
+def revoke_tokens(user):
+    """Invalidates every token issued to user so far. Call before commit;
+    this process's cached version is dropped once the commit lands."""
+    user.token_version = (user.token_version or 0) + 1
+    db.session.info.setdefault('revoked_user_ids', set()).add(user.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_revoked_versions(session):
+    user_ids = session.info.pop('revoked_user_ids', None)
+    if not user_ids:
+        return
+    now = time.time()
+    with _versions_lock:
+        for user_id in user_ids:
+            _versions.pop(user_id, None)
+            _invalidated_at[user_id] = now
+        # Only reads still in flight care about a tombstone
+        for user_id in [u for u, at in _invalidated_at.items() if now - at > TOKEN_VERSION_TTL]:
+            del _invalidated_at[user_id]
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_revoked_versions(session):
+    session.info.pop('revoked_user_ids', None)
+
+
+def init_auth(jwt):
+    @jwt.token_in_blocklist_loader
+    def _token_revoked(jwt_header, jwt_payload):
+        try:
+            user_id = int(jwt_payload.get('sub'))
+        except (TypeError, ValueError):
+            return True
+        # Tokens minted before token versions existed carry no "tv" - treat as 0
+        tv = jwt_payload.get('tv', 0)
+        version = _token_version(user_id)
+        if version != tv:
+            # A mismatch may just mean our cached copy is older than the token
+            # (e.g. a fresh login after a restore) - confirm before rejecting
+            version = _token_version(user_id, refresh=True)
+        return version is None or tv != version
+
+
+def get_current_user():
+    """The authenticated User, loaded at most once per request (None if the
+    request has no valid token or the account no longer exists)."""
+    if 'current_user' not in g:
+        identity = get_jwt_identity()
+        g.current_user = db.session.get(User, int(identity)) if identity else None
+    return g.current_user
+
+
+current_user = LocalProxy(get_current_user)
+
+
+def admin_required(fn):
+    """jwt_required() plus an admin check. Read-only requests trust the
+    token's is_admin claim (already revocation-checked) and skip the user
+    lookup entirely; anything that writes re-checks against the database."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        claims = get_jwt()
+        if request.method in ('GET', 'HEAD') and 'is_admin' in claims:
+            if not claims['is_admin']:
+                return jsonify({"msg": "Admin only"}), 403
+            return fn(*args, **kwargs)
+        user = get_current_user()
+        if not user or not user.is_admin:
+            return jsonify({"msg": "Admin only"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,24 @@
+"""
+Rebuilds the daily_metrics rollup table from enrollment and user history.
+
+Run once after the daily_metrics migration, and any time the rollup is
+suspected to have drifted (e.g. rows edited by hand in the database).
+Safe to re-run - it replaces the table contents in a single transaction.
+
+Run from the backend/ directory:
+    python backfill_daily_metrics.py
+"""
+
+from app import app, db
+from models import DailyMetric
+import daily_metrics
+
+with app.app_context():
+    print("Rebuilding daily_metrics from history...")
+    try:
+        daily_metrics.rebuild_all()
+        db.session.commit()
+        print(f"Done. {DailyMetric.query.count()} day x course row(s) written.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error: {e}")
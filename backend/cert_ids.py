@@ -0,0 +1,223 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+from database import db
+from models import User, Course, Enrollment
+from course_cache import get_course_version
+
+# Certificate IDs and the public /api/verify-certificate lookup.
+#
+# New IDs carry a compact payload - enrollment id and completion day - and a
+# truncated HMAC over it: AIC-<payload>-<signature>, both base32. A forged or
+# mistyped ID fails the signature check and is rejected without touching the
+# database; a genuine one is looked up by primary key. Older random
+# AIC-XXXXXXXX IDs stay valid: the set of them is fixed (none are issued any
+# more), so each process loads it once and answers unknown ones from memory.
+#
+# Lookups that do reach the database land in a per-process LRU with a TTL,
+# misses included, so scrapers and link previews re-requesting the same IDs
+# cost nothing. Entries are dropped when the course version moves (titles)
+# and otherwise age out (a learner renaming themselves).
+#
+# The signing key is its own secret, CERT_SIGNING_KEY - not JWT_SECRET_KEY,
+# which gets rotated after a token leak and would take every certificate
+# ever issued down with it. To rotate CERT_SIGNING_KEY itself, move the old
+# value into CERT_SIGNING_OLD_KEYS (comma-separated): IDs signed with those
+# keep verifying, new ones are signed with the current key.
+
+# --- TUNABLES (env overridable) ---
+CERT_SIGNING_KEY = os.getenv('CERT_SIGNING_KEY', '').encode()
+CERT_SIGNING_OLD_KEYS = [k.strip().encode() for k in os.getenv('CERT_SIGNING_OLD_KEYS', '').split(',') if k.strip()]
+CERT_VERIFY_CACHE_SIZE = int(os.getenv('CERT_VERIFY_CACHE_SIZE', '10000'))
+CERT_VERIFY_TTL_SECONDS = int(os.getenv('CERT_VERIFY_TTL_SECONDS', '600'))
+CERT_VERIFY_NEGATIVE_TTL_SECONDS = int(os.getenv('CERT_VERIFY_NEGATIVE_TTL_SECONDS', '120'))
+
+PREFIX = 'AIC'
+FORMAT_VERSION = 1
+# version, enrollment id, days since EPOCH
+_PAYLOAD = struct.Struct('>BIH')
+EPOCH = date(2020, 1, 1)
+SIGNATURE_BYTES = 10  # 80 bits
+
+if not CERT_SIGNING_KEY:
+    # IDs issued before CERT_SIGNING_KEY existed were signed with the JWT
+    # secret, so that is what keeps them valid until it is set
+    CERT_SIGNING_KEY = os.getenv('JWT_SECRET_KEY', 'fallback-secret-key').encode()
+    print("--- WARNING: CERT_SIGNING_KEY is not set - signing certificate IDs with JWT_SECRET_KEY. "
+          "Rotating the JWT secret would invalidate every certificate issued so far; set "
+          "CERT_SIGNING_KEY to the current JWT_SECRET_KEY value to decouple them. ---", file=sys.stderr, flush=True)
+
+_SIGNED_RE = re.compile(r'^AIC-([A-Z2-7]{12})-([A-Z2-7]{16})$')
+_LEGACY_RE = re.compile(r'^AIC-[0-9A-F]{8}$')
+
+
+def _b32(raw):
+    return base64.b32encode(raw).decode().rstrip('=')
+
+
+def _unb32(text):
+    return base64.b32decode(text + '=' * (-len(text) % 8))
+
+
+def _sign(payload, key=None):
+    return hmac.new(key or CERT_SIGNING_KEY, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def _signed_by_known_key(payload, signature):
+    # Every key is tried, so a match doesn't leak which one it was by timing
+    matched = False
+    for key in [CERT_SIGNING_KEY, *CERT_SIGNING_OLD_KEYS]:
+        matched |= hmac.compare_digest(signature, _sign(payload, key))
+    return matched
+
+
+def issue(enrollment_id, completed_at):
+    """The certificate ID for an enrollment completed at completed_at."""
+    payload = _PAYLOAD.pack(FORMAT_VERSION, enrollment_id, (completed_at.date() - EPOCH).days)
+    return f"{PREFIX}-{_b32(payload)}-{_b32(_sign(payload))}"
+
+
+def ensure_issued(enrollment, now=None):
+    """Stamps completion date and certificate ID on a freshly completed
+    enrollment that has neither. The enrollment must already have an id.
+    Returns True if it issued one."""
+    if enrollment.certificate_id:
+        return False
+    enrollment.completion_date = now or datetime.utcnow()
+    enrollment.certificate_id = issue(enrollment.id, enrollment.completion_date)
+    return True
+
+
+def parse(cert_id):
+    """(enrollment_id, completion date) for a correctly signed ID, else None.
+    No database access."""
+    m = _SIGNED_RE.match(cert_id or '')
+    if not m:
+        return None
+    try:
+        payload, signature = _unb32(m.group(1)), _unb32(m.group(2))
+    except ValueError:
+        return None
+    if len(payload) != _PAYLOAD.size or not _signed_by_known_key(payload, signature):
+        return None
+    version, enrollment_id, days = _PAYLOAD.unpack(payload)
+    if version != FORMAT_VERSION:
+        return None
+    return enrollment_id, date.fromordinal(EPOCH.toordinal() + days)
+
+
+# ==========================================
+# LEGACY IDS
+# ==========================================
+
+_legacy_ids = None
+_legacy_lock = threading.Lock()
+
+
+def _legacy_known(cert_id):
+    global _legacy_ids
+    if _legacy_ids is None:
+        with _legacy_lock:
+            if _legacy_ids is None:
+                rows = db.session.query(Enrollment.certificate_id)\
+                    .filter(Enrollment.certificate_id.like(f'{PREFIX}-________')).all()
+                _legacy_ids = frozenset(r[0] for r in rows if _LEGACY_RE.match(r[0]))
+    return cert_id in _legacy_ids
+
+
+# ==========================================
+# VERIFICATION
+# ==========================================
+
+_entries = OrderedDict()  # {cert_id: (result or None, stored_at)}
+_version = None
+_stats = {"hits": 0, "misses": 0, "rejected": 0}
+_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _lock:
+        _stats[outcome] += 1
+
+
+def _cache_get(cert_id):
+    global _version
+    version = get_course_version()
+    now = time.monotonic()
+    with _lock:
+        if version != _version:
+            _entries.clear()
+            _version = version
+        entry = _entries.get(cert_id)
+        if entry is None:
+            return False, None
+        result, stored_at = entry
+        ttl = CERT_VERIFY_TTL_SECONDS if result else CERT_VERIFY_NEGATIVE_TTL_SECONDS
+        if now - stored_at > ttl:
+            del _entries[cert_id]
+            return False, None
+        _entries.move_to_end(cert_id)
+        return True, result
+
+
+def _cache_put(cert_id, result):
+    with _lock:
+        _entries[cert_id] = (result, time.monotonic())
+        _entries.move_to_end(cert_id)
+        while len(_entries) > CERT_VERIFY_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def _lookup(cert_id, enrollment_id=None):
+    query = db.session.query(Enrollment.completion_date, User.name, Course.title)\
+        .join(User, User.id == Enrollment.user_id)\
+        .join(Course, Course.id == Enrollment.course_id)\
+        .filter(Enrollment.certificate_id == cert_id)
+    if enrollment_id is not None:
+        query = query.filter(Enrollment.id == enrollment_id)
+    row = query.first()
+    if not row:
+        return None
+    completion_date, student_name, course_title = row
+    return {
+        "student_name": student_name,
+        "course_title": course_title,
+        "completion_date": completion_date.strftime('%Y-%m-%d') if completion_date else None,
+    }
+
+
+def verify(cert_id):
+    """{student_name, course_title, completion_date} for a valid certificate,
+    else None."""
+    signed = parse(cert_id)
+    if signed is None and not (_LEGACY_RE.match(cert_id or '') and _legacy_known(cert_id)):
+        _count("rejected")
+        return None
+
+    hit, result = _cache_get(cert_id)
+    _count("hits" if hit else "misses")
+    if hit:
+        return result
+    result = _lookup(cert_id, signed[0] if signed else None)
+    _cache_put(cert_id, result)
+    return result
+
+
+def stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "hit_rate": round(_stats["hits"] / lookups * 100, 1) if lookups else 0
+        }
+
@@ -0,0 +1,323 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from database import db
+from models import User, Course, Enrollment
+
+# Certificate PDFs, rendered server-side and kept in a content-addressed
+# disk cache. The cache key is a hash of everything printed on the page
+# plus TEMPLATE_VERSION, so a renamed learner or course simply hashes to a
+# new file - nothing is ever invalidated by hand. Least-recently-served
+# files are evicted once the cache outgrows CERT_CACHE_MAX_BYTES.
+#
+# Rendering needs no database or app context (fields are looked up first),
+# which is what lets render_many fan out over a process pool.
+
+# --- TUNABLES (env overridable) ---
+CERT_CACHE_DIR = os.getenv('CERT_CACHE_DIR', os.path.join(os.getcwd(), 'uploads', 'certificates'))
+CERT_CACHE_MAX_BYTES = int(os.getenv('CERT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+CERT_RENDER_PROCESSES = int(os.getenv('CERT_RENDER_PROCESSES', str(max(1, (os.cpu_count() or 2) - 1))))
+CERT_LOGO_PATH = os.getenv('CERT_LOGO_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist', 'logo.png'))
+# Bump whenever the layout below changes - every cached PDF then re-renders
+TEMPLATE_VERSION = '1'
+# Eviction trims down to this fraction of the budget, so it runs rarely
+EVICT_TO_FRACTION = 0.9
+
+CertificateFields = namedtuple('CertificateFields', ['certificate_id', 'name', 'course_title', 'completion_date', 'score'])
+
+
+def verification_url(certificate_id):
+    return f"{os.getenv('FRONTEND_URL', 'http://localhost:5173')}/verify/{certificate_id}"
+
+
+# ==========================================
+# LOOKUP
+# ==========================================
+
+def fields_for(certificate_id):
+    """(CertificateFields, owner user_id) for an issued certificate, or None.
+    One joined query."""
+    row = db.session.query(
+        Enrollment.certificate_id, Enrollment.user_id, Enrollment.completion_date, Enrollment.score,
+        User.name, Course.title
+    ).join(User, User.id == Enrollment.user_id)\
+     .join(Course, Course.id == Enrollment.course_id)\
+     .filter(Enrollment.certificate_id == certificate_id).first()
+    if not row:
+        return None
+    return _fields(row), row.user_id
+
+
+def _fields(row):
+    return CertificateFields(
+        row.certificate_id, row.name or "Student", row.title or "",
+        row.completion_date.strftime('%B %d, %Y') if row.completion_date else "",
+        int(round(row.score)) if row.score else None
+    )
+
+
+def completed_fields(course_id=None):
+    """CertificateFields for every issued certificate (optionally one course)."""
+    query = db.session.query(
+        Enrollment.certificate_id, Enrollment.completion_date, Enrollment.score, User.name, Course.title
+    ).join(User, User.id == Enrollment.user_id)\
+     .join(Course, Course.id == Enrollment.course_id)\
+     .filter(Enrollment.certificate_id != None)
+    if course_id is not None:
+        query = query.filter(Enrollment.course_id == course_id)
+    return [_fields(r) for r in query.all()]
+
+
+# ==========================================
+# TEMPLATE
+# ==========================================
+
+class CertificateTemplate:
+    """The parts of the page that never change, prepared once per process:
+    font metrics, the decoded logo, and the static layer as a list of
+    canvas operations. render() replays that layer and stamps only the
+    learner's fields on top.
+
+    (ReportLab can't share content streams between separate documents, so
+    "pre-built" means prepared and measured up front, not copied bytes.)"""
+
+    RED = (220 / 255, 38 / 255, 38 / 255)
+    DARK = (17 / 255, 24 / 255, 39 / 255)
+    GREY = (107 / 255, 114 / 255, 128 / 255)
+    LIGHT = (229 / 255, 231 / 255, 235 / 255)
+
+    def __init__(self):
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.utils import ImageReader
+
+        self.width, self.height = landscape(A4)
+        self.left = 72 + 48  # sidebar + margin
+        self.right = self.width - 48
+        try:
+            self.logo = ImageReader(CERT_LOGO_PATH) if os.path.exists(CERT_LOGO_PATH) else None
+        except Exception:
+            self.logo = None
+        self.static_ops = self._static_ops()
+
+    def _static_ops(self):
+        w, h, left, right = self.width, self.height, self.left, self.right
+        ops = [
+            # Sidebar with the red edge
+            ('setFillColorRGB', (0, 0, 0)), ('rect', (0, 0, 72, h), {'stroke': 0, 'fill': 1}),
+            ('setFillColorRGB', self.RED), ('rect', (66, 0, 6, h), {'stroke': 0, 'fill': 1}),
+            # Header
+            ('setFillColorRGB', self.DARK), ('setFont', ('Helvetica-Bold', 20)),
+            ('drawString', (left + (70 if self.logo else 0), h - 78, "AICourseHub")),
+            ('setFillColorRGB', self.GREY), ('setFont', ('Helvetica-Bold', 8)),
+            ('drawString', (left + (70 if self.logo else 0), h - 94, "PROFESSIONAL CERTIFICATION")),
+            ('setFont', ('Courier', 8)), ('drawRightString', (right, h - 70, "CERTIFICATE ID")),
+            # Body labels
+            ('setFillColorRGB', self.RED), ('setFont', ('Helvetica-Bold', 11)),
+            ('drawString', (left, h - 190, "CERTIFICATE OF COMPLETION")),
+            ('setFillColorRGB', self.GREY), ('setFont', ('Helvetica', 15)),
+            ('drawString', (left, h - 220, "This is to certify that")),
+            ('drawString', (left, h - 318, "Has successfully completed the comprehensive course curriculum for")),
+            ('setFillColorRGB', self.RED), ('rect', (left, h - 412, 4, 70), {'stroke': 0, 'fill': 1}),
+            # Footer
+            ('setStrokeColorRGB', self.LIGHT), ('line', (left, 110, right, 110)),
+            ('setFillColorRGB', self.DARK), ('setFont', ('Helvetica-Bold', 12)),
+            ('drawString', (left, 80, "Certifying Authority")),
+            ('setFillColorRGB', self.GREY), ('setFont', ('Helvetica-Bold', 8)),
+            ('drawString', (left, 66, "AICourseHubPro")),
+            ('setFont', ('Courier', 7)), ('drawRightString', (right - 78, 80, "Scan to verify")),
+            ('drawRightString', (right - 78, 70, "authenticity")),
+        ]
+        if self.logo:
+            ops.append(('drawImage', (self.logo, left, h - 100, 56, 56), {'preserveAspectRatio': True, 'mask': 'auto'}))
+        # "Pro" after the wordmark, positioned once from the font metrics
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        ops += [
+            ('setFillColorRGB', self.RED), ('setFont', ('Helvetica-Bold', 20)),
+            ('drawString', (left + (70 if self.logo else 0) + stringWidth("AICourseHub ", 'Helvetica-Bold', 20), h - 78, "Pro")),
+        ]
+        return ops
+
+    def _fit(self, text, font, size, max_width, min_size):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        while size > min_size and stringWidth(text, font, size) > max_width:
+            size -= 2
+        return size
+
+    def render(self, fields):
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.utils import simpleSplit
+        from reportlab.graphics.barcode.qr import QrCodeWidget
+        from reportlab.graphics.shapes import Drawing
+        from reportlab.graphics import renderPDF
+
+        buf = BytesIO()
+        c = canvas.Canvas(buf, pagesize=(self.width, self.height), pageCompression=1)
+        c.setTitle(f"Certificate {fields.certificate_id}")
+        c.setAuthor("AICourseHubPro")
+
+        for op in self.static_ops:
+            name, args = op[0], op[1]
+            getattr(c, name)(*args, **(op[2] if len(op) > 2 else {}))
+
+        h, left, right = self.height, self.left, self.right
+        c.setFillColorRGB(*self.DARK)
+        c.setFont('Courier-Bold', 10)
+        c.drawRightString(right, h - 84, fields.certificate_id)
+
+        size = self._fit(fields.name, 'Helvetica-Bold', 44, right - left, 22)
+        c.setFont('Helvetica-Bold', size)
+        c.drawString(left, h - 278, fields.name)
+
+        c.setFillColorRGB(31 / 255, 41 / 255, 55 / 255)
+        lines = simpleSplit(fields.course_title, 'Helvetica-Bold', 26, right - left - 20)[:2]
+        for i, line in enumerate(lines):
+            c.setFont('Helvetica-Bold', 26)
+            c.drawString(left + 18, h - 368 - i * 30, line)
+
+        c.setFillColorRGB(*self.GREY)
+        c.setFont('Helvetica-Bold', 11)
+        badges = ([f"Score: {fields.score}%"] if fields.score is not None else []) + \
+                 ([f"Issued: {fields.completion_date}"] if fields.completion_date else [])
+        c.drawString(left, h - 450, "     ".join(badges))
+
+        qr = QrCodeWidget(verification_url(fields.certificate_id))
+        x0, y0, x1, y1 = qr.getBounds()
+        d = Drawing(64, 64, transform=[64 / (x1 - x0), 0, 0, 64 / (y1 - y0), 0, 0])
+        d.add(qr)
+        renderPDF.draw(d, c, right - 64, 50)
+
+        c.showPage()
+        c.save()
+        return buf.getvalue()
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def template():
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = CertificateTemplate()
+    return _template
+
+
+# ==========================================
+# DISK CACHE
+# ==========================================
+
+_cache_bytes = None  # this process's running estimate; rescanned on eviction
+_cache_lock = threading.Lock()
+
+
+def digest_of(fields):
+    return hashlib.sha256("\x1f".join([TEMPLATE_VERSION] + [str(f) for f in fields]).encode('utf-8')).hexdigest()
+
+
+def cache_path(digest):
+    return os.path.join(CERT_CACHE_DIR, digest[:2], f"{digest}.pdf")
+
+
+def _cached_files():
+    for root, _, files in os.walk(CERT_CACHE_DIR):
+        for name in files:
+            if name.endswith('.pdf'):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+
+def _evict():
+    """Deletes least recently served files until under budget. Caller holds
+    _cache_lock."""
+    global _cache_bytes
+    files = sorted(_cached_files(), key=lambda f: f[2])
+    total = sum(size for _, size, _ in files)
+    target = CERT_CACHE_MAX_BYTES * EVICT_TO_FRACTION
+    for path, size, _ in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+    _cache_bytes = total
+
+
+def _account(size):
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(s for _, s, _ in _cached_files())
+        else:
+            _cache_bytes += size
+        if _cache_bytes > CERT_CACHE_MAX_BYTES:
+            _evict()
+
+
+def get_or_render(fields):
+    """(path, digest) of the PDF for fields, rendering it on a cache miss."""
+    digest = digest_of(fields)
+    path = cache_path(digest)
+    try:
+        os.utime(path)  # hit: mark recently used for eviction
+        return path, digest
+    except FileNotFoundError:
+        pass
+
+    pdf = template().render(fields)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write-then-rename so a concurrent reader never sees half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _account(len(pdf))
+    return path, digest
+
+
+# ==========================================
+# BULK
+# ==========================================
+
+def _render_one(fields):
+    try:
+        get_or_render(fields)
+        return None
+    except Exception as e:
+        return f"{fields.certificate_id}: {e}"
+
+
+def render_many(fields_list, processes=None):
+    """Renders (or finds cached) every certificate in fields_list on a
+    process pool. Returns the list of error strings (empty on success)."""
+    fields_list = list(fields_list)
+    if not fields_list:
+        return []
+    workers = max(1, min(processes or CERT_RENDER_PROCESSES, len(fields_list)))
+    if workers == 1:
+        errors = [_render_one(f) for f in fields_list]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            errors = list(pool.map(_render_one, fields_list, chunksize=8))
+    for e in errors:
+        if e:
+            print(f"--- CERTIFICATE RENDER ERROR: {e} ---", file=sys.stderr, flush=True)
+    return [e for e in errors if e]
@@ -0,0 +1,146 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from course_cache import get_course_version
+
+# Answer cache for the Nova support chat. Most visitors ask the same handful
+# of things (pricing, refunds, certificates, the course list), so an answer
+# is reused for the same question - or a close rewording of it - instead of
+# going back to the model with the whole Nova prompt again.
+#
+# Lookup: exact match on the normalized question first, then TF-IDF cosine
+# similarity against every cached question. Per process, LRU + TTL, and
+# dropped wholesale whenever the course content version changes (the
+# answers quote course names and prices).
+
+# --- TUNABLES (env overridable) ---
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', '256'))
+CHAT_CACHE_TTL_SECONDS = int(os.getenv('CHAT_CACHE_TTL_SECONDS', str(6 * 3600)))
+CHAT_CACHE_SIMILARITY = float(os.getenv('CHAT_CACHE_SIMILARITY', '0.8'))
+# Long messages are rarely FAQs and rarely repeat - don't bother caching them
+CHAT_CACHE_MAX_QUESTION_CHARS = 300
+
+_STOPWORDS = frozenset("""
+a an and are as at be can could do does for from have hi hello hey how i if in is it its me my of on or
+please the there this to u what whats when where which who will with would you your
+""".split())
+
+_entries = OrderedDict()  # {normalized question: (answer, tokens Counter, stored_at)}
+_doc_freq = Counter()     # token -> how many cached questions contain it
+_version = None
+_stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0}
+_lock = threading.Lock()
+
+
+def normalize(question):
+    text = re.sub(r"[^a-z0-9$ ]+", " ", question.lower().replace("'", ""))
+    return " ".join(text.split())
+
+
+def _stem(token):
+    # Just enough to match "refund"/"refunds", "certificate"/"certificates"
+    return token[:-1] if len(token) > 3 and token.endswith('s') and not token.endswith('ss') else token
+
+
+def _tokens(normalized):
+    return Counter(_stem(t) for t in normalized.split() if t not in _STOPWORDS)
+
+
+def _forget(key):
+    _, tokens, _ = _entries.pop(key)
+    for t in tokens:
+        _doc_freq[t] -= 1
+        if _doc_freq[t] <= 0:
+            del _doc_freq[t]
+
+
+def _clear():
+    _entries.clear()
+    _doc_freq.clear()
+
+
+def _check_version(version):
+    # Catalog edits (new course, renamed course, price change) make cached
+    # answers wrong - start over whenever the shared version moves.
+    global _version
+    if version != _version:
+        _clear()
+        _version = version
+
+
+def _tfidf(tokens):
+    n = len(_entries) + 1
+    vec = {t: c * (math.log(n / (1 + _doc_freq.get(t, 0))) + 1) for t, c in tokens.items()}
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {t: v / norm for t, v in vec.items()}
+
+
+def _most_similar(tokens):
+    query = _tfidf(tokens)
+    best_key, best_score = None, 0.0
+    for key, (_, cached_tokens, _) in _entries.items():
+        if not query.keys() & cached_tokens.keys():
+            continue
+        cached = _tfidf(cached_tokens)
+        score = sum(w * cached.get(t, 0.0) for t, w in query.items())
+        if score > best_score:
+            best_key, best_score = key, score
+    return best_key, best_score
+
+
+def lookup(question):
+    """Cached answer for question (or a close rewording of it), or None."""
+    key = normalize(question)
+    if not key or len(question) > CHAT_CACHE_MAX_QUESTION_CHARS:
+        return None
+    version = get_course_version()
+    now = time.time()
+    with _lock:
+        _check_version(version)
+        for k in [k for k, (_, _, stored_at) in _entries.items() if now - stored_at > CHAT_CACHE_TTL_SECONDS]:
+            _forget(k)
+
+        if key in _entries:
+            _entries.move_to_end(key)
+            _stats["exact_hits"] += 1
+            return _entries[key][0]
+
+        tokens = _tokens(key)
+        if tokens:
+            match, score = _most_similar(tokens)
+            if match is not None and score >= CHAT_CACHE_SIMILARITY:
+                _entries.move_to_end(match)
+                _stats["similar_hits"] += 1
+                return _entries[match][0]
+
+        _stats["misses"] += 1
+        return None
+
+
+def store(question, answer):
+    key = normalize(question)
+    if not key or not answer or len(question) > CHAT_CACHE_MAX_QUESTION_CHARS:
+        return
+    with _lock:
+        if key in _entries:
+            _forget(key)
+        tokens = _tokens(key)
+        _entries[key] = (answer, tokens, time.time())
+        _doc_freq.update(tokens.keys())
+        while len(_entries) > CHAT_CACHE_MAX_ENTRIES:
+            _forget(next(iter(_entries)))
+
+
+def stats():
+    with _lock:
+        lookups = sum(_stats.values())
+        hits = _stats["exact_hits"] + _stats["similar_hits"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "hit_rate": round(hits / lookups * 100, 1) if lookups else 0
+        }
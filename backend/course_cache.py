@@ -0,0 +1,121 @@
+import hashlib
+import json
+import threading
+import uuid
+
+from flask import Response, request
+from database import db
+from models import Course, SystemSetting
+
+# Shared "course content version" stamp. Lives in system_settings so every
+# gunicorn worker sees a bump made by any other worker - each worker keeps its
+# own rendered copy, but they all agree on when that copy went stale.
+COURSE_VERSION_KEY = 'course_content_version'
+
+# {cache_key: (version, body_bytes, etag)} - one entry per view (catalog, full
+# list) plus one per course curriculum. Tiny: a handful of courses.
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_course_version():
+    row = SystemSetting.query.filter_by(key=COURSE_VERSION_KEY).first()
+    return row.value if row else '0'
+
+
+def bump_course_version():
+    """Marks every cached course payload stale. Call from any route that
+    changes course content, BEFORE its db.session.commit() so the bump lands
+    in the same transaction as the change itself.
+
+    Random rather than an incrementing counter so two admins saving at the
+    same moment can never both land on the same "next" version."""
+    new_version = uuid.uuid4().hex[:16]
+    row = SystemSetting.query.filter_by(key=COURSE_VERSION_KEY).first()
+    if row:
+        row.value = new_version
+    else:
+        db.session.add(SystemSetting(key=COURSE_VERSION_KEY, value=new_version))
+    return new_version
+
+
+def _live_courses_query():
+    return Course.query.filter((Course.is_deleted == False) | (Course.is_deleted == None))
+
+
+def _modules_of(course_data):
+    return course_data.get('modules', []) if course_data else []
+
+
+def _summary(c):
+    modules = _modules_of(c.course_data)
+    return {
+        'id': c.id, 'title': c.title, 'description': c.description,
+        'price': c.price, 'category': c.category,
+        'module_count': len(modules),
+        'lesson_count': sum(len(m.get('lessons', []) or []) for m in modules if isinstance(m, dict)),
+    }
+
+
+def _build_catalog():
+    return [_summary(c) for c in _live_courses_query().order_by(Course.id).all()]
+
+
+def _build_full_list():
+    return [{
+        'id': c.id, 'title': c.title, 'description': c.description,
+        'price': c.price, 'stripe_price_id': c.stripe_price_id, 'category': c.category,
+        'modules': _modules_of(c.course_data)
+    } for c in _live_courses_query().order_by(Course.id).all()]
+
+
+def _build_curriculum(course_id):
+    c = _live_courses_query().filter(Course.id == course_id).first()
+    if not c:
+        return None
+    payload = _summary(c)
+    payload['modules'] = _modules_of(c.course_data)
+    return payload
+
+
+def _cached(cache_key, builder):
+    """Returns (body, etag) for cache_key at the current course version,
+    rebuilding only on a version change. Returns None if builder does."""
+    version = get_course_version()
+    with _cache_lock:
+        entry = _cache.get(cache_key)
+    if entry and entry[0] == version:
+        return entry[1], entry[2]
+
+    data = builder()
+    if data is None:
+        return None
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    with _cache_lock:
+        _cache[cache_key] = (version, body, etag)
+    return body, etag
+
+
+def _conditional_response(cached):
+    body, etag = cached
+    resp = Response(body, status=200, mimetype='application/json')
+    resp.set_etag(etag)
+    # Clients may keep a copy but must revalidate - a 304 costs one tiny
+    # version lookup and no body.
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+
+def catalog_response(view='full'):
+    if view == 'catalog':
+        return _conditional_response(_cached('catalog', _build_catalog))
+    return _conditional_response(_cached('full', _build_full_list))
+
+
+def curriculum_response(course_id):
+    """None if the course doesn't exist (or is archived)."""
+    cached = _cached(f'curriculum:{course_id}', lambda: _build_curriculum(course_id))
+    if cached is None:
+        return None
+    return _conditional_response(cached)
@@ -0,0 +1,166 @@
+from datetime import datetime
+from sqlalchemy import func, literal, cast, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import User, Course, Enrollment, DailyMetric, Payment
+
+# course_id used for rows that aren't about any one course (signups)
+SITE_WIDE = 0
+
+_COUNTERS = ('enrollments', 'completions', 'revenue', 'signups')
+
+
+def _upsert(stmt):
+    """Adds the incoming counters onto an existing (day, course_id) row
+    instead of failing on the unique constraint."""
+    return stmt.on_conflict_do_update(
+        index_elements=['day', 'course_id'],
+        set_={k: getattr(DailyMetric.__table__.c, k) + getattr(stmt.excluded, k) for k in _COUNTERS}
+    )
+
+
+def _day(when):
+    return (when or datetime.utcnow()).date()
+
+
+def _record_courses(course_ids, when, enrollments, revenue):
+    select = db.session.query(
+        literal(_day(when)).label('day'),
+        Course.id.label('course_id'),
+        literal(enrollments).label('enrollments'),
+        literal(0).label('completions'),
+        literal(float(revenue) / len(course_ids)).label('revenue'),
+        literal(0).label('signups'),
+    ).filter(Course.id.in_(course_ids))
+    stmt = insert(DailyMetric.__table__).from_select(
+        ['day', 'course_id', 'enrollments', 'completions', 'revenue', 'signups'], select
+    )
+    db.session.execute(_upsert(stmt))
+
+
+def record_enrollments(course_ids, when=None):
+    """Call in the same transaction as the new Enrollment rows (before
+    commit). One round-trip for a course or a whole bundle."""
+    course_ids = sorted({int(c) for c in course_ids if c is not None})
+    if course_ids:
+        _record_courses(course_ids, when, 1, 0.0)
+
+
+def record_revenue(course_ids, amount, when=None):
+    """A paid checkout's amount, split evenly across the courses it added -
+    a bundle's price has no per-course breakdown. A payment that added no
+    course (a repeat purchase awaiting refund review) lands on the SITE_WIDE
+    row, so it still counts towards total revenue."""
+    course_ids = sorted({int(c) for c in course_ids if c is not None})
+    if not amount:
+        return
+    if course_ids:
+        _record_courses(course_ids, when, 0, amount)
+        return
+    stmt = insert(DailyMetric.__table__).values(
+        day=_day(when), course_id=SITE_WIDE,
+        enrollments=0, completions=0, revenue=float(amount), signups=0
+    )
+    db.session.execute(_upsert(stmt))
+
+
+def record_completion(course_id, when=None):
+    stmt = insert(DailyMetric.__table__).values(
+        day=_day(when), course_id=int(course_id),
+        enrollments=0, completions=1, revenue=0.0, signups=0
+    )
+    db.session.execute(_upsert(stmt))
+
+
+def record_signup(when=None, count=1):
+    """Signups exclude admins and soft-deleted users, like the growth
+    figures always have: pass count=-1 (with the user's created_at as when)
+    when a user is soft-deleted, and 1 again if they're restored."""
+    stmt = insert(DailyMetric.__table__).values(
+        day=_day(when), course_id=SITE_WIDE,
+        enrollments=0, completions=0, revenue=0.0, signups=count
+    )
+    db.session.execute(_upsert(stmt))
+
+
+def rebuild_all():
+    """Throws the rollup away and recomputes it from enrollments, payments
+    and users.
+    Caller commits. Used by backfill_daily_metrics.py and after bulk deletes
+    (e.g. reset-test-data) that the incremental path can't see."""
+    db.session.query(DailyMetric).delete(synchronize_session=False)
+    cols = ['day', 'course_id', 'enrollments', 'completions', 'revenue', 'signups']
+
+    enr_day = cast(Enrollment.enrolled_at, Date)
+    enrollments = db.session.query(
+        enr_day, Enrollment.course_id,
+        func.count(Enrollment.id), literal(0),
+        literal(0.0), literal(0),
+    ).join(Course, Course.id == Enrollment.course_id)\
+     .filter(Enrollment.enrolled_at != None)\
+     .group_by(enr_day, Enrollment.course_id)
+    db.session.execute(_upsert(insert(DailyMetric.__table__).from_select(cols, enrollments)))
+
+    # Each payment's amount split evenly over the courses it bought, as
+    # record_revenue does
+    shares = db.session.query(
+        cast(Payment.paid_at, Date).label('day'),
+        func.unnest(Payment.course_ids).label('course_id'),
+        (Payment.amount_cents / 100.0 / func.cardinality(Payment.course_ids)).label('share'),
+    ).filter(func.cardinality(Payment.course_ids) > 0).subquery()
+    revenue = db.session.query(
+        shares.c.day, shares.c.course_id,
+        literal(0), literal(0),
+        func.sum(shares.c.share), literal(0),
+    ).join(Course, Course.id == shares.c.course_id)\
+     .group_by(shares.c.day, shares.c.course_id)
+    db.session.execute(_upsert(insert(DailyMetric.__table__).from_select(cols, revenue)))
+    # ...and payments that added no course, on the site-wide row
+    pay_day = cast(Payment.paid_at, Date)
+    unattributed = db.session.query(
+        pay_day, literal(SITE_WIDE),
+        literal(0), literal(0),
+        func.sum(Payment.amount_cents / 100.0), literal(0),
+    ).filter(func.cardinality(Payment.course_ids) == 0)\
+     .group_by(pay_day)
+    db.session.execute(_upsert(insert(DailyMetric.__table__).from_select(cols, unattributed)))
+
+    done_day = cast(Enrollment.completion_date, Date)
+    completions = db.session.query(
+        done_day, Enrollment.course_id,
+        literal(0), func.count(Enrollment.id),
+        literal(0.0), literal(0),
+    ).filter(Enrollment.completion_date != None)\
+     .group_by(done_day, Enrollment.course_id)
+    db.session.execute(_upsert(insert(DailyMetric.__table__).from_select(cols, completions)))
+
+    signup_day = cast(User.created_at, Date)
+    signups = db.session.query(
+        signup_day, literal(SITE_WIDE),
+        literal(0), literal(0),
+        literal(0.0), func.count(User.id),
+    ).filter(User.created_at != None, User.is_admin == False, User.is_deleted == False)\
+     .group_by(signup_day)
+    db.session.execute(_upsert(insert(DailyMetric.__table__).from_select(cols, signups)))
+
+
+def total_revenue():
+    return float(db.session.query(func.sum(DailyMetric.revenue)).scalar() or 0)
+
+
+def per_course_totals():
+    """{course_id: (enrollments, completions, revenue)} across all time."""
+    rows = db.session.query(
+        DailyMetric.course_id,
+        func.sum(DailyMetric.enrollments), func.sum(DailyMetric.completions), func.sum(DailyMetric.revenue)
+    ).filter(DailyMetric.course_id != SITE_WIDE)\
+     .group_by(DailyMetric.course_id).all()
+    return {cid: (int(e or 0), int(c or 0), float(r or 0)) for cid, e, c, r in rows}
+
+
+def bucketed(column, since, bucket='day'):
+    """[(bucket_start, total)] of one counter column since a date."""
+    b = func.date_trunc(bucket, cast(DailyMetric.day, DateTime))
+    return db.session.query(b, func.sum(getattr(DailyMetric, column)))\
+        .filter(DailyMetric.day >= since.date())\
+        .group_by(b).all()
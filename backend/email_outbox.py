@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+from datetime import datetime
+
+import resend
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import OutboundEmail
+from lease_queue import LeaseQueue
+
+# --- TUNABLES (env overridable) ---
+EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', '2'))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '20'))
+EMAIL_POLL_SECONDS = float(os.getenv('EMAIL_POLL_SECONDS', '5'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '6'))
+EMAIL_BACKOFF_BASE_SECONDS = 30
+EMAIL_BACKOFF_MAX_SECONDS = 3600
+# A claimed row is leased for this long. If the process dies mid-send the
+# row becomes due again afterwards and another worker retries it.
+EMAIL_LEASE_SECONDS = 600
+
+
+# ==========================================
+# TRANSPORTS
+# ==========================================
+
+class ResendTransport:
+    """Real delivery through Resend. Uses the batch API for multi-message
+    batches, falling back to one-by-one so a single bad address can't sink
+    the rest of the batch."""
+
+    def send_batch(self, messages):
+        if len(messages) > 1 and hasattr(resend, 'Batch'):
+            try:
+                resend.Batch.send(messages)
+                return [None] * len(messages)
+            except Exception as e:
+                print(f"--- EMAIL BATCH ERROR ({len(messages)} msgs), retrying individually: {e} ---", file=sys.stderr, flush=True)
+        errors = []
+        for m in messages:
+            try:
+                resend.Emails.send(m)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+
+class FakeTransport:
+    """Local transport for development and tests - records messages in
+    memory instead of calling the provider. fail_next makes the next N
+    messages fail, to exercise the retry path."""
+
+    def __init__(self):
+        self.sent = []
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        errors = []
+        with self._lock:
+            for m in messages:
+                if self.fail_next > 0:
+                    self.fail_next -= 1
+                    errors.append("fake transport: forced failure")
+                else:
+                    self.sent.append(m)
+                    errors.append(None)
+        return errors
+
+
+def _default_transport():
+    if os.getenv('EMAIL_TRANSPORT', 'resend').lower() == 'fake':
+        return FakeTransport()
+    return ResendTransport()
+
+
+transport = _default_transport()
+
+
+# ==========================================
+# ENQUEUE
+# ==========================================
+
+def enqueue_email(to_email, subject, html_content, sender_name, sender_email, dedup_key=None):
+    """Queues one email for background delivery. Returns False if an email
+    with the same dedup_key was already queued (nothing new is sent).
+
+    Writes on its own connection/transaction, so it never commits - or
+    gets rolled back with - whatever the caller's db.session is doing."""
+    if not to_email:
+        return False
+    now = datetime.utcnow()
+    stmt = insert(OutboundEmail.__table__).values(
+        dedup_key=dedup_key, to_email=to_email, subject=subject, html=html_content,
+        sender_name=sender_name, sender_email=sender_email,
+        status='pending', attempts=0, next_attempt_at=now, created_at=now
+    ).on_conflict_do_nothing(index_elements=['dedup_key'])
+    with db.engine.begin() as conn:
+        inserted = conn.execute(stmt).rowcount
+    _queue.wake()
+    return bool(inserted)
+
+
+# ==========================================
+# WORKER
+# ==========================================
+
+def _snapshot(r):
+    return (r.id, r.attempts, {
+        "from": f"{r.sender_name} <{r.sender_email}>",
+        "to": r.to_email,
+        "subject": r.subject,
+        "html": r.html
+    })
+
+
+def _deliver(claimed):
+    errors = transport.send_batch([m for _, _, m in claimed])
+    now = datetime.utcnow()
+    for (email_id, attempts, msg), error in zip(claimed, errors):
+        if error is None:
+            values = {"status": 'sent', "sent_at": now, "last_error": None}
+            print(f"--- EMAIL SUCCESS: Sent to {msg['to']} ---", flush=True)
+        elif attempts >= EMAIL_MAX_ATTEMPTS:
+            values = {"status": 'failed', "last_error": error}
+            print(f"--- EMAIL FAILED: Giving up on {msg['to']} after {attempts} attempts: {error} ---", file=sys.stderr, flush=True)
+        else:
+            values = {"status": 'pending', "last_error": error, "next_attempt_at": now + _queue.backoff(attempts)}
+            print(f"--- EMAIL ERROR: Failed to send to {msg['to']} (attempt {attempts}), will retry: {error} ---", file=sys.stderr, flush=True)
+        db.session.execute(update(OutboundEmail).where(OutboundEmail.id == email_id).values(**values))
+    db.session.commit()
+
+
+_queue = LeaseQueue(
+    'email', OutboundEmail, _snapshot, _deliver, claimed_status='sending',
+    batch_size=EMAIL_BATCH_SIZE, poll_seconds=EMAIL_POLL_SECONDS, lease_seconds=EMAIL_LEASE_SECONDS,
+    backoff_base_seconds=EMAIL_BACKOFF_BASE_SECONDS, backoff_max_seconds=EMAIL_BACKOFF_MAX_SECONDS
+)
+
+
+def process_batch():
+    """Claims and delivers one batch. Returns how many rows it handled."""
+    return _queue.process_batch()
+
+
+def start_email_workers(app, count=None):
+    """Starts the in-process delivery pool (idempotent per process)."""
+    _queue.start_workers(app, count if count is not None else EMAIL_WORKERS)
+
+
+def stop_email_workers():
+    _queue.stop_workers()
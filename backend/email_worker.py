@@ -0,0 +1,32 @@
+"""
+Standalone email delivery worker for the outbox in email_outbox.py.
+
+Only needed when the web app runs with EMAIL_WORKER_MODE=process (otherwise
+each gunicorn worker already runs its own small delivery pool). Safe to run
+several copies - rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED.
+
+Run from the backend/ directory:
+    EMAIL_WORKER_MODE=process python email_worker.py
+"""
+
+import signal
+import time
+
+from app import app
+from email_outbox import start_email_workers, stop_email_workers, EMAIL_WORKERS
+
+if __name__ == "__main__":
+    print(f"--- Email worker starting ({EMAIL_WORKERS} thread(s)) ---", flush=True)
+    start_email_workers(app)
+
+    running = True
+    def _shutdown(*_):
+        global running
+        running = False
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    while running:
+        time.sleep(1)
+    stop_email_workers()
+    print("--- Email worker stopped ---", flush=True)
@@ -0,0 +1,99 @@
+from datetime import datetime
+from sqlalchemy import Integer, func, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array, insert
+from database import db
+from models import Course, Enrollment, User
+import daily_metrics
+import payments
+
+
+def _live_courses_filter():
+    return (Course.is_deleted == False) | (Course.is_deleted == None)
+
+
+def grant_courses(user_id, course_ids=None, all_courses=False, stripe_session_id=None, payment=None):
+    """Enrolls user_id in course_ids (or every live course with all_courses)
+    and returns the ids that were newly added - courses already owned are
+    skipped, not errors. Also records the new enrollments in daily_metrics
+    and, given the paid checkout session (a CheckoutSessionInfo) as
+    payment, its ledger row and revenue (see record_paid_checkout). Caller
+    commits - whenever payment was given, even if nothing was added, or the
+    ledger row is lost.
+
+    One INSERT ... SELECT ... ON CONFLICT (user_id, course_id) DO NOTHING
+    RETURNING, so a whole bundle is a single round-trip, and the browser's
+    verify-payment and the webhook granting the same purchase at the same
+    moment can't both insert (or both miss) a row."""
+    if not all_courses:
+        course_ids = sorted({int(c) for c in course_ids or [] if c is not None})
+        if not course_ids:
+            return []
+
+    select = db.session.query(
+        literal(int(user_id)).label('user_id'),
+        Course.id.label('course_id'),
+        literal('in-progress').label('status'),
+        literal(0).label('progress'),
+        literal(0.0).label('score'),
+        literal(0).label('last_module_index'),
+        literal(0).label('last_lesson_index'),
+        literal(datetime.utcnow()).label('enrolled_at'),
+        literal(stripe_session_id, type_=db.String).label('stripe_session_id'),
+    )
+    select = select.filter(_live_courses_filter()) if all_courses else select.filter(Course.id.in_(course_ids))
+
+    stmt = insert(Enrollment.__table__).from_select(
+        ['user_id', 'course_id', 'status', 'progress', 'score', 'last_module_index',
+         'last_lesson_index', 'enrolled_at', 'stripe_session_id'],
+        select, include_defaults=False
+    ).on_conflict_do_nothing(
+        index_elements=['user_id', 'course_id']
+    ).returning(Enrollment.__table__.c.course_id)
+
+    added = [row[0] for row in db.session.execute(stmt)]
+    if added:
+        # Only ids this statement really inserted, so appending can't
+        # duplicate - and the row lock orders concurrent grants for one user
+        db.session.execute(
+            update(User).where(User.id == int(user_id))
+            .values(owned_course_ids=func.array_cat(User.owned_course_ids, array(added, type_=Integer)))
+            .execution_options(synchronize_session='fetch')
+        )
+    daily_metrics.record_enrollments(added)
+    if payment is not None:
+        # Even when nothing was added (repeat purchase, bundle over a full
+        # library) the money was taken - it still goes in the ledger
+        record_paid_checkout(user_id, payment, added)
+    return added
+
+
+def record_paid_checkout(user_id, payment, added):
+    """Ledger row and revenue for a paid checkout session (a
+    CheckoutSessionInfo) that added the course ids in added (possibly none).
+    A session is booked once; returns True if this call booked it. Caller
+    commits."""
+    if payment.payment_status != 'paid':
+        return False
+    if not payments.record_payment(user_id, payment, added):
+        return False
+    daily_metrics.record_revenue(added, (payment.amount_total or 0) / 100.0)
+    return True
+
+
+def owned_course_ids(user_id):
+    """frozenset of the course ids user_id is enrolled in - one primary key
+    read of users.owned_course_ids, however many enrollments they have."""
+    if user_id is None:
+        return frozenset()
+    ids = db.session.query(User.owned_course_ids).filter(User.id == int(user_id)).scalar()
+    return frozenset(ids or ())
+
+
+def rebuild_owned_courses():
+    """Recomputes every user's owned_course_ids from enrollments. Call after
+    bulk enrollment deletes, which bypass grant_courses. Caller commits."""
+    owned = select(func.coalesce(
+        func.array_agg(aggregate_order_by(Enrollment.course_id, Enrollment.course_id)),
+        literal_column("'{}'::integer[]")
+    )).where(Enrollment.user_id == User.id).scalar_subquery()
+    db.session.execute(update(User).values(owned_course_ids=owned).execution_options(synchronize_session=False))
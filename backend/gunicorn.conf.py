@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for the web app. Gunicorn loads ./gunicorn.conf.py on its
+own; the start command passes it explicitly as well.
+
+Run from the backend/ directory:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+# No bind: gunicorn listens on $PORT when the platform sets it
+workers = 2
+worker_class = 'gthread'
+threads = 8
+timeout = 120
+keepalive = 5
+loglevel = 'info'
+
+
+def post_worker_init(worker):
+    # Background threads belong to each forked web worker - importing app
+    # (as every maintenance script does) must not start them
+    from app import init_background_workers
+    init_background_workers(worker.wsgi)
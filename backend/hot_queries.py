@@ -0,0 +1,49 @@
+from sqlalchemy import func
+from database import db
+from models import User, Course, Enrollment, ContactMessage, AuditLog, FlaggedPayment
+from pagination import keyset_query_by
+
+# The hot-path queries the indexes from migration c8e4a1f6d2b7 exist for.
+# Each builder returns the unexecuted Query: app.py runs it, and
+# tests/test_query_plans.py EXPLAINs the very same statement, so a changed
+# filter or ORDER BY here is checked against the indexes. A new hot query
+# belongs here too, with its entry in the test.
+
+UNREAD_PREVIEW_SIZE = 5
+AUDIT_LOG_SIZE = 50
+
+
+def checkout_enrollment(session_id):
+    """Any enrollment a checkout session already granted (browser/webhook
+    replay check)."""
+    return Enrollment.query.filter_by(stripe_session_id=session_id)
+
+
+def enrollments_before(cutoff):
+    return Enrollment.query.filter(Enrollment.enrolled_at < cutoff)
+
+
+def unread_messages(limit=UNREAD_PREVIEW_SIZE):
+    return ContactMessage.query.filter_by(is_read=False)\
+        .order_by(ContactMessage.created_at.desc()).limit(limit)
+
+
+def recent_audit_logs(limit=AUDIT_LOG_SIZE):
+    return AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(limit)
+
+
+def flagged_payments(resolved, after_id, limit, start=None, end=None, course_id=None, email=None):
+    """(FlaggedPayment, User, Course) rows for one keyset page of the refund
+    review queue, newest first - limit + 1 of them (see
+    pagination.keyset_query_by)."""
+    # Outer joins: a flag must still show up even if its user/course row is gone
+    query = db.session.query(FlaggedPayment, User, Course)\
+        .outerjoin(User, User.id == FlaggedPayment.user_id)\
+        .outerjoin(Course, Course.id == FlaggedPayment.course_id)\
+        .filter(FlaggedPayment.resolved == resolved)
+    if start: query = query.filter(FlaggedPayment.created_at >= start)
+    if end: query = query.filter(FlaggedPayment.created_at < end)
+    if course_id: query = query.filter(FlaggedPayment.course_id == course_id)
+    if email: query = query.filter(func.lower(User.email).startswith(email.strip().lower(), autoescape=True))
+    # Ordered by created_at so the (resolved, created_at) index serves it
+    return keyset_query_by(query, FlaggedPayment.created_at, FlaggedPayment.id, after_id, limit)
@@ -0,0 +1,111 @@
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from database import db
+
+# Postgres-table work queue shared by the email outbox (email_outbox.py) and
+# the Stripe event queue (stripe_events.py).
+#
+# Rows carry status, attempts and next_attempt_at. Workers claim due rows
+# with SELECT ... FOR UPDATE SKIP LOCKED, so every thread in every gunicorn
+# process can poll the same table without handing out a row twice. A
+# claimed row is leased: next_attempt_at moves lease_seconds ahead, so if
+# the process dies mid-batch the row comes due again and another worker
+# retries it. Finishing a row (done, retry with backoff, give up) is up to
+# the per-batch handler.
+
+
+class LeaseQueue:
+    """One table's queue. model needs id, status, attempts and
+    next_attempt_at columns; rows in pending_status (or a lapsed lease in
+    claimed_status) are due once next_attempt_at passes.
+
+    snapshot(row) turns each claimed row into whatever handle_batch needs -
+    taken before the claim commits, so handle_batch never reloads rows.
+    handle_batch(claimed) does the work and records each outcome; it runs
+    in an app context and commits its own writes."""
+
+    def __init__(self, name, model, snapshot, handle_batch, pending_status='pending',
+                 claimed_status='processing', batch_size=10, poll_seconds=5.0, lease_seconds=300,
+                 backoff_base_seconds=15, backoff_max_seconds=3600):
+        self.name = name
+        self.model = model
+        self.snapshot = snapshot
+        self.handle_batch = handle_batch
+        self.pending_status = pending_status
+        self.claimed_status = claimed_status
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        # Set on every enqueue so this process's workers pick new rows up
+        # right away instead of waiting out the poll interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+
+    def wake(self):
+        self._wake.set()
+
+    def backoff(self, attempts):
+        """Delay before retry number attempts + 1 - doubling, capped."""
+        return timedelta(seconds=min(self.backoff_base_seconds * (2 ** (attempts - 1)), self.backoff_max_seconds))
+
+    def claim(self):
+        """Leases up to batch_size due rows, oldest due first, and returns
+        their snapshots."""
+        model = self.model
+        now = datetime.utcnow()
+        rows = model.query\
+            .filter(model.status.in_((self.pending_status, self.claimed_status)), model.next_attempt_at <= now)\
+            .order_by(model.next_attempt_at)\
+            .limit(self.batch_size)\
+            .with_for_update(skip_locked=True).all()
+        for r in rows:
+            r.status = self.claimed_status
+            r.attempts = (r.attempts or 0) + 1
+            r.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+        claimed = [self.snapshot(r) for r in rows]
+        db.session.commit()
+        return claimed
+
+    def process_batch(self):
+        """Claims and handles one batch. Returns how many rows it handled."""
+        claimed = self.claim()
+        if claimed:
+            self.handle_batch(claimed)
+        return len(claimed)
+
+    def _worker_loop(self, app):
+        while not self._stop.is_set():
+            handled = 0
+            try:
+                with app.app_context():
+                    handled = self.process_batch()
+            except Exception as e:
+                print(f"--- {self.name.upper()} WORKER ERROR: {e} ---", file=sys.stderr, flush=True)
+                try:
+                    with app.app_context():
+                        db.session.rollback()
+                except Exception:
+                    pass
+            if handled < self.batch_size:
+                # Queue drained (or erroring) - sleep until woken or the poll interval passes
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def start_workers(self, app, count):
+        """Starts count worker threads (idempotent per process)."""
+        if self._workers:
+            return
+        thread_name = self.name.lower().replace(' ', '-')
+        for i in range(count):
+            t = threading.Thread(target=self._worker_loop, args=(app,), name=f"{thread_name}-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def stop_workers(self):
+        self._stop.set()
+        self._wake.set()
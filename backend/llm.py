@@ -0,0 +1,154 @@
+import json
+import os
+import sys
+import threading
+
+import httpx
+from flask import Response, request, stream_with_context
+from openai import OpenAI
+from database import db
+
+# One OpenAI client per process, shared by every request thread. The client
+# keeps a pool of keep-alive connections, so chat calls skip the TLS
+# handshake a fresh client per request paid every time.
+#
+# OPENAI_BASE_URL points the client somewhere else - e.g. the local stub in
+# stub_llm.py (`OPENAI_BASE_URL=http://127.0.0.1:8089/v1`) for testing
+# without a real key or network.
+
+# --- TUNABLES (env overridable) ---
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+# Max LLM calls in flight per process. The rest of the worker's threads stay
+# free for checkout, auth and the other quick routes.
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '6'))
+# How long a chat request waits for a free slot before getting a 503
+LLM_SLOT_WAIT_SECONDS = float(os.getenv('LLM_SLOT_WAIT_SECONDS', '5'))
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+class LLMBusy(Exception):
+    """Every LLM slot in this process is taken."""
+
+
+def is_configured():
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=os.getenv("OPENAI_BASE_URL") or None,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    max_retries=1,
+                    http_client=httpx.Client(
+                        timeout=LLM_TIMEOUT_SECONDS,
+                        limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY * 2,
+                                            max_keepalive_connections=LLM_MAX_CONCURRENCY)
+                    )
+                )
+    return _client
+
+
+def _acquire_slot():
+    if not _slots.acquire(timeout=LLM_SLOT_WAIT_SECONDS):
+        raise LLMBusy()
+
+
+def complete(messages, model, **kwargs):
+    """Blocking completion. Returns the reply text."""
+    _acquire_slot()
+    try:
+        res = get_client().chat.completions.create(model=model, messages=messages, **kwargs)
+        return res.choices[0].message.content
+    finally:
+        _slots.release()
+
+
+def wants_stream():
+    """?stream=1 or an `Accept: text/event-stream` header asks for SSE."""
+    return request.args.get('stream') == '1' or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def _event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+class _SSEStream:
+    """Iterable body for a streamed completion. Owns the LLM slot and the
+    upstream stream, and gives both back in close() - which the WSGI server
+    calls whether the body finished, errored or the client went away."""
+
+    def __init__(self, upstream, log_prefix, on_complete=None):
+        self.upstream = upstream
+        self.log_prefix = log_prefix
+        self.on_complete = on_complete
+        self._closed = False
+
+    def __iter__(self):
+        parts = []
+        try:
+            for chunk in self.upstream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield _event({"delta": delta})
+            content = "".join(parts)
+            if self.on_complete:
+                self.on_complete(content)
+            yield _event({"done": True, "content": content})
+        except Exception as e:
+            print(f"{self.log_prefix} Stream Error: {e}", file=sys.stderr, flush=True)
+            yield _event({"error": "I'm having trouble connecting. Please try again."})
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.upstream.close()
+        finally:
+            _slots.release()
+
+
+def _sse(body):
+    resp = Response(body, mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream into one chunk
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
+def sse_text(content):
+    """An already-known reply (e.g. from a cache) in the same event format
+    sse_response streams, so clients need only one code path."""
+    return _sse([_event({"delta": content}), _event({"done": True, "content": content})])
+
+
+def sse_response(messages, model, log_prefix="LLM", on_complete=None, **kwargs):
+    """Streams a completion as Server-Sent Events: `{"delta": ...}` per
+    token chunk, then `{"done": true, "content": <full reply>}`, or
+    `{"error": ...}` if the upstream fails mid-stream. on_complete(content)
+    runs once the full reply has arrived.
+
+    The slot is taken and the upstream request opened before returning, so
+    LLMBusy and connection errors still surface as normal error responses."""
+    _acquire_slot()
+    try:
+        upstream = get_client().chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    except Exception:
+        _slots.release()
+        raise
+    # Nothing below touches the database - hand the connection back to the
+    # pool now rather than holding it for the whole stream.
+    db.session.close()
+    body = _SSEStream(upstream, log_prefix, on_complete)
+    resp = _sse(stream_with_context(body))
+    resp.call_on_close(body.close)
+    return resp
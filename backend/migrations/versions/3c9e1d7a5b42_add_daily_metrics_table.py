@@ -0,0 +1,37 @@
+"""Add daily_metrics rollup table
+
+Revision ID: 3c9e1d7a5b42
+Revises: fbff09e03363
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1d7a5b42'
+down_revision = 'fbff09e03363'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Starts empty - run backfill_daily_metrics.py once after upgrading to
+    # populate it from existing enrollments and users.
+    op.create_table(
+        'daily_metrics',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('course_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('enrollments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completions', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('signups', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'course_id', name='uq_daily_metrics_day_course')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_metrics')
@@ -0,0 +1,31 @@
+"""Add token_version to users
+
+Revision ID: 6e2a9b3c1f58
+Revises: d4b8e6f1a0c7
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2a9b3c1f58'
+down_revision = 'd4b8e6f1a0c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing users start at 0, matching tokens issued before this column
+    # existed (they carry no version claim and are treated as version 0).
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('token_version', server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
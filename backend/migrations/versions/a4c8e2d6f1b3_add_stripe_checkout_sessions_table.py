@@ -0,0 +1,36 @@
+"""Add stripe_checkout_sessions table
+
+Revision ID: a4c8e2d6f1b3
+Revises: f3a9c5e1b7d4
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2d6f1b3'
+down_revision = 'f3a9c5e1b7d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stripe_checkout_sessions',
+        sa.Column('session_id', sa.String(length=255), nullable=False),
+        sa.Column('payment_status', sa.String(length=20), nullable=False),
+        sa.Column('payment_intent_id', sa.String(length=255), nullable=True),
+        sa.Column('customer_email', sa.String(length=255), nullable=True),
+        sa.Column('customer_name', sa.String(length=255), nullable=True),
+        sa.Column('amount_total', sa.Integer(), nullable=True),
+        sa.Column('currency', sa.String(length=10), nullable=True),
+        sa.Column('session_metadata', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('session_id')
+    )
+
+
+def downgrade():
+    op.drop_table('stripe_checkout_sessions')
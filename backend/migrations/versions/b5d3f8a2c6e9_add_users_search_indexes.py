@@ -0,0 +1,37 @@
+"""Add users search/pagination indexes
+
+Revision ID: b5d3f8a2c6e9
+Revises: 6e2a9b3c1f58
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d3f8a2c6e9'
+down_revision = '6e2a9b3c1f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backs GET /api/users: keyset pages over (is_deleted, id desc), email
+    # prefix search on lower(email), name substring search via trigrams.
+    # CONCURRENTLY can't run inside a transaction, hence the autocommit block -
+    # the users table stays writable while these build.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_is_deleted_id ON users (is_deleted, id DESC)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_created_at ON users (created_at)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_lower_email ON users (lower(email) varchar_pattern_ops)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_lower_name_trgm ON users USING gin (lower(name) gin_trgm_ops)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_lower_name_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_lower_email")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_created_at")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_is_deleted_id")
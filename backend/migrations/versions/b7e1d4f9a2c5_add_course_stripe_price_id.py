@@ -0,0 +1,38 @@
+"""Add courses.stripe_price_id
+
+Revision ID: b7e1d4f9a2c5
+Revises: a4c8e2d6f1b3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1d4f9a2c5'
+down_revision = 'a4c8e2d6f1b3'
+branch_labels = None
+depends_on = None
+
+# The title -> Price ID map app.py used to match on at every checkout.
+# Copied onto the rows once here, so renaming a course keeps its Price ID.
+LEGACY_PRICE_IDS = {
+    "AI for Human Resources / Talent / People Ops via Prompts": "price_1TYrRQLs3W3AEhCNuV7RiObK",
+    "Prompt-Based Tools for Education & Learning":              "price_1TYrSfLs3W3AEhCN2a836gZE",
+    "Prompting for Automation and Workflow Efficiency":         "price_1TYrUdLs3W3AEhCNA5UvTrOX",
+    "Prompt-Based Analytics and Reports for Business":          "price_1TYrUuLs3W3AEhCNN8I0FmJu",
+    "Prompt Engineering for Non-Profits and Social Impact":     "price_1TYrV9Ls3W3AEhCNZip5Qp33",
+    "Prompt-Based AI for Local Government and Public Services": "price_1TYrVPLs3W3AEhCNwxVxOzmU",
+}
+
+
+def upgrade():
+    op.add_column('courses', sa.Column('stripe_price_id', sa.String(length=255), nullable=True))
+    courses = sa.table('courses', sa.column('title', sa.String), sa.column('stripe_price_id', sa.String))
+    for title, price_id in LEGACY_PRICE_IDS.items():
+        op.execute(courses.update().where(courses.c.title == title).values(stripe_price_id=price_id))
+
+
+def downgrade():
+    op.drop_column('courses', 'stripe_price_id')
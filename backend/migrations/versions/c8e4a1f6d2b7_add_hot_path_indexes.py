@@ -0,0 +1,40 @@
+"""Add hot-path indexes on enrollments, messages, audit logs and flagged payments
+
+Revision ID: c8e4a1f6d2b7
+Revises: b5d3f8a2c6e9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e4a1f6d2b7'
+down_revision = 'b5d3f8a2c6e9'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns). users.created_at is already covered by
+# ix_users_created_at from b5d3f8a2c6e9.
+INDEXES = [
+    ('ix_enrollments_stripe_session_id', 'enrollments', 'stripe_session_id'),
+    ('ix_enrollments_enrolled_at', 'enrollments', 'enrolled_at'),
+    ('ix_contact_messages_is_read_created_at', 'contact_messages', 'is_read, created_at'),
+    ('ix_audit_logs_timestamp', 'audit_logs', 'timestamp'),
+    ('ix_flagged_payments_resolved_created_at', 'flagged_payments', 'resolved, created_at'),
+]
+
+
+def upgrade():
+    # CONCURRENTLY so checkout and the admin panel keep writing while these
+    # build; it can't run inside a transaction, hence the autocommit block.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
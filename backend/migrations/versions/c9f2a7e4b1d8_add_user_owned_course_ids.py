@@ -0,0 +1,34 @@
+"""Add users.owned_course_ids
+
+Revision ID: c9f2a7e4b1d8
+Revises: b7e1d4f9a2c5
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f2a7e4b1d8'
+down_revision = 'b7e1d4f9a2c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('owned_course_ids', postgresql.ARRAY(sa.Integer()),
+                                     server_default='{}', nullable=False))
+    op.execute("""
+        UPDATE users SET owned_course_ids = owned.ids
+        FROM (
+            SELECT user_id, array_agg(DISTINCT course_id ORDER BY course_id) AS ids
+            FROM enrollments GROUP BY user_id
+        ) AS owned
+        WHERE owned.user_id = users.id
+    """)
+
+
+def downgrade():
+    op.drop_column('users', 'owned_course_ids')
@@ -0,0 +1,69 @@
+"""Add payments ledger
+
+Revision ID: d4b8e3a1c7f6
+Revises: c9f2a7e4b1d8
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e3a1c7f6'
+down_revision = 'c9f2a7e4b1d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'payments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('stripe_session_id', sa.String(length=255), nullable=False),
+        sa.Column('payment_intent_id', sa.String(length=255), nullable=True),
+        sa.Column('amount_cents', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=10), nullable=False),
+        sa.Column('course_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('is_bundle', sa.Boolean(), nullable=False),
+        sa.Column('paid_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stripe_session_id')
+    )
+    op.create_index('ix_payments_user_id_id', 'payments', ['user_id', 'id'], unique=False)
+    op.create_index('ix_payments_paid_at', 'payments', ['paid_at'], unique=False)
+    op.create_index('ix_payments_course_ids', 'payments', ['course_ids'], unique=False, postgresql_using='gin')
+
+    # Backfill from enrollments grouped by checkout session. The amount is
+    # Stripe's when we still have the session locally; otherwise the same
+    # reconstruction /api/my-payments used to do (course price, or the
+    # bundle formula against today's live course count).
+    op.execute("""
+        INSERT INTO payments (user_id, stripe_session_id, payment_intent_id, amount_cents, currency,
+                              course_ids, is_bundle, paid_at)
+        SELECT e.user_id, e.stripe_session_id, s.payment_intent_id,
+               COALESCE(s.amount_total, ROUND(100 * CASE
+                   WHEN COUNT(*) > 1 THEN GREATEST(159 - ((SELECT COUNT(*) FROM courses
+                        WHERE is_deleted IS NOT TRUE) - COUNT(*)) * 29, 0)
+                   ELSE COALESCE(SUM(c.price), 0) END)),
+               COALESCE(s.currency, 'usd'),
+               array_agg(e.course_id ORDER BY e.course_id),
+               COUNT(*) > 1,
+               COALESCE(MIN(e.enrolled_at), NOW())
+        FROM enrollments e
+        JOIN courses c ON c.id = e.course_id
+        LEFT JOIN stripe_checkout_sessions s ON s.session_id = e.stripe_session_id
+        WHERE e.stripe_session_id IS NOT NULL
+        GROUP BY e.user_id, e.stripe_session_id, s.payment_intent_id, s.amount_total, s.currency
+        ON CONFLICT (stripe_session_id) DO NOTHING
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_payments_course_ids', table_name='payments')
+    op.drop_index('ix_payments_paid_at', table_name='payments')
+    op.drop_index('ix_payments_user_id_id', table_name='payments')
+    op.drop_table('payments')
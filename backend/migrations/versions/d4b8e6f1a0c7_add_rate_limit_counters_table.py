@@ -0,0 +1,33 @@
+"""Add rate_limit_counters table
+
+Revision ID: d4b8e6f1a0c7
+Revises: a71f0c2e9d13
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e6f1a0c7'
+down_revision = 'a71f0c2e9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rate_limit_counters',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('window_start', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key', 'window_start')
+    )
+    op.create_index('ix_rate_limit_counters_expires_at', 'rate_limit_counters', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_rate_limit_counters_expires_at', table_name='rate_limit_counters')
+    op.drop_table('rate_limit_counters')
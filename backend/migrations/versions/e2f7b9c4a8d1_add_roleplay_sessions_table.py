@@ -0,0 +1,45 @@
+"""Add roleplay_sessions table
+
+Revision ID: e2f7b9c4a8d1
+Revises: c8e4a1f6d2b7
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f7b9c4a8d1'
+down_revision = 'c8e4a1f6d2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'roleplay_sessions',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('module_index', sa.Integer(), nullable=False),
+        sa.Column('lesson_index', sa.Integer(), nullable=False),
+        sa.Column('persona', sa.Text(), nullable=False),
+        sa.Column('objectives', sa.Text(), nullable=True),
+        sa.Column('turns', sa.JSON(), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('summarized_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['course_id'], ['courses.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_roleplay_sessions_user_id', 'roleplay_sessions', ['user_id'])
+    op.create_index('ix_roleplay_sessions_expires_at', 'roleplay_sessions', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_roleplay_sessions_expires_at', table_name='roleplay_sessions')
+    op.drop_index('ix_roleplay_sessions_user_id', table_name='roleplay_sessions')
+    op.drop_table('roleplay_sessions')
@@ -0,0 +1,41 @@
+"""Add stripe_events table
+
+Revision ID: f3a9c5e1b7d4
+Revises: e2f7b9c4a8d1
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c5e1b7d4'
+down_revision = 'e2f7b9c4a8d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stripe_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.String(length=255), nullable=False),
+        sa.Column('type', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id')
+    )
+    # The worker's claim query: due events that still need processing
+    op.create_index('ix_stripe_events_status_next_attempt', 'stripe_events', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_stripe_events_status_next_attempt', table_name='stripe_events')
+    op.drop_table('stripe_events')
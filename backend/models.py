@@ -1,10 +1,20 @@
 from database import db
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.dialects.postgresql import JSON, ARRAY
 
 # 1. USER MODEL
 class User(db.Model):
     __tablename__ = 'users'
+    # Built by migration b5d3f8a2c6e9 for GET /api/users: keyset pages, email
+    # prefix search and trigram name search (needs the pg_trgm extension).
+    # ix_users_created_at comes from created_at's index=True.
+    __table_args__ = (
+        db.Index('ix_users_is_deleted_id', 'is_deleted', db.text('id DESC')),
+        db.Index('ix_users_lower_email', db.func.lower(db.text('email')).label('lower_email'),
+                 postgresql_ops={'lower_email': 'varchar_pattern_ops'}),
+        db.Index('ix_users_lower_name_trgm', db.func.lower(db.text('name')).label('lower_name'),
+                 postgresql_using='gin', postgresql_ops={'lower_name': 'gin_trgm_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -20,7 +30,11 @@ class User(db.Model):
     # Status
     ban_expiry = db.Column(db.DateTime, nullable=True)
     is_deleted = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # Bumped whenever role/ban/delete status changes; every JWT carries the
+    # version it was issued at, and older tokens are rejected (see auth.py).
+    token_version = db.Column(db.Integer, default=0, nullable=False)
 
     # Guest Checkout: True for normal signups. False for accounts auto-created
     # at guest checkout until the user sets their own password.
@@ -32,6 +46,12 @@ class User(db.Model):
     # creating an account). Open to more values later (e.g. 'referral').
     signup_source = db.Column(db.String(30), default='signup', nullable=False)
 
+    # Ids of every course this user is enrolled in - a denormalized copy of
+    # their enrollments so ownership checks and bundle pricing are one
+    # primary-key read. Maintained by enrollments.grant_courses (and rebuilt
+    # after bulk enrollment deletes); never write it directly.
+    owned_course_ids = db.Column(ARRAY(db.Integer), default=list, server_default='{}', nullable=False)
+
     # Relationships
     enrollments = db.relationship('Enrollment', backref='user', lazy=True)
 
@@ -43,6 +63,9 @@ class Course(db.Model):
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, default=29.0)
+    # Stable Stripe Price ID (enables GTM conversion tracking). Checkout
+    # falls back to dynamic price_data from `price` when unset.
+    stripe_price_id = db.Column(db.String(255), nullable=True)
     category = db.Column(db.String(100), default='General')
     
     # Stores the Curriculum (Modules & Lessons)
@@ -63,6 +86,7 @@ class Course(db.Model):
             'title': self.title,
             'description': self.description,
             'price': self.price,
+            'stripe_price_id': self.stripe_price_id,
             'category': self.category,
             'modules': self.course_data.get('modules', []) if self.course_data else [],
             'is_active': self.is_active
@@ -89,15 +113,18 @@ class Enrollment(db.Model):
 
     # Certification & Payment (NEW COLUMN ADDED HERE)
     certificate_id = db.Column(db.String(50), unique=True, nullable=True) 
-    stripe_session_id = db.Column(db.String(255), nullable=True) # <-- NEW
+    stripe_session_id = db.Column(db.String(255), nullable=True, index=True) # <-- NEW
     
     completion_date = db.Column(db.DateTime, nullable=True)
-    enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
+    enrolled_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
 
 # 4. CONTACT MESSAGE MODEL
 class ContactMessage(db.Model):
     __tablename__ = 'contact_messages'
+    __table_args__ = (
+        db.Index('ix_contact_messages_is_read_created_at', 'is_read', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
     email = db.Column(db.String(100))
@@ -113,7 +140,7 @@ class AuditLog(db.Model):
     admin_email = db.Column(db.String(100))
     action = db.Column(db.String(200))
     details = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 # 6. SYSTEM SETTINGS MODEL
 class SystemSetting(db.Model):
@@ -129,6 +156,9 @@ class SystemSetting(db.Model):
 # review and mark resolved once handled manually in Stripe Dashboard.
 class FlaggedPayment(db.Model):
     __tablename__ = 'flagged_payments'
+    __table_args__ = (
+        db.Index('ix_flagged_payments_resolved_created_at', 'resolved', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
@@ -137,3 +167,139 @@ class FlaggedPayment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     resolved = db.Column(db.Boolean, default=False, nullable=False)
     resolved_at = db.Column(db.DateTime, nullable=True)
+
+# 8. DAILY METRIC MODEL
+# Pre-aggregated day x course rollup so the admin dashboards read O(days) rows
+# instead of joining Course.price against every enrollment ever made.
+# Kept current incrementally by daily_metrics.py from the enrollment paths;
+# backfill_daily_metrics.py rebuilds it from history.
+# course_id = 0 is the site-wide row (signups aren't tied to a course), so it
+# deliberately has no foreign key.
+class DailyMetric(db.Model):
+    __tablename__ = 'daily_metrics'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'course_id', name='uq_daily_metrics_day_course'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    course_id = db.Column(db.Integer, nullable=False, default=0)
+    enrollments = db.Column(db.Integer, nullable=False, default=0)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    signups = db.Column(db.Integer, nullable=False, default=0)
+
+# 9. OUTBOUND EMAIL MODEL
+# Durable outbox: request handlers enqueue here (email_outbox.enqueue_email)
+# and a background worker pool delivers, so no request waits on the email
+# provider. dedup_key makes "send once per Stripe session"-style emails safe
+# when the browser and the webhook both reach the same payment.
+class OutboundEmail(db.Model):
+    __tablename__ = 'email_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    dedup_key = db.Column(db.String(255), unique=True, nullable=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    sender_name = db.Column(db.String(100), nullable=False)
+    sender_email = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False) # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+# 10. RATE LIMIT COUNTER MODEL
+# Shared request counters for rate_limit.py's database backend - one row per
+# (key, fixed window). Shared by every gunicorn worker, so limits hold no
+# matter how many workers run; expired rows are swept opportunistically.
+class RateLimitCounter(db.Model):
+    __tablename__ = 'rate_limit_counters'
+    key = db.Column(db.String(255), primary_key=True)
+    window_start = db.Column(db.Integer, primary_key=True) # epoch seconds
+    count = db.Column(db.Integer, default=0, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# 11. ROLEPLAY SESSION MODEL
+# Server-side state for one attempt at a roleplay lesson. The client sends
+# only its newest message each turn; persona and objectives come from the
+# lesson itself, and older turns are folded into `summary` (the first
+# `summarized_count` entries of `turns`) to keep prompts a bounded size.
+# Expired sessions are swept by roleplay.py.
+class RoleplaySession(db.Model):
+    __tablename__ = 'roleplay_sessions'
+    id = db.Column(db.String(32), primary_key=True) # uuid hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    module_index = db.Column(db.Integer, nullable=False)
+    lesson_index = db.Column(db.Integer, nullable=False)
+    persona = db.Column(db.Text, nullable=False)
+    objectives = db.Column(db.Text, nullable=True)
+    turns = db.Column(JSON, nullable=False, default=list) # [{"role", "content"}]
+    summary = db.Column(db.Text, nullable=True)
+    summarized_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# 12. STRIPE EVENT MODEL
+# Every verified Stripe webhook event, stored raw and keyed by Stripe's event
+# id. The webhook only inserts and acks; stripe_events.py workers do the
+# actual enrollment work with retries. The unique event_id makes Stripe's
+# redeliveries no-ops; status 'dead' is the dead-letter state for events
+# that kept failing.
+class StripeEvent(db.Model):
+    __tablename__ = 'stripe_events'
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), unique=True, nullable=False)
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False) # 'pending', 'processing', 'processed', 'dead'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+# 13. STRIPE CHECKOUT SESSION MODEL
+# Local copy of the Stripe checkout sessions we've seen paid, so re-verifying
+# one (PaymentSuccess retries, the webhook having got there first) needs no
+# outbound Stripe call. Written by stripe_sessions.py from the webhook and
+# from the first verify-payment. Only paid sessions are stored - an unpaid
+# one may still change.
+class StripeCheckoutSession(db.Model):
+    __tablename__ = 'stripe_checkout_sessions'
+    session_id = db.Column(db.String(255), primary_key=True)
+    payment_status = db.Column(db.String(20), nullable=False)
+    payment_intent_id = db.Column(db.String(255), nullable=True)
+    customer_email = db.Column(db.String(255), nullable=True)
+    customer_name = db.Column(db.String(255), nullable=True)
+    amount_total = db.Column(db.Integer, nullable=True) # smallest currency unit (cents)
+    currency = db.Column(db.String(10), nullable=True)
+    session_metadata = db.Column(JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# 14. PAYMENT MODEL
+# The ledger of completed checkouts: what was actually charged (Stripe's
+# amount_total) and which courses it bought. Written by payments.py in the
+# same transaction that grants those courses, so payment history and
+# revenue read stored amounts instead of re-deriving them from today's
+# course prices.
+class Payment(db.Model):
+    __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_user_id_id', 'user_id', 'id'),
+        db.Index('ix_payments_course_ids', 'course_ids', postgresql_using='gin'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    stripe_session_id = db.Column(db.String(255), unique=True, nullable=False)
+    payment_intent_id = db.Column(db.String(255), nullable=True)
+    amount_cents = db.Column(db.Integer, nullable=False, default=0)
+    currency = db.Column(db.String(10), nullable=False, default='usd')
+    course_ids = db.Column(ARRAY(db.Integer), nullable=False, default=list)
+    is_bundle = db.Column(db.Boolean, nullable=False, default=False)
+    paid_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    @property
+    def amount(self):
+        return self.amount_cents / 100.0
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from flask import jsonify, request
+from sqlalchemy import select, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Response header carrying the cursor for the next page (absent on the last
+# page). Bodies stay plain JSON arrays so existing callers keep working.
+NEXT_CURSOR_HEADER = 'X-Next-After-Id'
+
+
+def keyset_args():
+    """(after_id, limit) from ?after_id=&limit=. after_id is None for the
+    first page."""
+    try:
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+    except ValueError:
+        after_id = None
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    return after_id, max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def date_range_args(from_key='from', to_key='to'):
+    """(start, end_exclusive) datetimes from ?from=YYYY-MM-DD&to=YYYY-MM-DD,
+    either may be None. 'to' is inclusive of that whole day."""
+    def parse(key):
+        raw = request.args.get(key)
+        if not raw:
+            return None
+        try:
+            return datetime.strptime(raw, '%Y-%m-%d')
+        except ValueError:
+            return None
+    start, end = parse(from_key), parse(to_key)
+    return start, (end + timedelta(days=1)) if end else None
+
+
+def keyset_page(query, id_column, after_id, limit):
+    """Newest-first page of query, strictly older than after_id. Fetches one
+    extra row to know whether another page exists. Returns (rows, has_more)."""
+    if after_id is not None:
+        query = query.filter(id_column < after_id)
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def keyset_query_by(query, sort_column, id_column, after_id, limit):
+    """Like keyset_page, but ordered by sort_column (newest first, id
+    breaking ties) so an index on sort_column serves the ORDER BY, and
+    returned unexecuted - run it with page_rows. The cursor is still the
+    last row's id; its sort value is looked up from the row itself."""
+    if after_id is not None:
+        # correlate(None): it reads the same table as the outer query
+        anchor = select(sort_column).where(id_column == after_id).correlate(None).scalar_subquery()
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(anchor, after_id))
+    return query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def page_rows(query, limit):
+    """(rows, has_more) for a page query that fetches limit + 1 rows."""
+    rows = query.all()
+    return rows[:limit], len(rows) > limit
+
+
+def paged_response(items, has_more):
+    """JSON array of items (dicts with an "id"), plus the next-page cursor
+    header when has_more."""
+    resp = jsonify(items)
+    if has_more and items:
+        resp.headers[NEXT_CURSOR_HEADER] = str(items[-1]['id'])
+    return resp
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import Payment
+
+BUNDLE_LABEL = "All-Access Pro Bundle ({count} courses)"
+
+
+def record_payment(user_id, session, course_ids):
+    """Adds the ledger row for a paid checkout session (a
+    stripe_sessions.CheckoutSessionInfo) that bought course_ids. A session
+    is recorded once: returns False (and writes nothing) if it already was.
+    Caller commits."""
+    stmt = insert(Payment.__table__).values(
+        user_id=int(user_id), stripe_session_id=session.id, payment_intent_id=session.payment_intent,
+        amount_cents=int(session.amount_total or 0), currency=session.currency or 'usd',
+        course_ids=sorted(int(c) for c in course_ids),
+        is_bundle=session.metadata.get('is_bundle') == 'true',
+        paid_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['stripe_session_id'])
+    return bool(db.session.execute(stmt).rowcount)
+
+
+def describe(payment, prices):
+    """What the payment bought, for history/transaction rows. prices is a
+    pricing.PriceMap."""
+    if payment.is_bundle or len(payment.course_ids) > 1:
+        return BUNDLE_LABEL.format(count=len(payment.course_ids))
+    course = prices.get(payment.course_ids[0]) if payment.course_ids else None
+    return course.title if course else "Course"
@@ -0,0 +1,110 @@
+import threading
+from collections import namedtuple
+
+from database import db
+from models import Course
+from course_cache import get_course_version
+
+# Per-process copy of every course's pricing, rebuilt whenever the shared
+# course content version moves (create/update/delete course all bump it).
+# Checkout then needs no course row load - just the cheap version check and
+# the Stripe call itself.
+
+# Stable Product ID for Pro Bundle - dynamic price preserves discount logic
+STRIPE_BUNDLE_PRODUCT_ID = "prod_UXxT1JUivTu9Qt"
+BUNDLE_BASE_PRICE = 159.0
+# Knocked off the bundle for every live course the buyer already owns
+BUNDLE_DISCOUNT_PER_COURSE = 29.0
+
+CoursePrice = namedtuple('CoursePrice', ['id', 'title', 'price', 'stripe_price_id', 'is_live'])
+
+
+class PriceMap:
+    def __init__(self, version, courses):
+        self.version = version
+        self.courses = courses  # {course_id: CoursePrice}
+        self.live_ids = frozenset(c.id for c in courses.values() if c.is_live)
+
+    def get(self, course_id):
+        return self.courses.get(course_id)
+
+
+_price_map = None
+_lock = threading.Lock()
+
+
+def _load(version):
+    rows = db.session.query(Course.id, Course.title, Course.price, Course.stripe_price_id, Course.is_deleted).all()
+    return PriceMap(version, {
+        r.id: CoursePrice(r.id, r.title, float(r.price or 0.0), r.stripe_price_id, not r.is_deleted)
+        for r in rows
+    })
+
+
+def get_price_map():
+    global _price_map
+    version = get_course_version()
+    current = _price_map
+    if current is not None and current.version == version:
+        return current
+    fresh = _load(version)
+    with _lock:
+        _price_map = fresh
+    return fresh
+
+
+def bundle_price(owned_live_count):
+    return max(BUNDLE_BASE_PRICE - owned_live_count * BUNDLE_DISCOUNT_PER_COURSE, 0.0)
+
+
+def course_checkout_params(course, domain, user_id=None):
+    """stripe.checkout.Session.create kwargs for one course (a CoursePrice)."""
+    if course.stripe_price_id:
+        # Stable Stripe Price ID enables GTM tracking
+        line_item = {'price': course.stripe_price_id, 'quantity': 1}
+    else:
+        line_item = {
+            'price_data': {
+                'currency': 'usd',
+                'product_data': {'name': course.title},
+                'unit_amount': int(round(course.price * 100)),
+            },
+            'quantity': 1,
+        }
+    params = dict(
+        payment_method_types=['card'],
+        line_items=[line_item],
+        mode='payment',
+        success_url=f"{domain}/payment-success?session_id={{CHECKOUT_SESSION_ID}}&course_id={course.id}&amount={course.price}&price_id={course.stripe_price_id or ''}&guest={'false' if user_id else 'true'}",
+        cancel_url=f"{domain}/courses",
+        metadata={"course_id": course.id},
+    )
+    if user_id:
+        params['client_reference_id'] = str(user_id)
+        params['metadata']['user_id'] = user_id
+    else:
+        params['metadata']['guest'] = 'true'
+    return params
+
+
+def bundle_checkout_params(final_price, domain, user_id):
+    """stripe.checkout.Session.create kwargs for the bundle at final_price."""
+    return dict(
+        payment_method_types=['card'],
+        line_items=[{
+            'price_data': {
+                'currency': 'usd',
+                # Use stable Product ID so GTM can track bundle conversions.
+                # Dynamic unit_amount preserves the per-user discount logic.
+                'product': STRIPE_BUNDLE_PRODUCT_ID,
+                'unit_amount': int(round(final_price * 100)),
+            },
+            'quantity': 1,
+        }],
+        mode='payment',
+        success_url=f"{domain}/payment-success?session_id={{CHECKOUT_SESSION_ID}}&bundle=true&amount={final_price}&price_id={STRIPE_BUNDLE_PRODUCT_ID}",
+        cancel_url=f"{domain}/pricing",
+        client_reference_id=str(user_id),
+        # Tag this as a bundle purchase
+        metadata={"user_id": user_id, "is_bundle": "true"}
+    )
@@ -0,0 +1,83 @@
+from sqlalchemy import or_, select, update
+from database import db
+from models import Enrollment
+import daily_metrics
+import cert_ids
+
+# Lesson navigation saves the learner's place on every click. Most of those
+# saves change nothing (or only the bookmark), so writes here are
+# conditional: a save that matches the stored row costs one indexed read and
+# no UPDATE/commit. The player also debounces navigation saves and sends
+# them through /api/progress/batch, completions straight away.
+
+# Request field -> enrollments column
+FIELDS = {
+    'progress': 'progress',
+    'status': 'status',
+    'score': 'score',
+    'module_idx': 'last_module_index',
+    'lesson_idx': 'last_lesson_index',
+}
+MAX_BATCH_EVENTS = 50
+
+
+def changes_from(event):
+    """{column: value} for the progress fields present in a request/event."""
+    return {col: event[key] for key, col in FIELDS.items() if key in event}
+
+
+def coalesce(events):
+    """[(course_id, changes)] with each course's events folded into one, in
+    first-seen order. Later values win, except that a completion sticks -
+    a navigation save queued after it must not undo it."""
+    merged = {}
+    for event in events:
+        if not isinstance(event, dict) or event.get('course_id') is None:
+            continue
+        try:
+            course_id = int(event['course_id'])
+        except (TypeError, ValueError):
+            continue
+        current = merged.setdefault(course_id, {})
+        incoming = changes_from(event)
+        if current.get('status') == 'completed' and incoming.get('status') != 'completed':
+            for col in ('status', 'progress', 'score'):
+                incoming.pop(col, None)
+        current.update(incoming)
+    return list(merged.items())
+
+
+def _complete(user_id, course_id, changes):
+    enr = Enrollment.query.filter_by(user_id=user_id, course_id=course_id).with_for_update().first()
+    if not enr:
+        return False, None
+    # The ORM only UPDATEs columns whose value actually changed
+    for col, value in changes.items():
+        setattr(enr, col, value)
+    if cert_ids.ensure_issued(enr):
+        daily_metrics.record_completion(enr.course_id, enr.completion_date)
+    return True, enr.certificate_id
+
+
+def apply(user_id, course_id, changes):
+    """Applies one enrollment's changes. Returns (found, certificate_id).
+    Caller commits.
+
+    Completions take the row lock and issue the certificate. Anything else
+    is a single UPDATE guarded by IS DISTINCT FROM, so an unchanged save
+    writes nothing; only then is the row read back to tell "no change"
+    from "not enrolled"."""
+    if changes.get('status') == 'completed':
+        return _complete(user_id, course_id, changes)
+
+    t = Enrollment.__table__
+    match = (t.c.user_id == int(user_id)) & (t.c.course_id == int(course_id))
+    if changes:
+        row = db.session.execute(
+            update(t).where(match, or_(*[t.c[col].is_distinct_from(v) for col, v in changes.items()]))
+            .values(**changes).returning(t.c.certificate_id)
+        ).first()
+        if row:
+            return True, row[0]
+    row = db.session.execute(select(t.c.certificate_id).where(match)).first()
+    return row is not None, (row[0] if row else None)
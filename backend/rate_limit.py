@@ -0,0 +1,244 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import jsonify, request, g
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import RateLimitCounter
+
+# Sliding-window counter: each key keeps one counter per fixed window, and a
+# check weighs the previous window by how much of it still overlaps the
+# sliding window. Two counters per key, O(1) per check, and no per-request
+# timestamp lists to grow without bound.
+
+# Fraction of hits that also sweep expired rows out of the shared table
+SWEEP_PROBABILITY = 0.005
+
+
+def client_ip():
+    return request.headers.get('X-Forwarded-For', request.remote_addr or '').split(',')[0].strip()
+
+
+class MemoryBackend:
+    """Per-process counters. Only correct with a single worker - meant for
+    local development. Bounded: the oldest windows are dropped first once
+    max_entries is reached."""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, window_start, prev_start):
+        with self._lock:
+            return self._counts.get((key, window_start), 0), self._counts.get((key, prev_start), 0)
+
+    def incr(self, key, window_start, window):
+        with self._lock:
+            k = (key, window_start)
+            self._counts[k] = self._counts.get(k, 0) + 1
+            self._counts.move_to_end(k)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+            return self._counts[k]
+
+    def take(self, key, window_start, prev_start, window):
+        with self._lock:
+            return self.incr(key, window_start, window), self._counts.get((key, prev_start), 0)
+
+    def give_back(self, key, window_start):
+        with self._lock:
+            k = (key, window_start)
+            if self._counts.get(k, 0) > 0:
+                self._counts[k] -= 1
+
+    def reset(self, key):
+        with self._lock:
+            for k in [k for k in self._counts if k[0] == key]:
+                del self._counts[k]
+
+
+class DatabaseBackend:
+    """Counters in the rate_limit_counters table, shared by every worker.
+    Each write runs on its own short transaction so it never commits or
+    rolls back the request's db.session."""
+
+    def get(self, key, window_start, prev_start):
+        rows = db.session.query(RateLimitCounter.window_start, RateLimitCounter.count)\
+            .filter(RateLimitCounter.key == key,
+                    RateLimitCounter.window_start.in_((window_start, prev_start))).all()
+        counts = dict(rows)
+        return counts.get(window_start, 0), counts.get(prev_start, 0)
+
+    def _incr(self, conn, key, window_start, window):
+        # Kept until the window stops counting as "previous" for any check
+        expires_at = datetime.utcfromtimestamp(window_start + 2 * window)
+        stmt = insert(RateLimitCounter.__table__).values(
+            key=key, window_start=window_start, count=1, expires_at=expires_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key', 'window_start'],
+            set_={'count': RateLimitCounter.__table__.c.count + 1}
+        ).returning(RateLimitCounter.__table__.c.count)
+        count = conn.execute(stmt).scalar()
+        if random.random() < SWEEP_PROBABILITY:
+            conn.execute(delete(RateLimitCounter).where(RateLimitCounter.expires_at < datetime.utcnow()))
+        return count
+
+    def incr(self, key, window_start, window):
+        with db.engine.begin() as conn:
+            return self._incr(conn, key, window_start, window)
+
+    def take(self, key, window_start, prev_start, window):
+        """Increments the current window and returns (its new count, the
+        previous window's count). The UPSERT's row lock makes the returned
+        count this caller's own slot - concurrent callers each see a
+        different one."""
+        with db.engine.begin() as conn:
+            curr = self._incr(conn, key, window_start, window)
+            prev = conn.execute(
+                select(RateLimitCounter.count)
+                .where(RateLimitCounter.key == key, RateLimitCounter.window_start == prev_start)
+            ).scalar()
+        return curr, prev or 0
+
+    def give_back(self, key, window_start):
+        t = RateLimitCounter.__table__
+        with db.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.key == key, t.c.window_start == window_start, t.c.count > 0)
+                         .values(count=t.c.count - 1))
+
+    def reset(self, key):
+        with db.engine.begin() as conn:
+            conn.execute(delete(RateLimitCounter).where(RateLimitCounter.key == key))
+
+
+def _default_backend():
+    if os.getenv('RATE_LIMIT_BACKEND', 'database').lower() == 'memory':
+        return MemoryBackend()
+    return DatabaseBackend()
+
+
+backend = _default_backend()
+
+
+class RateLimiter:
+    def __init__(self, scope, limit, window_seconds):
+        self.scope = scope
+        self.limit = limit
+        self.window = window_seconds
+
+    def _key(self, ident):
+        return f"{self.scope}:{ident}"
+
+    def _windows(self, now):
+        window_start = int(now // self.window) * self.window
+        return window_start, window_start - self.window, (now - window_start) / self.window
+
+    def _retry_after(self, curr, prev, window_start, elapsed, now):
+        """Seconds until one more request fits, given the counts before it
+        (0 if it fits now)."""
+        weighted = prev * (1 - elapsed) + curr
+        if weighted + 1 <= self.limit:
+            return 0
+        if curr + 1 > self.limit or not prev:
+            # Blocked by this window alone - wait for it to roll over
+            return int(window_start + self.window - now) + 1
+        # Blocked only by the previous window's tail: wait until enough of it
+        # has slid out that one more request fits
+        fraction_needed = 1 - (self.limit - 1 - curr) / prev
+        return max(1, int((fraction_needed - elapsed) * self.window) + 1)
+
+    def status(self, ident, now=None):
+        """(weighted_count, retry_after_seconds). retry_after is 0 when
+        another request is currently allowed. Read-only - to act on the
+        answer, use reserve(), which can't be raced."""
+        now = now or time.time()
+        window_start, prev_start, elapsed = self._windows(now)
+        curr, prev = backend.get(self._key(ident), window_start, prev_start)
+        return prev * (1 - elapsed) + curr, self._retry_after(curr, prev, window_start, elapsed, now)
+
+    def reserve(self, ident, now=None):
+        """Atomically takes one unit of budget for ident. Returns
+        (weighted count before this request, retry_after, slot). When
+        retry_after is non-zero nothing was taken; otherwise pass slot to
+        refund() if the request shouldn't count after all."""
+        now = now or time.time()
+        window_start, prev_start, elapsed = self._windows(now)
+        key = self._key(ident)
+        curr, prev = backend.take(key, window_start, prev_start, self.window)
+        # curr includes this request; judge it against the counts before it
+        retry_after = self._retry_after(curr - 1, prev, window_start, elapsed, now)
+        if retry_after:
+            backend.give_back(key, window_start)
+        return prev * (1 - elapsed) + curr - 1, retry_after, window_start
+
+    def refund(self, ident, slot):
+        """Returns a unit taken by reserve() (slot is the window it came from)."""
+        backend.give_back(self._key(ident), slot)
+
+    def remaining(self, ident):
+        weighted, _ = self.status(ident)
+        return max(0, int(self.limit - weighted))
+
+    def hit(self, ident):
+        window_start, _, _ = self._windows(time.time())
+        return backend.incr(self._key(ident), window_start, self.window)
+
+    def reset(self, ident):
+        backend.reset(self._key(ident))
+
+
+def rate_limited(limiter, key_func=client_ip, count_on=None, reset_on=None,
+                 message="Too many requests. Please try again in {minutes} minute(s).", message_key="msg"):
+    """Rejects with 429 once limiter's budget for key_func() is used up.
+
+    count_on: only responses with these status codes use up budget (e.g.
+    (401,) for login, so only failed attempts count). Default: every call.
+    Either way a slot is reserved before the view runs; responses outside
+    count_on hand it back afterwards.
+    reset_on: responses with these status codes clear the key (e.g. a
+    successful login wipes the failed-attempt count).
+    The view can read g.rate_limit_remaining (budget left before this call)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return fn(*args, **kwargs)
+            ident = key_func()
+            # Take the slot before running the view, so parallel requests
+            # can't all pass on the same under-limit count
+            weighted, retry_after, slot = limiter.reserve(ident)
+            if retry_after:
+                resp = jsonify({message_key: message.format(minutes=max(1, retry_after // 60))})
+                resp.status_code = 429
+                resp.headers['Retry-After'] = str(retry_after)
+                return resp
+            g.rate_limit_remaining = max(0, int(limiter.limit - weighted))
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                if count_on is not None:
+                    limiter.refund(ident, slot)
+                raise
+            status = _status_of(result)
+            if reset_on is not None and status in reset_on:
+                limiter.reset(ident)
+            elif count_on is not None and status not in count_on:
+                limiter.refund(ident, slot)
+            return result
+        return wrapper
+    return decorator
+
+
+def _status_of(result):
+    if isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+        return result[1]
+    return getattr(result, 'status_code', 200)
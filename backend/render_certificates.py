@@ -0,0 +1,25 @@
+"""
+Renders every issued certificate into the PDF disk cache (certificates.py),
+spread over a process pool, so downloads after a bulk completion - or after
+a TEMPLATE_VERSION bump - are served straight from disk.
+
+Already-cached certificates are skipped, so it is safe to re-run.
+
+Run from the backend/ directory:
+    python render_certificates.py              # every certificate
+    python render_certificates.py 3            # only course 3
+    CERT_RENDER_PROCESSES=8 python render_certificates.py
+"""
+
+import sys
+
+from app import app
+import certificates
+
+if __name__ == "__main__":
+    course_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    with app.app_context():
+        fields = certificates.completed_fields(course_id)
+    print(f"Rendering {len(fields)} certificate(s) on {certificates.CERT_RENDER_PROCESSES} process(es)...")
+    errors = certificates.render_many(fields)
+    print(f"Done. {len(fields) - len(errors)} ready, {len(errors)} failed.")
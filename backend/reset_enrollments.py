@@ -1,7 +1,13 @@
 from app import app, db
 from models import Enrollment
+from enrollments import rebuild_owned_courses
+import daily_metrics
 
 with app.app_context():
     db.session.query(Enrollment).delete()
+    # The bulk delete bypasses grant_courses - bring the owned course lists
+    # and the daily rollup back in line with the (now empty) enrollments
+    rebuild_owned_courses()
+    daily_metrics.rebuild_all()
     db.session.commit()
-    print("✅ All enrollments wiped. Users must pay again.")
\ No newline at end of file
+    print("✅ All enrollments wiped. Users must pay again.")
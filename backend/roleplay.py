@@ -0,0 +1,212 @@
+import json
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+import llm
+from database import db
+from models import RoleplaySession
+
+# Keeps roleplay prompts a bounded size however long the simulation runs.
+# The model sees: persona, a rolling summary of older turns, and the most
+# recent turns that fit in ROLEPLAY_HISTORY_TOKEN_BUDGET. Older turns are
+# folded into the summary a chunk at a time, so most turns cost no extra
+# call and per-turn latency stays flat instead of growing with the history.
+#
+# Each attempt lives in a RoleplaySession row: the client sends only its
+# newest message per turn, and persona/objectives come from the lesson.
+
+# --- TUNABLES (env overridable) ---
+ROLEPLAY_HISTORY_TOKEN_BUDGET = int(os.getenv('ROLEPLAY_HISTORY_TOKEN_BUDGET', '3000'))
+ROLEPLAY_GRADER_TOKEN_BUDGET = int(os.getenv('ROLEPLAY_GRADER_TOKEN_BUDGET', '12000'))
+ROLEPLAY_SESSION_TTL_HOURS = int(os.getenv('ROLEPLAY_SESSION_TTL_HOURS', '24'))
+# Live sessions kept per user; starting another drops the oldest
+ROLEPLAY_MAX_SESSIONS_PER_USER = int(os.getenv('ROLEPLAY_MAX_SESSIONS_PER_USER', '5'))
+ROLEPLAY_MAX_TURNS = 200
+# Fold at least this many messages into the summary at once
+SUMMARY_CHUNK_MESSAGES = 6
+# Never summarize away the last few messages, whatever their size
+MIN_RECENT_MESSAGES = 4
+MAX_MESSAGE_CHARS = 4000
+SUMMARY_MODEL = "gpt-4o-mini"
+# Fraction of new sessions that also sweep expired ones out of the table
+SWEEP_PROBABILITY = 0.05
+
+_ROLES = ('user', 'assistant')
+
+
+class SessionFull(Exception):
+    """The session hit ROLEPLAY_MAX_TURNS."""
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English; close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def clean_messages(messages):
+    """Only user/assistant turns with string content, each length-capped.
+    The client must not be able to slip in extra system prompts."""
+    cleaned = []
+    for m in messages if isinstance(messages, list) else []:
+        if not isinstance(m, dict) or m.get('role') not in _ROLES or not isinstance(m.get('content'), str):
+            continue
+        cleaned.append({"role": m['role'], "content": m['content'][:MAX_MESSAGE_CHARS]})
+    return cleaned
+
+
+def compact_json(messages):
+    return json.dumps([{"role": m['role'], "content": m['content']} for m in messages],
+                      separators=(',', ':'), ensure_ascii=False)
+
+
+def _tokens_of(messages):
+    return sum(estimate_tokens(m['content']) + 4 for m in messages)
+
+
+def _summarize(previous_summary, messages):
+    prompt = (
+        "Summarize this roleplay conversation so it can continue without the full transcript. "
+        "Keep names, facts, commitments, open questions and the emotional tone. Max 150 words.\n\n"
+        + (f"SUMMARY SO FAR:\n{previous_summary}\n\n" if previous_summary else "")
+        + f"NEW MESSAGES:\n{compact_json(messages)}"
+    )
+    return llm.complete([{"role": "user", "content": prompt}], SUMMARY_MODEL, temperature=0.2)
+
+
+def compact_history(messages, summarized_count=0, summary=None, summarize=True,
+                    budget=ROLEPLAY_HISTORY_TOKEN_BUDGET):
+    """(summarized_count, summary, recent messages) covering the whole
+    history within budget, continuing from an earlier summary of the first
+    summarized_count messages. With summarize=False the oldest messages are
+    simply dropped instead."""
+    count = summarized_count
+    recent = messages[count:]
+    limit = max(0, len(messages) - MIN_RECENT_MESSAGES)
+
+    while _tokens_of(recent) > budget and count < limit:
+        # Fold enough of the oldest messages to get under budget, and at
+        # least a full chunk so the next few turns need no summary call
+        take, tokens = 0, _tokens_of(recent)
+        while count + take < limit and (take < SUMMARY_CHUNK_MESSAGES or tokens > budget):
+            tokens -= estimate_tokens(recent[take]['content']) + 4
+            take += 1
+        if summarize:
+            try:
+                summary = _summarize(summary, recent[:take])
+            except Exception as e:
+                print(f"Roleplay Summary Error: {e}", file=sys.stderr, flush=True)
+                # Keep going without the older turns rather than failing the turn
+                return count, summary, recent[-MIN_RECENT_MESSAGES:]
+        count += take
+        recent = messages[count:]
+    return count, summary, recent
+
+
+def _conversation(persona, summary, recent):
+    conversation = [{"role": "system", "content": persona}]
+    if summary:
+        conversation.append({"role": "system", "content": f"Summary of the conversation so far: {summary}"})
+    return conversation + recent
+
+
+def build_conversation(persona, messages):
+    """Prompt for a stateless turn (client sent the whole history): the
+    oldest turns are dropped to fit the budget."""
+    _, _, recent = compact_history(messages, summarize=False)
+    return _conversation(persona, None, recent)
+
+
+def transcript_for_grading(messages, summarized_count=0, summary=None):
+    """Transcript text for the grader: the full conversation as compact
+    JSON, or - for very long simulations - the summary plus as much of the
+    end as fits ROLEPLAY_GRADER_TOKEN_BUDGET."""
+    if _tokens_of(messages) <= ROLEPLAY_GRADER_TOKEN_BUDGET:
+        return compact_json(messages)
+    recent = messages[summarized_count:] if summary else messages
+    while len(recent) > MIN_RECENT_MESSAGES and _tokens_of(recent) > ROLEPLAY_GRADER_TOKEN_BUDGET:
+        recent = recent[1:]
+    skipped = len(messages) - len(recent)
+    header = f"EARLIER CONVERSATION SUMMARY ({skipped} messages): {summary}\n" if summary \
+        else f"({skipped} earlier messages omitted)\n"
+    return header + compact_json(recent)
+
+
+# ==========================================
+# SESSIONS
+# ==========================================
+
+def find_lesson(course, module_index, lesson_index):
+    """The roleplay lesson dict at that position in course_data, or None.
+    Indices must be non-negative ints (the route validates them)."""
+    if module_index < 0 or lesson_index < 0:
+        return None
+    try:
+        lesson = (course.course_data or {})['modules'][module_index]['lessons'][lesson_index]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return lesson if isinstance(lesson, dict) and lesson.get('type') == 'roleplay' else None
+
+
+def _expiry():
+    return datetime.utcnow() + timedelta(hours=ROLEPLAY_SESSION_TTL_HOURS)
+
+
+def start_session(user_id, course, module_index, lesson_index, lesson):
+    """New session seeded with the lesson's opening line. Caller commits."""
+    live = db.session.query(RoleplaySession.id)\
+        .filter(RoleplaySession.user_id == user_id, RoleplaySession.expires_at > datetime.utcnow())\
+        .order_by(RoleplaySession.created_at.desc()).all()
+    stale = [sid for (sid,) in live[ROLEPLAY_MAX_SESSIONS_PER_USER - 1:]]
+    if stale:
+        db.session.execute(delete(RoleplaySession).where(RoleplaySession.id.in_(stale)))
+    if random.random() < SWEEP_PROBABILITY:
+        db.session.execute(delete(RoleplaySession).where(RoleplaySession.expires_at < datetime.utcnow()))
+
+    opening = lesson.get('initial_message')
+    objectives = lesson.get('objectives')
+    if isinstance(objectives, list):
+        objectives = "; ".join(str(o) for o in objectives)
+    session = RoleplaySession(
+        id=uuid.uuid4().hex, user_id=user_id, course_id=course.id,
+        module_index=module_index, lesson_index=lesson_index,
+        persona=lesson.get('persona') or 'You are a helpful assistant.',
+        objectives=objectives,
+        turns=[{"role": "assistant", "content": opening}] if opening else [],
+        expires_at=_expiry()
+    )
+    db.session.add(session)
+    return session
+
+
+def get_session(user_id, session_id):
+    """The user's live session, or None if unknown, someone else's or expired."""
+    session = db.session.get(RoleplaySession, str(session_id)) if session_id else None
+    if not session or session.user_id != int(user_id) or session.expires_at < datetime.utcnow():
+        return None
+    return session
+
+
+def append_turn(session, role, content):
+    """Caller commits. JSON columns don't track in-place edits, hence the
+    reassignment."""
+    if role == 'user' and len(session.turns or []) >= ROLEPLAY_MAX_TURNS:
+        raise SessionFull()
+    session.turns = list(session.turns or []) + [{"role": role, "content": content[:MAX_MESSAGE_CHARS]}]
+    session.expires_at = _expiry()
+
+
+def session_conversation(session):
+    """Prompt for the session's next turn. Advances its stored summary when
+    older turns need folding - caller commits."""
+    count, summary, recent = compact_history(session.turns or [], session.summarized_count or 0, session.summary)
+    if count != session.summarized_count:
+        session.summarized_count, session.summary = count, summary
+    return _conversation(session.persona, summary, recent)
+
+
+def session_transcript(session):
+    return transcript_for_grading(session.turns or [], session.summarized_count or 0, session.summary)
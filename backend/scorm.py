@@ -0,0 +1,347 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import stat
+import sys
+import tempfile
+import uuid
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import unquote
+
+from flask import send_file
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it only .gz variants are made
+    brotli = None
+
+# SCORM package ingest. Entries are streamed out of the zip one chunk at a
+# time and counted as they go (the sizes in a zip's headers can lie), so an
+# oversized entry or a zip bomb is rejected part-way through instead of
+# filling the disk. Every file is stored once, by SHA-256, under
+# COURSES_FOLDER/_objects; a package is a directory of hard links into that
+# store, so the same jQuery or Storyline player shipped in twenty packages
+# takes the space of one, and re-uploading an identical package is a no-op.
+#
+# Text assets are gzipped and brotli'd once, when first
+# stored. send_asset serves those variants as-is, so serving never
+# compresses on the fly; they sit next to each file as .gz/.br, which
+# nginx's gzip_static/brotli_static pick up just the same.
+#
+# The launch file comes from imsmanifest.xml (default organization -> first
+# item -> its resource's href), falling back to index.html/story.html for
+# packages without a usable manifest.
+
+# --- TUNABLES (env overridable) ---
+SCORM_MAX_ENTRY_BYTES = int(os.getenv('SCORM_MAX_ENTRY_BYTES', str(200 * 1024 * 1024)))
+SCORM_MAX_TOTAL_BYTES = int(os.getenv('SCORM_MAX_TOTAL_BYTES', str(1024 * 1024 * 1024)))
+SCORM_MAX_ENTRIES = int(os.getenv('SCORM_MAX_ENTRIES', '20000'))
+SCORM_PRECOMPRESS_MIN_BYTES = int(os.getenv('SCORM_PRECOMPRESS_MIN_BYTES', '1024'))
+# Precompression runs inside the upload request. Brotli 11 manages well under
+# 1 MB/s and would tie a worker up for minutes on a big package; 6 is ~25
+# MB/s for output within ~15% of it, and gzip 9 buys nothing over 6.
+SCORM_GZIP_LEVEL = int(os.getenv('SCORM_GZIP_LEVEL', '6'))
+SCORM_BROTLI_QUALITY = int(os.getenv('SCORM_BROTLI_QUALITY', '6'))
+
+CHUNK_BYTES = 64 * 1024
+MAX_MANIFEST_BYTES = 5 * 1024 * 1024
+OBJECTS_DIR = '_objects'
+COMPRESSIBLE = frozenset((
+    '.html', '.htm', '.js', '.mjs', '.css', '.json', '.xml', '.xsd', '.dtd',
+    '.svg', '.txt', '.vtt', '.csv', '.map', '.ttf', '.otf', '.eot',
+))
+# Only keep a compressed variant that saves at least this much
+MIN_SAVING = 0.9
+# Package folders are named after their content, so their files never change
+ASSET_MAX_AGE_SECONDS = 365 * 24 * 3600
+FALLBACK_LAUNCH_FILES = ('index.html', 'story.html', 'index_lms.html')
+
+ScormPackage = namedtuple('ScormPackage', ['folder_name', 'launch_file', 'files', 'total_bytes', 'new_bytes', 'title'])
+
+
+class ScormRejected(Exception):
+    """The upload isn't an acceptable SCORM package (message says why)."""
+
+
+# ==========================================
+# CONTENT STORE
+# ==========================================
+
+def _object_path(courses_folder, digest):
+    return os.path.join(courses_folder, OBJECTS_DIR, digest[:2], digest)
+
+
+def _write_variant(src, dest, compress):
+    """Writes a compressed copy of src to dest if it's worth keeping."""
+    with open(src, 'rb') as f:
+        raw = f.read()
+    packed = compress(raw)
+    if len(packed) > len(raw) * MIN_SAVING:
+        return
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(packed)
+    os.replace(tmp, dest)
+
+
+def _precompress(path):
+    _write_variant(path, path + '.gz', lambda raw: gzip.compress(raw, compresslevel=SCORM_GZIP_LEVEL, mtime=0))
+    if brotli is not None:
+        _write_variant(path, path + '.br', lambda raw: brotli.compress(raw, quality=SCORM_BROTLI_QUALITY))
+
+
+def _stream_entry(zf, info, tmp_dir, budget):
+    """Copies one entry into a temp file, hashing as it goes. budget is the
+    remaining total allowance. Returns (temp path, sha256 hex, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out, zf.open(info) as src:
+            while True:
+                chunk = src.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > SCORM_MAX_ENTRY_BYTES:
+                    raise ScormRejected(f"{info.filename} is larger than {SCORM_MAX_ENTRY_BYTES // (1024 * 1024)} MB")
+                if size > budget:
+                    raise ScormRejected(f"Package expands to more than {SCORM_MAX_TOTAL_BYTES // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp, digest.hexdigest(), size
+
+
+def _store(courses_folder, tmp, digest, name):
+    """Moves a streamed entry into the store unless that content is already
+    there. Returns (object path, True if newly stored)."""
+    obj = _object_path(courses_folder, digest)
+    if os.path.exists(obj):
+        os.remove(tmp)
+        return obj, False
+    os.makedirs(os.path.dirname(obj), exist_ok=True)
+    os.replace(tmp, obj)
+    if os.path.splitext(name)[1].lower() in COMPRESSIBLE and os.path.getsize(obj) >= SCORM_PRECOMPRESS_MIN_BYTES:
+        _precompress(obj)
+    return obj, True
+
+
+def _link(src, dest):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        # Different filesystem (or no hard links) - costs the space, still works
+        shutil.copyfile(src, dest)
+
+
+# ==========================================
+# ZIP ENTRIES
+# ==========================================
+
+def _safe_name(info):
+    """The entry's normalized relative path, or None to skip it (directories,
+    symlinks). Raises on paths that would escape the package."""
+    name = info.filename.replace('\\', '/')
+    if name.endswith('/'):
+        return None
+    if stat.S_ISLNK(info.external_attr >> 16):
+        return None
+    if name.startswith('/') or re.match(r'^[A-Za-z]:', name):
+        raise ScormRejected(f"Absolute path in package: {info.filename}")
+    name = posixpath.normpath(name)
+    if name == '..' or name.startswith('../'):
+        raise ScormRejected(f"Path escapes the package: {info.filename}")
+    if name.startswith('__MACOSX/') or posixpath.basename(name) == '.DS_Store':
+        return None
+    return name
+
+
+# ==========================================
+# MANIFEST
+# ==========================================
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _children(el, name):
+    return [c for c in el if _local(c.tag) == name]
+
+
+def _attr(el, name):
+    for key, value in el.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+def _join_base(*parts):
+    return ''.join(p for p in parts if p)
+
+
+def parse_manifest(data):
+    """(launch href, title) from imsmanifest.xml bytes; either may be None."""
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError:
+        return None, None
+
+    resources_el = next(iter(_children(root, 'resources')), None)
+    resources = {}
+    if resources_el is not None:
+        base = _join_base(_attr(root, 'base'), _attr(resources_el, 'base'))
+        for res in _children(resources_el, 'resource'):
+            if _attr(res, 'href'):
+                resources[res.get('identifier')] = (res, _join_base(base, _attr(res, 'base'), _attr(res, 'href')))
+
+    launch, title = None, None
+    orgs = next(iter(_children(root, 'organizations')), None)
+    if orgs is not None:
+        org_list = _children(orgs, 'organization')
+        default = orgs.get('default')
+        org = next((o for o in org_list if o.get('identifier') == default), org_list[0] if org_list else None)
+        if org is not None:
+            title_el = next(iter(_children(org, 'title')), None)
+            if title_el is not None:
+                title = (title_el.text or '').strip() or None
+            # Depth-first: the first item that points at a resource
+            stack = list(reversed(_children(org, 'item')))
+            while stack and launch is None:
+                item = stack.pop()
+                ref = item.get('identifierref')
+                if ref in resources:
+                    launch = resources[ref][1] + (item.get('parameters') or '')
+                stack.extend(reversed(_children(item, 'item')))
+
+    if launch is None:
+        scos = [href for res, href in resources.values() if (_attr(res, 'scormtype') or _attr(res, 'scormType') or '').lower() == 'sco']
+        launch = scos[0] if scos else next((href for _, href in resources.values()), None)
+    return launch, title
+
+
+def _launch_path(href):
+    # Drop any query string / fragment and percent-escapes for the existence check
+    return posixpath.normpath(unquote(re.split(r'[?#]', href, 1)[0]))
+
+
+def _fallback_launch(names):
+    for candidate in FALLBACK_LAUNCH_FILES:
+        matches = sorted((n for n in names if posixpath.basename(n).lower() == candidate), key=lambda n: n.count('/'))
+        if matches:
+            return matches[0]
+    return None
+
+
+# ==========================================
+# INGEST
+# ==========================================
+
+def ingest(zip_path, courses_folder):
+    """Ingests a SCORM zip into courses_folder. Returns a ScormPackage; raises
+    ScormRejected for anything unusable (nothing is left behind)."""
+    if not zipfile.is_zipfile(zip_path):
+        raise ScormRejected("Not a zip file")
+
+    os.makedirs(os.path.join(courses_folder, OBJECTS_DIR), exist_ok=True)
+    staging = os.path.join(courses_folder, f".staging-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    try:
+        stored = {}   # {relative path: (object path, sha256)}
+        total = new_bytes = 0
+        with zipfile.ZipFile(zip_path) as zf:
+            infos = zf.infolist()
+            if len(infos) > SCORM_MAX_ENTRIES:
+                raise ScormRejected(f"Package has more than {SCORM_MAX_ENTRIES} files")
+            for info in infos:
+                name = _safe_name(info)
+                if name is None or name in stored:
+                    continue
+                # Cheap early reject on the declared size; the real check is while streaming
+                if info.file_size > SCORM_MAX_ENTRY_BYTES:
+                    raise ScormRejected(f"{info.filename} is larger than {SCORM_MAX_ENTRY_BYTES // (1024 * 1024)} MB")
+                tmp, digest, size = _stream_entry(zf, info, staging, SCORM_MAX_TOTAL_BYTES - total)
+                obj, is_new = _store(courses_folder, tmp, digest, name)
+                stored[name] = (obj, digest)
+                total += size
+                if is_new:
+                    new_bytes += size
+
+        if not stored:
+            raise ScormRejected("Package is empty")
+
+        # A package zipped with its enclosing folder: treat that folder as the root
+        prefix = posixpath.commonpath(list(stored)) if len(stored) > 1 else posixpath.dirname(next(iter(stored)))
+        if prefix and 'imsmanifest.xml' not in stored and f"{prefix}/imsmanifest.xml" in stored:
+            stored = {posixpath.relpath(n, prefix): v for n, v in stored.items()}
+
+        launch, title = None, None
+        manifest = stored.get('imsmanifest.xml')
+        if manifest and os.path.getsize(manifest[0]) <= MAX_MANIFEST_BYTES:
+            with open(manifest[0], 'rb') as f:
+                launch, title = parse_manifest(f.read())
+            if launch and _launch_path(launch) not in stored:
+                print(f"--- SCORM: manifest launch {launch!r} not in package, falling back ---", file=sys.stderr, flush=True)
+                launch = None
+        launch = launch or _fallback_launch(stored)
+        if not launch:
+            raise ScormRejected("No launch file: imsmanifest.xml has no usable resource and there is no index.html")
+
+        # Same files -> same folder, so an identical re-upload is free
+        fingerprint = hashlib.sha256('\n'.join(f"{n}\0{d}" for n, (_, d) in sorted(stored.items())).encode()).hexdigest()
+        folder_name = f"pkg-{fingerprint[:16]}"
+        final = os.path.join(courses_folder, folder_name)
+        if not os.path.isdir(final):
+            tree = os.path.join(staging, 'tree')
+            for name, (obj, _) in stored.items():
+                dest = os.path.join(tree, *name.split('/'))
+                _link(obj, dest)
+                for suffix in ('.gz', '.br'):
+                    if os.path.exists(obj + suffix):
+                        _link(obj + suffix, dest + suffix)
+            try:
+                os.rename(tree, final)
+            except OSError:
+                # Lost a race with an identical upload - theirs is the same tree
+                if not os.path.isdir(final):
+                    raise
+        return ScormPackage(folder_name, launch, len(stored), total, new_bytes, title)
+    except (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError) as e:
+        # RuntimeError: encrypted entries; NotImplementedError: unsupported compression
+        raise ScormRejected(f"Corrupt zip: {e}")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+# ==========================================
+# SERVING
+# ==========================================
+
+def send_asset(package_dir, filename, accept_encoding):
+    """send_file for a package file, preferring a stored .br/.gz variant the
+    client accepts. Returns None if the file doesn't exist."""
+    path = os.path.realpath(os.path.join(package_dir, filename))
+    if not path.startswith(os.path.realpath(package_dir) + os.sep) or not os.path.isfile(path):
+        return None
+    accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accepted and os.path.isfile(path + suffix):
+            resp = send_file(path + suffix, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE_SECONDS)
+            resp.headers['Content-Encoding'] = encoding
+            resp.headers['Vary'] = 'Accept-Encoding'
+            return resp
+    resp = send_file(path, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE_SECONDS)
+    if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+        resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
@@ -0,0 +1,33 @@
+"""
+Standalone processor for the Stripe webhook events stored by stripe_events.py.
+
+Only needed when the web app runs with STRIPE_EVENT_WORKER_MODE=process
+(otherwise each gunicorn worker already runs its own small processing pool).
+Safe to run several copies - events are claimed with SELECT ... FOR UPDATE
+SKIP LOCKED.
+
+Run from the backend/ directory:
+    STRIPE_EVENT_WORKER_MODE=process python stripe_event_worker.py
+"""
+
+import signal
+import time
+
+from app import app
+from stripe_events import start_stripe_event_workers, stop_stripe_event_workers, STRIPE_EVENT_WORKERS
+
+if __name__ == "__main__":
+    print(f"--- Stripe event worker starting ({STRIPE_EVENT_WORKERS} thread(s)) ---", flush=True)
+    start_stripe_event_workers(app)
+
+    running = True
+    def _shutdown(*_):
+        global running
+        running = False
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    while running:
+        time.sleep(1)
+    stop_stripe_event_workers()
+    print("--- Stripe event worker stopped ---", flush=True)
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+import traceback
+from datetime import datetime
+
+import stripe
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import StripeEvent
+from lease_queue import LeaseQueue
+
+# --- TUNABLES (env overridable) ---
+STRIPE_EVENT_WORKERS = int(os.getenv('STRIPE_EVENT_WORKERS', '2'))
+STRIPE_EVENT_BATCH_SIZE = int(os.getenv('STRIPE_EVENT_BATCH_SIZE', '10'))
+STRIPE_EVENT_POLL_SECONDS = float(os.getenv('STRIPE_EVENT_POLL_SECONDS', '5'))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv('STRIPE_EVENT_MAX_ATTEMPTS', '8'))
+STRIPE_EVENT_BACKOFF_BASE_SECONDS = 15
+STRIPE_EVENT_BACKOFF_MAX_SECONDS = 3600
+# A claimed event is leased for this long. If the process dies mid-handler
+# the event becomes due again afterwards and another worker retries it.
+STRIPE_EVENT_LEASE_SECONDS = 300
+
+# {event type: handler(event)}. Types with no handler are marked processed
+# straight away. Handlers must be idempotent - a retry after a crash runs
+# them again - and should commit their own work.
+_handlers = {}
+
+
+def register_handler(event_type, fn):
+    _handlers[event_type] = fn
+
+
+# ==========================================
+# INGEST
+# ==========================================
+
+def record_event(event, payload):
+    """Stores a verified webhook event. Returns False if Stripe already
+    delivered this event id (nothing new is queued).
+
+    Writes on its own connection/transaction, so the webhook can ack the
+    moment this returns."""
+    stmt = insert(StripeEvent.__table__).values(
+        event_id=event['id'], type=event['type'],
+        payload=payload.decode('utf-8') if isinstance(payload, bytes) else payload,
+        status='pending', attempts=0, next_attempt_at=datetime.utcnow(), received_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['event_id'])
+    with db.engine.begin() as conn:
+        inserted = conn.execute(stmt).rowcount
+    _queue.wake()
+    return bool(inserted)
+
+
+def requeue_event(event_row_id):
+    """Puts a dead-lettered event back in the queue with a fresh set of attempts."""
+    db.session.execute(update(StripeEvent).where(StripeEvent.id == event_row_id).values(
+        status='pending', attempts=0, next_attempt_at=datetime.utcnow(), last_error=None
+    ))
+    db.session.commit()
+    _queue.wake()
+
+
+# ==========================================
+# WORKER
+# ==========================================
+
+def _snapshot(r):
+    return (r.id, r.event_id, r.type, r.attempts, r.payload)
+
+
+def _finish(row_id, **values):
+    db.session.execute(update(StripeEvent).where(StripeEvent.id == row_id).values(**values))
+    db.session.commit()
+
+
+def _handle(claimed):
+    for row_id, event_id, event_type, attempts, payload in claimed:
+        handler = _handlers.get(event_type)
+        try:
+            if handler:
+                handler(stripe.Event.construct_from(json.loads(payload), stripe.api_key))
+            _finish(row_id, status='processed', processed_at=datetime.utcnow(), last_error=None)
+        except Exception as e:
+            db.session.rollback()
+            error = f"{e}\n{traceback.format_exc(limit=5)}"
+            if attempts >= STRIPE_EVENT_MAX_ATTEMPTS:
+                print(f"--- STRIPE EVENT DEAD: {event_id} ({event_type}) after {attempts} attempts: {e} ---", file=sys.stderr, flush=True)
+                _finish(row_id, status='dead', last_error=error)
+            else:
+                print(f"--- STRIPE EVENT ERROR: {event_id} ({event_type}) attempt {attempts}, will retry: {e} ---", file=sys.stderr, flush=True)
+                _finish(row_id, status='pending', last_error=error, next_attempt_at=datetime.utcnow() + _queue.backoff(attempts))
+
+
+_queue = LeaseQueue(
+    'stripe event', StripeEvent, _snapshot, _handle,
+    batch_size=STRIPE_EVENT_BATCH_SIZE, poll_seconds=STRIPE_EVENT_POLL_SECONDS, lease_seconds=STRIPE_EVENT_LEASE_SECONDS,
+    backoff_base_seconds=STRIPE_EVENT_BACKOFF_BASE_SECONDS, backoff_max_seconds=STRIPE_EVENT_BACKOFF_MAX_SECONDS
+)
+
+
+def process_batch():
+    """Claims and handles one batch. Returns how many events it handled."""
+    return _queue.process_batch()
+
+
+def start_stripe_event_workers(app, count=None):
+    """Starts the in-process event worker pool (idempotent per process)."""
+    _queue.start_workers(app, count if count is not None else STRIPE_EVENT_WORKERS)
+
+
+def stop_stripe_event_workers():
+    _queue.stop_workers()
@@ -0,0 +1,80 @@
+import os
+
+import stripe
+from sqlalchemy.dialects.postgresql import insert
+from database import db
+from models import StripeCheckoutSession
+
+# --- TUNABLES (env overridable) ---
+STRIPE_TIMEOUT_SECONDS = float(os.getenv('STRIPE_TIMEOUT_SECONDS', '20'))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', '2'))
+
+
+def configure_stripe():
+    """API key, plus one pooled HTTP client (keep-alive session per thread)
+    with bounded timeouts instead of the SDK's 80s default. STRIPE_API_BASE
+    points the SDK at a local fake such as stripe-mock
+    (`STRIPE_API_BASE=http://localhost:12111`) for testing."""
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    if os.getenv("STRIPE_API_BASE"):
+        stripe.api_base = os.getenv("STRIPE_API_BASE")
+    stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = stripe.RequestsClient(timeout=STRIPE_TIMEOUT_SECONDS)
+
+
+class CheckoutSessionInfo:
+    """The handful of checkout session fields the payment routes use, from
+    either the local table or a fresh Stripe retrieve."""
+
+    def __init__(self, session_id, payment_status, payment_intent=None, customer_email=None,
+                 customer_name=None, amount_total=None, currency=None, metadata=None):
+        self.id = session_id
+        self.payment_status = payment_status
+        self.payment_intent = payment_intent
+        self.customer_email = customer_email
+        self.customer_name = customer_name
+        self.amount_total = amount_total
+        self.currency = currency
+        self.metadata = metadata or {}
+
+    @classmethod
+    def from_stripe(cls, session):
+        details = session.customer_details
+        return cls(
+            session.id, session.payment_status, session.payment_intent,
+            details.email if details else None, details.name if details else None,
+            session.amount_total, session.currency,
+            {k: session.metadata[k] for k in session.metadata} if session.metadata else {}
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.session_id, row.payment_status, row.payment_intent_id, row.customer_email,
+                   row.customer_name, row.amount_total, row.currency, row.session_metadata)
+
+
+def remember(info):
+    """Stores a paid session (no-op for unpaid ones or ones already stored).
+    Own connection/transaction, like the outbox - never touches the
+    caller's db.session."""
+    if info.payment_status != 'paid':
+        return
+    stmt = insert(StripeCheckoutSession.__table__).values(
+        session_id=info.id, payment_status=info.payment_status, payment_intent_id=info.payment_intent,
+        customer_email=info.customer_email, customer_name=info.customer_name,
+        amount_total=info.amount_total, currency=info.currency, session_metadata=info.metadata
+    ).on_conflict_do_nothing(index_elements=['session_id'])
+    with db.engine.begin() as conn:
+        conn.execute(stmt)
+
+
+def get_checkout_session(session_id):
+    """CheckoutSessionInfo for session_id - from the local table when this
+    session is already known to be paid, otherwise from Stripe (and stored
+    if it turned out paid)."""
+    row = db.session.get(StripeCheckoutSession, session_id)
+    if row:
+        return CheckoutSessionInfo.from_row(row)
+    info = CheckoutSessionInfo.from_stripe(stripe.checkout.Session.retrieve(session_id))
+    remember(info)
+    return info
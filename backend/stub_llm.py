@@ -0,0 +1,88 @@
+"""
+Local stand-in for the OpenAI chat completions API, for exercising the chat
+and roleplay routes (streaming included) without a real key or network.
+
+Replies are canned: an echo of the last user message, split into word-sized
+stream chunks. Requests asking for a JSON response get a fixed roleplay
+feedback object. STUB_LLM_DELAY adds per-chunk latency, so slow upstreams
+can be simulated too.
+
+Run from the backend/ directory, then start the app pointed at it:
+    python stub_llm.py
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8089/v1 gunicorn app:app ...
+"""
+
+import json
+import os
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = int(os.getenv("STUB_LLM_PORT", "8089"))
+CHUNK_DELAY = float(os.getenv("STUB_LLM_DELAY", "0.05"))
+
+FEEDBACK = {
+    "score": 80,
+    "strengths": ["Clear opening", "Stayed on topic", "Polite tone"],
+    "improvements": ["Ask more questions", "Summarize agreements", "Be more specific"],
+    "summary": "Solid effort - this is a stubbed grading response."
+}
+
+
+def _reply_for(body):
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps(FEEDBACK)
+    user_msgs = [m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"]
+    return f"Stub reply to: {user_msgs[-1] if user_msgs else '(nothing)'}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        reply = _reply_for(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {"id": completion_id, "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            payload = json.dumps({**base, "object": "chat.completion", "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": reply}
+            }]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{
+                "index": 0, "finish_reason": None,
+                "delta": {"content": word if i == 0 else " " + word}
+            }]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(CHUNK_DELAY)
+        done = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]}
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, fmt, *args):
+        print(f"--- STUB LLM: {fmt % args} ---", flush=True)
+
+
+if __name__ == "__main__":
+    print(f"--- Stub LLM listening on http://127.0.0.1:{PORT}/v1 ---", flush=True)
+    ThreadingHTTPServer(("127.0.0.1", PORT), StubHandler).serve_forever()
@@ -0,0 +1,164 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import psutil
+from database import db
+from models import User, Enrollment
+
+# Background sampler behind /api/admin/system-health. Every interval one
+# thread per process records CPU, memory, disk, a DB ping, connection pool
+# usage and the latency of the requests this process served since the last
+# sample into a fixed-size ring buffer. The endpoint just reads the buffer -
+# no blocking cpu_percent(interval=...) and no COUNT(*) per poll; row counts
+# are refreshed on their own slower cadence.
+#
+# Per process: with several gunicorn workers, a poll sees whichever worker
+# served it (CPU/memory/disk are host-wide either way).
+
+# --- TUNABLES (env overridable) ---
+SYSTEM_METRICS_INTERVAL_SECONDS = float(os.getenv('SYSTEM_METRICS_INTERVAL_SECONDS', '5'))
+SYSTEM_METRICS_HISTORY = int(os.getenv('SYSTEM_METRICS_HISTORY', '120'))  # 10 min at 5s
+SYSTEM_METRICS_ROW_COUNT_SECONDS = float(os.getenv('SYSTEM_METRICS_ROW_COUNT_SECONDS', '300'))
+# Request durations kept per interval for the percentiles
+MAX_LATENCIES_PER_SAMPLE = 2000
+
+_samples = deque(maxlen=SYSTEM_METRICS_HISTORY)
+_row_counts = {"total_users": None, "total_enrollments": None, "refreshed_at": 0.0}
+
+_latencies = []
+_request_count = 0
+_latency_lock = threading.Lock()
+
+
+# ==========================================
+# REQUEST LATENCY
+# ==========================================
+
+def record_request(duration_ms):
+    """Called once per request (after_request) with its duration."""
+    global _request_count
+    with _latency_lock:
+        _request_count += 1
+        if len(_latencies) < MAX_LATENCIES_PER_SAMPLE:
+            _latencies.append(duration_ms)
+
+
+def _drain_latencies():
+    global _latencies, _request_count
+    with _latency_lock:
+        latencies, count = _latencies, _request_count
+        _latencies, _request_count = [], 0
+    if not latencies:
+        return count, None, None, None
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return count, round(sum(latencies) / len(latencies), 1), round(p95, 1), round(latencies[-1], 1)
+
+
+# ==========================================
+# SAMPLING
+# ==========================================
+
+def _db_ping():
+    start = time.perf_counter()
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(db.text('SELECT 1'))
+        return True, round((time.perf_counter() - start) * 1000, 1)
+    except Exception:
+        return False, None
+
+
+def _pool_stats():
+    pool = db.engine.pool
+    stats = {}
+    for name in ('size', 'checkedout', 'overflow', 'checkedin'):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    return stats
+
+
+def _refresh_row_counts(force=False):
+    if not force and time.monotonic() - _row_counts["refreshed_at"] < SYSTEM_METRICS_ROW_COUNT_SECONDS:
+        return
+    _row_counts["total_users"] = User.query.filter_by(is_deleted=False).count()
+    _row_counts["total_enrollments"] = Enrollment.query.count()
+    _row_counts["refreshed_at"] = time.monotonic()
+
+
+def take_sample():
+    """Records one sample and returns it. Needs an app context."""
+    try:
+        # interval=None: CPU use since the previous call - never blocks
+        cpu = psutil.cpu_percent(interval=None)
+        memory_pct = psutil.virtual_memory().percent
+        disk_pct = psutil.disk_usage('/').percent
+    except Exception:
+        cpu, memory_pct, disk_pct = 0, 0, 0
+    db_ok, db_ms = _db_ping()
+    requests, api_avg, api_p95, api_max = _drain_latencies()
+    sample = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "cpu_percent": cpu,
+        "memory_percent": memory_pct,
+        "disk_percent": disk_pct,
+        "db_connected": db_ok,
+        "db_response_ms": db_ms,
+        "api_response_ms": api_avg,
+        "api_p95_ms": api_p95,
+        "api_max_ms": api_max,
+        "requests": requests,
+        "pool": _pool_stats(),
+    }
+    _samples.append(sample)
+    return sample
+
+
+def latest():
+    """(latest sample or None, history oldest-first, row counts)."""
+    history = list(_samples)
+    return (history[-1] if history else None), history, \
+        {"total_users": _row_counts["total_users"], "total_enrollments": _row_counts["total_enrollments"]}
+
+
+def _sampler_loop(app, stop_event):
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                try:
+                    take_sample()
+                    _refresh_row_counts()
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            print(f"--- SYSTEM METRICS ERROR: {e} ---", file=sys.stderr, flush=True)
+        stop_event.wait(SYSTEM_METRICS_INTERVAL_SECONDS)
+
+
+_sampler = []
+_stop = threading.Event()
+
+
+def start_system_metrics(app):
+    """Starts this process's sampler thread (idempotent per process)."""
+    if _sampler:
+        return
+    psutil.cpu_percent(interval=None)  # prime the since-last-call baseline
+    t = threading.Thread(target=_sampler_loop, args=(app, _stop), name="system-metrics-sampler", daemon=True)
+    t.start()
+    _sampler.append(t)
+
+
+def stop_system_metrics():
+    _stop.set()
+
+
+def ensure_row_counts():
+    """Fills the row counts on the first poll if the sampler hasn't yet."""
+    if _row_counts["total_users"] is None:
+        _refresh_row_counts(force=True)
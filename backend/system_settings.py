@@ -0,0 +1,177 @@
+import os
+import select
+import sys
+import threading
+import uuid
+from collections import namedtuple
+
+from sqlalchemy import text
+from database import db
+from models import SystemSetting
+
+# Typed registry of the admin-editable site settings, held in process
+# memory. Reads never touch the database once loaded; an admin save bumps
+# the settings_version row and NOTIFYs every gunicorn worker (in the same
+# transaction, so the message is only delivered if the save commits). Each
+# process runs one listener thread on its own connection; if that
+# connection drops, the thread falls back to re-checking the version every
+# SETTINGS_POLL_SECONDS until it can LISTEN again.
+
+# --- TUNABLES (env overridable) ---
+SETTINGS_POLL_SECONDS = float(os.getenv('SETTINGS_POLL_SECONDS', '60'))
+
+NOTIFY_CHANNEL = 'system_settings_changed'
+VERSION_KEY = 'settings_version'
+
+Setting = namedtuple('Setting', ['key', 'type', 'default'])
+
+# {public name: Setting} - the public name is what /api/settings speaks
+REGISTRY = {
+    'maintenance': Setting('maintenance_mode', bool, False),
+    'registrations': Setting('allow_registrations', bool, True),
+}
+
+_values = None   # {public name: typed value}
+_version = None
+_lock = threading.Lock()
+
+
+def _parse(setting, raw):
+    if raw is None:
+        return setting.default
+    if setting.type is bool:
+        return str(raw).lower() == 'true'
+    try:
+        return setting.type(raw)
+    except (TypeError, ValueError):
+        return setting.default
+
+
+def _serialize(setting, value):
+    if setting.type is bool:
+        return 'true' if str(value).lower() in ('true', '1') else 'false'
+    return str(setting.type(value))
+
+
+def _read(conn):
+    keys = [s.key for s in REGISTRY.values()] + [VERSION_KEY]
+    rows = dict(conn.execute(
+        db.select(SystemSetting.key, SystemSetting.value).where(SystemSetting.key.in_(keys))
+    ).all())
+    return {name: _parse(s, rows.get(s.key)) for name, s in REGISTRY.items()}, rows.get(VERSION_KEY, '0')
+
+
+def reload():
+    """Re-reads every registered setting (one query, own connection)."""
+    global _values, _version
+    with db.engine.connect() as conn:
+        values, version = _read(conn)
+    with _lock:
+        _values, _version = values, version
+    return values
+
+
+def _ensure_loaded():
+    if _values is None:
+        reload()
+
+
+def get(name):
+    _ensure_loaded()
+    return _values[name]
+
+
+def snapshot():
+    """{public name: value} for every registered setting."""
+    _ensure_loaded()
+    return dict(_values)
+
+
+def maintenance_on():
+    """Hot path for the before_request gate: a dict lookup once loaded."""
+    values = _values
+    return values['maintenance'] if values is not None else get('maintenance')
+
+
+def save(changes):
+    """Writes {public name: value} (unknown names ignored), bumps the
+    version and notifies every process, then commits and reloads this one.
+    Returns the new snapshot."""
+    for name, value in changes.items():
+        setting = REGISTRY.get(name)
+        if setting is None or value is None:
+            continue
+        row = SystemSetting.query.filter_by(key=setting.key).first()
+        if row:
+            row.value = _serialize(setting, value)
+        else:
+            db.session.add(SystemSetting(key=setting.key, value=_serialize(setting, value)))
+    version = uuid.uuid4().hex[:16]
+    row = SystemSetting.query.filter_by(key=VERSION_KEY).first()
+    if row:
+        row.value = version
+    else:
+        db.session.add(SystemSetting(key=VERSION_KEY, value=version))
+    db.session.flush()
+    db.session.execute(text("SELECT pg_notify(:channel, :version)"), {"channel": NOTIFY_CHANNEL, "version": version})
+    db.session.commit()
+    return reload()
+
+
+# ==========================================
+# LISTENER
+# ==========================================
+
+def _listen(stop_event):
+    """Blocks on LISTEN until stop_event or a connection error. Every
+    notification - and every quiet SETTINGS_POLL_SECONDS, as a safety net
+    for one lost while reconnecting - triggers a reload if the version moved."""
+    raw = db.engine.raw_connection()
+    # Read before detaching - a detached fairy no longer exposes it
+    conn = raw.driver_connection
+    # A dedicated connection for the life of the thread, not a pool slot
+    raw.detach()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        reload()
+        while not stop_event.is_set():
+            ready, _, _ = select.select([conn], [], [], SETTINGS_POLL_SECONDS)
+            if ready:
+                conn.poll()
+                versions = [n.payload for n in conn.notifies]
+                conn.notifies.clear()
+                if versions and versions[-1] != _version:
+                    reload()
+            else:
+                reload()
+    finally:
+        conn.close()
+
+
+def _listener_loop(app, stop_event):
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                _listen(stop_event)
+        except Exception as e:
+            print(f"--- SETTINGS LISTENER ERROR: {e} (retrying) ---", file=sys.stderr, flush=True)
+            stop_event.wait(min(SETTINGS_POLL_SECONDS, 10))
+
+
+_listener = []
+_stop = threading.Event()
+
+
+def start_settings_listener(app):
+    """Starts this process's LISTEN thread (idempotent per process)."""
+    if _listener:
+        return
+    t = threading.Thread(target=_listener_loop, args=(app, _stop), name="settings-listener", daemon=True)
+    t.start()
+    _listener.append(t)
+
+
+def stop_settings_listener():
+    _stop.set()
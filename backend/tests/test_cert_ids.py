@@ -0,0 +1,33 @@
+from datetime import date, datetime
+
+import cert_ids
+
+# Signed certificate IDs across a CERT_SIGNING_KEY rotation. No database:
+# parse() checks the signature before any lookup.
+
+
+def test_issue_parse_roundtrip(monkeypatch):
+    monkeypatch.setattr(cert_ids, 'CERT_SIGNING_KEY', b'current')
+    cert_id = cert_ids.issue(1234, datetime(2026, 10, 17, 9, 30))
+    assert cert_ids.parse(cert_id) == (1234, date(2026, 10, 17))
+
+
+def test_old_key_still_verifies_after_rotation(monkeypatch):
+    monkeypatch.setattr(cert_ids, 'CERT_SIGNING_KEY', b'old')
+    old_id = cert_ids.issue(42, datetime(2025, 1, 1))
+
+    monkeypatch.setattr(cert_ids, 'CERT_SIGNING_KEY', b'new')
+    monkeypatch.setattr(cert_ids, 'CERT_SIGNING_OLD_KEYS', [])
+    assert cert_ids.parse(old_id) is None
+
+    monkeypatch.setattr(cert_ids, 'CERT_SIGNING_OLD_KEYS', [b'old'])
+    assert cert_ids.parse(old_id) == (42, date(2025, 1, 1))
+    # New IDs use the current key only
+    assert cert_ids.issue(42, datetime(2025, 1, 1)) != old_id
+
+
+def test_tampered_id_rejected(monkeypatch):
+    monkeypatch.setattr(cert_ids, 'CERT_SIGNING_KEY', b'current')
+    cert_id = cert_ids.issue(7, datetime(2026, 1, 1))
+    forged = cert_ids.issue(8, datetime(2026, 1, 1)).rsplit('-', 1)[0] + '-' + cert_id.rsplit('-', 1)[1]
+    assert cert_ids.parse(forged) is None
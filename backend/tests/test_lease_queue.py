@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from database import db
+from models import OutboundEmail
+import email_outbox
+from email_outbox import FakeTransport, enqueue_email, process_batch
+
+# The shared lease queue (lease_queue.py), driven through the email outbox:
+# a failed send goes back to pending with backoff, a due row is claimed and
+# delivered once, and a row still leased to another worker is left alone.
+
+
+def _row(dedup_key):
+    db.session.expire_all()
+    return OutboundEmail.query.filter_by(dedup_key=dedup_key).one()
+
+
+def _make_due(dedup_key):
+    db.session.execute(update(OutboundEmail).where(OutboundEmail.dedup_key == dedup_key)
+                       .values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def test_retry_then_deliver(pg, monkeypatch):
+    transport = FakeTransport()
+    monkeypatch.setattr(email_outbox, 'transport', transport)
+    assert enqueue_email('a@example.com', 'Hi', '<p>hi</p>', 'Test', 'test@example.com', dedup_key='lq-retry')
+    assert not enqueue_email('a@example.com', 'Hi', '<p>hi</p>', 'Test', 'test@example.com', dedup_key='lq-retry')
+
+    transport.fail_next = 1
+    assert process_batch() == 1
+    row = _row('lq-retry')
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert row.next_attempt_at > datetime.utcnow()
+    # Backed off, so not due yet
+    assert process_batch() == 0
+
+    _make_due('lq-retry')
+    assert process_batch() == 1
+    row = _row('lq-retry')
+    assert (row.status, row.attempts) == ('sent', 2)
+    assert [m['to'] for m in transport.sent] == ['a@example.com']
+
+
+def test_leased_row_is_skipped(pg, monkeypatch):
+    monkeypatch.setattr(email_outbox, 'transport', FakeTransport())
+    enqueue_email('b@example.com', 'Hi', '<p>hi</p>', 'Test', 'test@example.com', dedup_key='lq-leased')
+    # Claimed by a worker that is still within its lease
+    assert email_outbox._queue.claim()
+    assert process_batch() == 0
+
+    # The lease lapsed (that worker died) - the row is due again
+    _make_due('lq-leased')
+    assert process_batch() == 1
+    assert _row('lq-leased').status == 'sent'
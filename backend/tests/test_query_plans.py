@@ -0,0 +1,94 @@
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+import hot_queries
+
+# Query-plan regression test for migration c8e4a1f6d2b7 (hot-path indexes).
+# The tables are seeded past the size where Postgres prefers a sequential
+# scan, the migration's own index definitions are (re)applied, and each hot
+# query's EXPLAIN must not show a Seq Scan on the table it targets. The
+# queries are the ones app.py runs, built by hot_queries.py.
+
+SEED_ROWS = 20000
+
+_MIGRATION = os.path.join(os.path.dirname(__file__), '..', 'migrations', 'versions',
+                          'c8e4a1f6d2b7_add_hot_path_indexes.py')
+
+# (description, table that must not be seq scanned, Query builder)
+HOT_QUERIES = [
+    ("guest checkout replay check", 'enrollments',
+     lambda: hot_queries.checkout_enrollment('cs_test_12345').limit(1)),
+    ("reset-test-data enrollment cutoff", 'enrollments',
+     lambda: hot_queries.enrollments_before(datetime(2020, 1, 2))),
+    ("dashboard unread messages", 'contact_messages', hot_queries.unread_messages),
+    ("recent audit log", 'audit_logs', hot_queries.recent_audit_logs),
+    ("open refund reviews", 'flagged_payments',
+     lambda: hot_queries.flagged_payments(False, None, 100)),
+    ("open refund reviews, next page", 'flagged_payments',
+     lambda: hot_queries.flagged_payments(False, 5000, 100)),
+]
+
+
+def _migration_indexes():
+    spec = importlib.util.spec_from_file_location('hot_path_indexes', _MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.INDEXES
+
+
+def _seed(conn):
+    conn.execute(text("INSERT INTO courses (title, is_active, is_deleted) VALUES ('Plan Test', true, false)"))
+    conn.execute(text("""
+        INSERT INTO users (email, password, name, token_version, account_setup_complete, signup_source, created_at)
+        SELECT 'plan' || g || '@example.com', 'x', 'Plan ' || g, 0, true, 'signup',
+               timestamp '2020-01-01' + g * interval '1 hour'
+        FROM generate_series(1, :n) g
+    """), {"n": SEED_ROWS})
+    conn.execute(text("""
+        INSERT INTO enrollments (user_id, course_id, status, stripe_session_id, enrolled_at)
+        SELECT u.id, c.id, 'in-progress', 'cs_test_' || u.id, u.created_at
+        FROM users u CROSS JOIN courses c
+    """))
+    conn.execute(text("""
+        INSERT INTO contact_messages (name, email, subject, message, is_read, created_at)
+        SELECT 'n', 'e', 's', 'm', g % 100 <> 0, timestamp '2020-01-01' + g * interval '1 minute'
+        FROM generate_series(1, :n) g
+    """), {"n": SEED_ROWS})
+    conn.execute(text("""
+        INSERT INTO audit_logs (admin_email, action, details, timestamp)
+        SELECT 'admin@example.com', 'TEST', '', timestamp '2020-01-01' + g * interval '1 minute'
+        FROM generate_series(1, :n) g
+    """), {"n": SEED_ROWS})
+    conn.execute(text("""
+        INSERT INTO flagged_payments (user_id, course_id, resolved, created_at)
+        SELECT u.id, c.id, u.id % 100 <> 0, u.created_at
+        FROM users u CROSS JOIN courses c
+    """))
+
+
+@pytest.fixture(scope='module')
+def seeded(pg):
+    with pg.engine.begin() as conn:
+        # Apply exactly what the migration creates (replacing any same-named
+        # index create_all built from the model declarations)
+        for name, table, columns in _migration_indexes():
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({columns})"))
+        _seed(conn)
+    with pg.engine.begin() as conn:
+        for table in ('users', 'enrollments', 'contact_messages', 'audit_logs', 'flagged_payments'):
+            conn.execute(text(f"ANALYZE {table}"))
+    return pg
+
+
+@pytest.mark.parametrize('description,table,build', HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(seeded, description, table, build):
+    with seeded.engine.connect() as conn:
+        compiled = build().statement.compile(dialect=conn.dialect)
+        rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params)
+        plan = "\n".join(row[0] for row in rows)
+    assert f"Seq Scan on {table}" not in plan, f"{description} scans {table}:\n{plan}"
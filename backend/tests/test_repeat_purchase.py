@@ -0,0 +1,42 @@
+from sqlalchemy import func
+
+from database import db
+from enrollments import grant_courses
+from models import Course, DailyMetric, Payment, User
+from stripe_sessions import CheckoutSessionInfo, remember
+from auth import issue_token
+import daily_metrics
+
+# A logged-in user paying again for a course they already own adds no
+# enrollment, but the money was still taken - verify-payment has to commit
+# the ledger row and the revenue anyway.
+
+
+def test_repeat_purchase_is_booked(client):
+    user = User(email='repeat@example.com', password='x', name='Repeat', role='student')
+    course = Course(title='Owned Already', price=49.0)
+    db.session.add_all([user, course])
+    db.session.commit()
+    user_id, course_id = user.id, course.id
+    grant_courses(user_id, [course_id])
+    db.session.commit()
+
+    # Known-paid sessions are served from the local table, so no Stripe call
+    session_id = 'cs_test_repeat_purchase'
+    remember(CheckoutSessionInfo(session_id, 'paid', 'pi_test_repeat', amount_total=4900,
+                                 currency='usd', metadata={'course_id': str(course_id)}))
+
+    token = issue_token(user)
+    resp = client.post('/api/verify-payment', json={'session_id': session_id, 'course_id': course_id},
+                       headers={'Authorization': f'Bearer {token}'})
+    assert resp.status_code == 200
+    # Whatever the route left uncommitted is gone with its session
+    db.session.remove()
+
+    payment = db.session.query(Payment).filter_by(stripe_session_id=session_id).one()
+    assert payment.user_id == user_id
+    assert payment.amount_cents == 4900
+    assert payment.course_ids == []
+    revenue = db.session.query(func.sum(DailyMetric.revenue))\
+        .filter(DailyMetric.course_id == daily_metrics.SITE_WIDE).scalar()
+    assert revenue == 49.0
@@ -9,4 +9,34 @@ API.interceptors.request.use((req) => {
   }
   return req;
 });
-export default API;
\ No newline at end of file
+export default API;
+// POSTs to a streaming (Server-Sent Events) endpoint and calls onDelta with
+// each text chunk as it arrives. Resolves with the full reply text.
+export async function streamPost(path, body, onDelta) {
+  const headers = { 'Content-Type': 'application/json', Accept: 'text/event-stream' };
+  const token = localStorage.getItem('token');
+  if (token) headers.Authorization = `Bearer ${token}`;
+
+  const res = await fetch(`${API_BASE_URL}/api${path}?stream=1`, { method: 'POST', headers, body: JSON.stringify(body) });
+  if (!res.ok || !res.body) throw new Error(`Stream request failed (${res.status})`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let full = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const evt of events) {
+      if (!evt.startsWith('data: ')) continue;
+      const data = JSON.parse(evt.slice(6));
+      if (data.error) throw new Error(data.error);
+      if (data.delta) { full += data.delta; onDelta(data.delta); }
+      if (data.done) return data.content ?? full;
+    }
+  }
+  return full;
+}
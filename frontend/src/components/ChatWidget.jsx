@@ -1,8 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
-import axios from 'axios';
 import { MessageSquare, X, Send, Loader2 } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
-import API_BASE_URL from '../config';
+import { streamPost } from '../api';
 
 const ChatWidget = () => {
   const [isOpen, setIsOpen] = useState(false);
@@ -29,9 +28,18 @@ const ChatWidget = () => {
     setLoading(true);
 
     try {
-      const res = await axios.post(`${API_BASE_URL}/api/chat`, { message: userMsg.text });
-      const botMsg = { role: 'bot', text: res.data.reply };
-      setMessages(prev => [...prev, botMsg]);
+      // Reply streams in: the bot bubble is added on the first chunk and
+      // grows as the rest arrive.
+      let started = false;
+      await streamPost('/chat', { message: userMsg.text }, (delta) => {
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setMessages(prev => [...prev, { role: 'bot', text: delta }]);
+        } else {
+          setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], text: prev[prev.length - 1].text + delta }]);
+        }
+      });
     } catch (error) {
       console.error("Chat error:", error);
       setMessages(prev => [...prev, { 
@@ -2,8 +2,9 @@ import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { Mic, MicOff, Send, Loader2, RefreshCcw, Award, User, Bot, ArrowRight, ArrowLeft } from 'lucide-react';
 import API_BASE_URL from '../config';
+import { streamPost } from '../api';
 
-const RoleplayLesson = ({ lesson, onComplete, onNext, onPrevious }) => {
+const RoleplayLesson = ({ lesson, courseId, moduleIndex, lessonIndex, onComplete, onNext, onPrevious }) => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
@@ -13,15 +14,28 @@ const RoleplayLesson = ({ lesson, onComplete, onNext, onPrevious }) => {
   
   const messagesEndRef = useRef(null);
   const recognitionRef = useRef(null);
+  // Server-side session for this attempt: the server keeps the transcript,
+  // so each turn uploads only the new message. Null means the session
+  // couldn't be started - fall back to posting the whole history.
+  const sessionIdRef = useRef(null);
 
   // --- FIX FOR RETRY BUG ---
-  const initializeChat = () => {
+  const initializeChat = async () => {
     const initialMsg = lesson.initial_message 
       ? [{ role: 'assistant', content: lesson.initial_message }] 
       : [];
     setMessages(initialMsg);
     setFeedback(null);
     setInput('');
+    sessionIdRef.current = null;
+    try {
+      const token = localStorage.getItem('token');
+      const res = await axios.post(`${API_BASE_URL}/api/roleplay/sessions`, {
+        course_id: Number(courseId), module_index: moduleIndex, lesson_index: lessonIndex
+      }, { headers: { Authorization: `Bearer ${token}` } });
+      sessionIdRef.current = res.data.session_id;
+      setMessages(res.data.messages);
+    } catch (error) { console.error("Roleplay session start failed:", error); }
   };
 
   useEffect(() => {
@@ -62,11 +76,19 @@ const RoleplayLesson = ({ lesson, onComplete, onNext, onPrevious }) => {
     setInput('');
     setLoading(true);
     try {
-      const token = localStorage.getItem('token');
-      const res = await axios.post(`${API_BASE_URL}/api/roleplay/chat`, {
-        messages: newHistory, persona: lesson.persona
-      }, { headers: { Authorization: `Bearer ${token}` } });
-      setMessages(prev => [...prev, res.data]);
+      let started = false;
+      const body = sessionIdRef.current
+        ? { session_id: sessionIdRef.current, message: userMsg.content }
+        : { messages: newHistory, persona: lesson.persona };
+      await streamPost('/roleplay/chat', body, (delta) => {
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setMessages(prev => [...prev, { role: 'assistant', content: delta }]);
+        } else {
+          setMessages(prev => [...prev.slice(0, -1), { role: 'assistant', content: prev[prev.length - 1].content + delta }]);
+        }
+      });
     } catch (error) { console.error("Error", error); }
     finally { setLoading(false); }
   };
@@ -76,7 +98,7 @@ const RoleplayLesson = ({ lesson, onComplete, onNext, onPrevious }) => {
     try {
       const token = localStorage.getItem('token');
       const res = await axios.post(`${API_BASE_URL}/api/roleplay/feedback`, {
-        messages: messages, objectives: lesson.objectives
+        ...(sessionIdRef.current ? { session_id: sessionIdRef.current } : { messages: messages, objectives: lesson.objectives })
       }, { headers: { Authorization: `Bearer ${token}` } });
       
       let result;
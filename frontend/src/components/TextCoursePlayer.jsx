@@ -1,10 +1,14 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { ChevronLeft, CheckCircle, PlayCircle, FileText, Menu, BookOpen, Award, MessageSquare } from 'lucide-react';
 import API_BASE_URL from '../config';
 import RoleplayLesson from './RoleplayLesson'; // <--- IMPORTED HERE
 
+// Lesson-navigation saves are held this long and sent as one batch (only the
+// latest position per course survives); completions are sent immediately.
+const PROGRESS_FLUSH_MS = 3000;
+
 const TextCoursePlayer = () => {
   const { id } = useParams();
   const navigate = useNavigate();
@@ -37,19 +41,51 @@ const TextCoursePlayer = () => {
   // to 'in-progress' - that would silently invalidate an earned certificate.
   const [alreadyCompleted, setAlreadyCompleted] = useState(false);
 
+  // Navigation saves waiting for the next batch flush
+  const pendingProgressRef = useRef([]);
+  const flushTimerRef = useRef(null);
+
   useEffect(() => {
     fetchCourseAndProgress();
   }, [id]);
 
+  const flushProgress = (keepalive = false) => {
+    clearTimeout(flushTimerRef.current);
+    flushTimerRef.current = null;
+    const events = pendingProgressRef.current;
+    if (events.length === 0) return;
+    pendingProgressRef.current = [];
+    // fetch rather than axios so keepalive can outlive a closing tab
+    fetch(`${API_BASE_URL}/api/progress/batch`, {
+      method: 'POST',
+      keepalive,
+      headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${localStorage.getItem('token')}` },
+      body: JSON.stringify({ events })
+    }).catch(error => console.error("Save failed:", error));
+  };
+
+  // Don't lose the last position when the learner leaves or hides the tab
+  useEffect(() => {
+    const onPageHide = () => flushProgress(true);
+    const onVisibility = () => { if (document.visibilityState === 'hidden') flushProgress(true); };
+    window.addEventListener('pagehide', onPageHide);
+    document.addEventListener('visibilitychange', onVisibility);
+    return () => {
+      window.removeEventListener('pagehide', onPageHide);
+      document.removeEventListener('visibilitychange', onVisibility);
+      flushProgress(true);
+    };
+  }, []);
+
   const fetchCourseAndProgress = async () => {
     try {
       const token = localStorage.getItem('token');
       
-      const response = await axios.get(`${API_BASE_URL}/api/courses`, {
+      const response = await axios.get(`${API_BASE_URL}/api/courses/${id}/curriculum`, {
         headers: { Authorization: `Bearer ${token}` }
-      });
+      }).catch(() => ({ data: null }));
       
-      const foundCourse = response.data.find(c => c.id === parseInt(id));
+      const foundCourse = response.data;
       
       if (foundCourse) {
         setCourse(foundCourse);
@@ -95,14 +131,26 @@ const TextCoursePlayer = () => {
         if (progressPercent > 90) progressPercent = 90;
       }
 
-      await axios.post(`${API_BASE_URL}/api/update-progress`, {
+      const event = {
         course_id: course.id,
         progress: progressPercent,
         status: status,
         score: quizScore,
         module_idx: modIdx,
         lesson_idx: lesIdx
-      }, {
+      };
+
+      if (status !== 'completed') {
+        pendingProgressRef.current = [...pendingProgressRef.current.filter(e => e.course_id !== course.id), event];
+        clearTimeout(flushTimerRef.current);
+        flushTimerRef.current = setTimeout(() => flushProgress(), PROGRESS_FLUSH_MS);
+        return;
+      }
+
+      // The completion carries the position too, so a queued navigation
+      // save for this course is superseded rather than sent after it
+      pendingProgressRef.current = pendingProgressRef.current.filter(e => e.course_id !== course.id);
+      await axios.post(`${API_BASE_URL}/api/update-progress`, event, {
         headers: { Authorization: `Bearer ${token}` }
       });
     } catch (error) {
@@ -326,6 +374,9 @@ const TextCoursePlayer = () => {
                   {currentLesson.type === 'roleplay' && (
                     <RoleplayLesson 
                       lesson={currentLesson} 
+                      courseId={id}
+                      moduleIndex={activeModuleIndex}
+                      lessonIndex={activeLessonIndex}
                       onNext={goToNextLesson} 
                       onPrevious={goToPrevLesson}
                       onComplete={(score) => {
@@ -50,10 +50,15 @@ const AdminDashboard = () => {
   const [flaggedPayments, setFlaggedPayments] = useState([]);
   const [stats, setStats] = useState({ revenue: 0, students: 0, courses: 0, uptime: "99.9%", chart_data: [], recent_messages: [] });
   const [transactions, setTransactions] = useState([]);
+  const [transactionsCursor, setTransactionsCursor] = useState(null);
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [flaggedCursor, setFlaggedCursor] = useState(null);
+  const [userSearch, setUserSearch] = useState('');
   const [messages, setMessages] = useState([]);
   const [logs, setLogs] = useState([]);
   const [settings, setSettings] = useState({ maintenance: false, registrations: true });
   const [analytics, setAnalytics] = useState(null);
+  const [analyticsDays, setAnalyticsDays] = useState(30);
   const [resetDate, setResetDate] = useState('');
   const [resetLoading, setResetLoading] = useState(false);
   const [systemHealth, setSystemHealth] = useState(null);
@@ -65,7 +70,7 @@ const AdminDashboard = () => {
   
   // --- MODAL STATES ---
   const [isModalOpen, setIsModalOpen] = useState(false);
-  const [newCourse, setNewCourse] = useState({ title: '', description: '', price: 29, category: 'HR', modules: [] });
+  const [newCourse, setNewCourse] = useState({ title: '', description: '', price: 29, category: 'HR', stripe_price_id: '', modules: [] });
   const [isEditModalOpen, setIsEditModalOpen] = useState(false);
   const [editingCourse, setEditingCourse] = useState(null);
   const [isBanModalOpen, setIsBanModalOpen] = useState(false);
@@ -98,24 +103,18 @@ const AdminDashboard = () => {
             if (activeTab === 'overview') { 
               const s = await axios.get(`${API_BASE_URL}/api/admin/stats`, { headers: { Authorization: `Bearer ${token}` } });
               setStats(s.data);
-              const u = await axios.get(`${API_BASE_URL}/api/users?type=active`, { headers: { Authorization: `Bearer ${token}` } });
-              setUsers(u.data);
             }
             else if (activeTab === 'courses') { 
               const r = await axios.get(`${API_BASE_URL}/api/courses`, { headers: { Authorization: `Bearer ${token}` } });
               setCourses(r.data);
             }
-            else if (activeTab === 'users') { 
-              const r = await axios.get(`${API_BASE_URL}/api/users?type=active`, { headers: { Authorization: `Bearer ${token}` } });
-              setUsers(r.data);
-            }
-            else if (activeTab === 'deleted_users') { 
-              const r = await axios.get(`${API_BASE_URL}/api/users?type=deleted`, { headers: { Authorization: `Bearer ${token}` } });
-              setUsers(r.data);
+            else if (activeTab === 'users' || activeTab === 'deleted_users') { 
+              await reloadUsers(token);
             }
             else if (activeTab === 'revenue') { 
               const r = await axios.get(`${API_BASE_URL}/api/admin/transactions`, { headers: { Authorization: `Bearer ${token}` } });
               setTransactions(r.data);
+              setTransactionsCursor(r.headers['x-next-after-id'] || null);
             }
             else if (activeTab === 'support') { 
               const r = await axios.get(`${API_BASE_URL}/api/admin/messages`, { headers: { Authorization: `Bearer ${token}` } });
@@ -130,12 +129,11 @@ const AdminDashboard = () => {
               setSettings(r.data); 
             }
             else if (activeTab === 'analytics') {
-              const r = await axios.get(`${API_BASE_URL}/api/admin/analytics`, { headers: { Authorization: `Bearer ${token}` } });
+              const r = await axios.get(`${API_BASE_URL}/api/admin/analytics?days=${analyticsDays}`, { headers: { Authorization: `Bearer ${token}` } });
               setAnalytics(r.data);
             }
             else if (activeTab === 'flagged') {
-              const r = await axios.get(`${API_BASE_URL}/api/flagged-payments`, { headers: { Authorization: `Bearer ${token}` } });
-              setFlaggedPayments(r.data);
+              await reloadFlagged(token);
             }
             else if (activeTab === 'system') {
               const r = await axios.get(`${API_BASE_URL}/api/admin/system-health`, { headers: { Authorization: `Bearer ${token}` } });
@@ -148,18 +146,14 @@ const AdminDashboard = () => {
     } else {
         navigate('/login');
     }
-  }, [activeTab, navigate]);
+  }, [activeTab, analyticsDays, navigate]);
 
-  // Seed the chart when systemHealth first loads
+  // The chart shows the server's own sample history (last 20 samples)
   useEffect(() => {
-    if (systemHealth && systemHealth.cpu_percent !== undefined) {
-      setServerLoadHistory(prev => {
-        // Only seed if all zeros (first load)
-        if (prev.every(p => p.load === 0)) {
-          return prev.map((p, i) => ({ ...p, load: i === 19 ? systemHealth.cpu_percent : 0 }));
-        }
-        return prev;
-      });
+    if (systemHealth && systemHealth.history) {
+      const recent = systemHealth.history.slice(-20).map(h => ({ time: h.timestamp, load: h.cpu_percent }));
+      const padding = [...Array(20 - recent.length)].map((_, i) => ({ time: i, load: 0 }));
+      setServerLoadHistory([...padding, ...recent]);
     }
   }, [systemHealth]);
   const [serverLoadHistory, setServerLoadHistory] = useState(
@@ -172,10 +166,6 @@ const AdminDashboard = () => {
       try {
         const r = await axios.get(`${API_BASE_URL}/api/admin/system-health`, { headers: { Authorization: `Bearer ${token}` } });
         setSystemHealth(r.data);
-        setServerLoadHistory(prev => {
-          const next = [...prev.slice(1), { time: Date.now(), load: r.data.cpu_percent }];
-          return next;
-        });
       } catch(e) { console.error("Health refresh error:", e); }
     };
     const interval = setInterval(refresh, 10000);
@@ -196,7 +186,7 @@ const AdminDashboard = () => {
         data: { cutoff_date: resetDate }
       });
       alert(`Done! Deleted ${r.data.deleted_enrollments} test enrollments and ${r.data.deleted_users} test users.`);
-      const s = await axios.get(`${API_BASE_URL}/api/admin/analytics`, { headers: { Authorization: `Bearer ${t}` } });
+      const s = await axios.get(`${API_BASE_URL}/api/admin/analytics?days=${analyticsDays}`, { headers: { Authorization: `Bearer ${t}` } });
       setAnalytics(s.data);
     } catch(e) { console.error("Reset failed:", e); alert("Failed to reset test data. Please try again."); }
     finally { setResetLoading(false); }
@@ -221,8 +211,7 @@ const AdminDashboard = () => {
     try {
       const t = localStorage.getItem('token');
       await axios.put(`${API_BASE_URL}/api/users/${user.id}/role`, { is_admin: user.role !== 'Admin' }, { headers: { Authorization: `Bearer ${t}` } });
-      const r = await axios.get(`${API_BASE_URL}/api/users?type=active`, { headers: { Authorization: `Bearer ${t}` } });
-      setUsers(r.data);
+      await reloadUsers(t);
     } catch (e) { console.error("Role change failed:", e); alert("Failed to update role. Please try again."); }
   };
   const openBanModal = (user) => { setSelectedUser(user); setBanDuration(30); setIsBanModalOpen(true); };
@@ -231,16 +220,14 @@ const AdminDashboard = () => {
       const t = localStorage.getItem('token');
       await axios.post(`${API_BASE_URL}/api/users/${selectedUser.id}/ban`, { days: banDuration }, { headers: { Authorization: `Bearer ${t}` } });
       setIsBanModalOpen(false);
-      const r = await axios.get(`${API_BASE_URL}/api/users?type=active`, { headers: { Authorization: `Bearer ${t}` } });
-      setUsers(r.data);
+      await reloadUsers(t);
     } catch (e) { console.error("Ban failed:", e); alert("Failed to ban user. Please try again."); }
   };
   const handleUnban = async (user) => {
     try {
       const t = localStorage.getItem('token');
       await axios.post(`${API_BASE_URL}/api/users/${user.id}/ban`, { days: 0 }, { headers: { Authorization: `Bearer ${t}` } });
-      const r = await axios.get(`${API_BASE_URL}/api/users?type=active`, { headers: { Authorization: `Bearer ${t}` } });
-      setUsers(r.data);
+      await reloadUsers(t);
     } catch (e) { console.error("Unban failed:", e); alert("Failed to unban user. Please try again."); }
   };
   const handleDeleteUser = async (user) => {
@@ -248,18 +235,16 @@ const AdminDashboard = () => {
     try {
       const t = localStorage.getItem('token');
       await axios.delete(`${API_BASE_URL}/api/users/${user.id}/delete`, { headers: { Authorization: `Bearer ${t}` } });
-      const r = await axios.get(`${API_BASE_URL}/api/users?type=active`, { headers: { Authorization: `Bearer ${t}` } });
-      setUsers(r.data);
+      await reloadUsers(t);
     } catch (e) { console.error("Delete failed:", e); alert("Failed to delete user. Please try again."); }
   };
-  const handleRestoreUser = async (user) => { if(!window.confirm(`Restore ${user.name}? They will regain access to their account.`)) return; try { const t=localStorage.getItem('token'); await axios.post(`${API_BASE_URL}/api/users/${user.id}/restore`, {}, { headers: { Authorization: `Bearer ${t}` } }); const r=await axios.get(`${API_BASE_URL}/api/users?type=deleted`, { headers: { Authorization: `Bearer ${t}` } }); setUsers(r.data); } catch(e) { console.error("Restore failed:", e); alert("Failed to restore user. Please try again."); } };
+  const handleRestoreUser = async (user) => { if(!window.confirm(`Restore ${user.name}? They will regain access to their account.`)) return; try { const t=localStorage.getItem('token'); await axios.post(`${API_BASE_URL}/api/users/${user.id}/restore`, {}, { headers: { Authorization: `Bearer ${t}` } }); await reloadUsers(t); } catch(e) { console.error("Restore failed:", e); alert("Failed to restore user. Please try again."); } };
   const handleResolveFlag = async (flag) => {
     if (!window.confirm(`Mark this as resolved? Only do this after refunding ${flag.user_name} manually in Stripe Dashboard.`)) return;
     try {
       const t = localStorage.getItem('token');
       await axios.post(`${API_BASE_URL}/api/flagged-payments/${flag.id}/resolve`, {}, { headers: { Authorization: `Bearer ${t}` } });
-      const r = await axios.get(`${API_BASE_URL}/api/flagged-payments`, { headers: { Authorization: `Bearer ${t}` } });
-      setFlaggedPayments(r.data);
+      await reloadFlagged(t);
     } catch (e) { console.error("Resolve failed:", e); alert("Failed to mark as resolved. Please try again."); }
   };
   const openGrantAccessModal = (user) => { setSelectedUser(user); setGrantAccessCourseId(''); setIsGrantAccessModalOpen(true); };
@@ -311,10 +296,63 @@ const AdminDashboard = () => {
   const initiateCloseTicket = (id) => { setMessageToClose(id); setIsCloseTicketModalOpen(true); };
   const confirmCloseTicket = async () => { const t=localStorage.getItem('token'); await axios.put(`${API_BASE_URL}/api/admin/messages/${messageToClose}/read`, {}, { headers: { Authorization: `Bearer ${t}` } }); setMessages(prev => prev.filter(msg => msg.id !== messageToClose)); setIsCloseTicketModalOpen(false); };
 
+  // Server-side search + keyset paging: the first page is replaced, "Load
+  // more" appends the next one using the cursor from the response header.
+  const usersQuery = (after) => {
+    const params = new URLSearchParams({ type: activeTab === 'deleted_users' ? 'deleted' : 'active' });
+    if (userSearch.trim()) params.set('q', userSearch.trim());
+    if (after) params.set('after_id', after);
+    return `${API_BASE_URL}/api/users?${params.toString()}`;
+  };
+
+  const reloadUsers = async (t) => {
+    const r = await axios.get(usersQuery(null), { headers: { Authorization: `Bearer ${t}` } });
+    setUsers(r.data);
+    setUsersCursor(r.headers['x-next-after-id'] || null);
+  };
+
+  const loadMoreUsers = async () => {
+    try {
+      const t = localStorage.getItem('token');
+      const r = await axios.get(usersQuery(usersCursor), { headers: { Authorization: `Bearer ${t}` } });
+      setUsers(prev => [...prev, ...r.data]);
+      setUsersCursor(r.headers['x-next-after-id'] || null);
+    } catch(e) { console.error("Load more failed:", e); }
+  };
+
+  const handleUserSearch = async (e) => {
+    e.preventDefault();
+    try { await reloadUsers(localStorage.getItem('token')); } catch(err) { console.error("User search failed:", err); }
+  };
+
+  const loadMoreTransactions = async () => {
+    try {
+      const t = localStorage.getItem('token');
+      const r = await axios.get(`${API_BASE_URL}/api/admin/transactions?after_id=${transactionsCursor}`, { headers: { Authorization: `Bearer ${t}` } });
+      setTransactions(prev => [...prev, ...r.data]);
+      setTransactionsCursor(r.headers['x-next-after-id'] || null);
+    } catch(e) { console.error("Load more failed:", e); }
+  };
+
+  const reloadFlagged = async (t) => {
+    const r = await axios.get(`${API_BASE_URL}/api/flagged-payments`, { headers: { Authorization: `Bearer ${t}` } });
+    setFlaggedPayments(r.data);
+    setFlaggedCursor(r.headers['x-next-after-id'] || null);
+  };
+
+  const loadMoreFlagged = async () => {
+    try {
+      const t = localStorage.getItem('token');
+      const r = await axios.get(`${API_BASE_URL}/api/flagged-payments?after_id=${flaggedCursor}`, { headers: { Authorization: `Bearer ${t}` } });
+      setFlaggedPayments(prev => [...prev, ...r.data]);
+      setFlaggedCursor(r.headers['x-next-after-id'] || null);
+    } catch(e) { console.error("Load more failed:", e); }
+  };
+
   const handleExportCSV = () => {
     if (transactions.length === 0) return alert("No data");
-    const headers = ["User,Email,Course,Date,Status"];
-    const rows = transactions.map(tx => `${tx.user},${tx.email},"${tx.course}",${tx.date},Paid`);
+    const headers = ["User,Email,Course,Amount,Currency,Date,Status"];
+    const rows = transactions.map(tx => `${tx.user},${tx.email},"${tx.course}",${tx.amount},${tx.currency},${tx.date},Paid`);
     const csvContent = [headers, ...rows].join("\n");
     const blob = new Blob([csvContent], { type: "text/csv;charset=utf-8;" });
     const link = document.createElement("a");
@@ -328,7 +366,7 @@ const AdminDashboard = () => {
   const handleModuleTitleChange = (i, v, isEdit) => { const t = isEdit ? editingCourse : newCourse; const u = [...t.modules]; u[i].title = v; isEdit ? setEditingCourse({...t, modules: u}) : setNewCourse({...t, modules: u}); };
   const handleLessonTitleChange = (mIdx, lIdx, v, isEdit) => { const t = isEdit ? editingCourse : newCourse; const u = [...t.modules]; u[mIdx].lessons[lIdx].title = v; isEdit ? setEditingCourse({...t, modules: u}) : setNewCourse({...t, modules: u}); };
   
-  const handleOpenModal = () => { setNewCourse({ title: '', description: '', price: 29, category: 'HR', modules: [] }); setIsModalOpen(true); };
+  const handleOpenModal = () => { setNewCourse({ title: '', description: '', price: 29, category: 'HR', stripe_price_id: '', modules: [] }); setIsModalOpen(true); };
   
   // --- JSON UPLOAD LOGIC ---
   const handleJsonUpload = (e) => { 
@@ -489,6 +527,12 @@ const AdminDashboard = () => {
                     <div className="w-full flex justify-between items-center md:block">
                         <h3 className="font-bold text-lg text-gray-900 capitalize">{activeTab.replace('_', ' ')}</h3>
                     </div>
+                    {(activeTab === 'users' || activeTab === 'deleted_users') && (
+                        <form onSubmit={handleUserSearch} className="relative w-full md:w-64">
+                            <Search className="absolute left-3 top-1/2 -translate-y-1/2 text-gray-400" size={18} />
+                            <input type="text" value={userSearch} onChange={(e) => setUserSearch(e.target.value)} placeholder="Search name or email..." className="w-full pl-10 pr-4 py-2.5 bg-white border border-gray-200 rounded-lg text-gray-900 focus:outline-none focus:border-red-500 transition" />
+                        </form>
+                    )}
                     {activeTab === 'courses' && (
                         <div className="flex flex-col md:flex-row gap-3 w-full md:w-auto">
                             <div className="relative w-full md:w-64">
@@ -507,7 +551,7 @@ const AdminDashboard = () => {
                             <tr>
                                 {activeTab === 'courses' && <><th className="px-6 py-4">Title</th><th className="px-6 py-4">Price</th><th className="px-6 py-4">Category</th><th className="px-6 py-4">Modules</th><th className="px-6 py-4 text-right">Actions</th></>}
                                 {(activeTab === 'users' || activeTab === 'deleted_users') && <><th className="px-6 py-4">User</th><th className="px-6 py-4">Role</th><th className="px-6 py-4">Status</th><th className="px-6 py-4 text-right">Actions</th></>}
-                                {activeTab === 'revenue' && <><th className="px-6 py-4">User</th><th className="px-6 py-4">Course</th><th className="px-6 py-4">Date</th><th className="px-6 py-4">Status</th></>}
+                                {activeTab === 'revenue' && <><th className="px-6 py-4">User</th><th className="px-6 py-4">Course</th><th className="px-6 py-4">Amount</th><th className="px-6 py-4">Date</th><th className="px-6 py-4">Status</th></>}
                                 {activeTab === 'audit' && <><th className="px-6 py-4">Action</th><th className="px-6 py-4">Admin</th><th className="px-6 py-4">Details</th><th className="px-6 py-4">Time</th></>}
                                 {activeTab === 'flagged' && <><th className="px-6 py-4">Customer</th><th className="px-6 py-4">Course</th><th className="px-6 py-4">Flagged</th><th className="px-6 py-4">Status</th><th className="px-6 py-4 text-right">Actions</th></>}
                             </tr>
@@ -516,13 +560,28 @@ const AdminDashboard = () => {
                             {activeTab === 'courses' && courses.map(c => (<tr key={c.id} className="hover:bg-gray-50 transition"><td className="px-6 py-4 font-bold text-gray-900">{c.title}</td><td className="px-6 py-4 text-green-600 font-bold">${c.price}</td><td className="px-6 py-4"><span className="bg-gray-100 text-gray-600 px-2 py-1 rounded text-xs border border-gray-200">{c.category}</span></td><td className="px-6 py-4 text-gray-500">{c.modules?.length}</td><td className="px-6 py-4 text-right flex justify-end gap-2"><button onClick={()=>{setEditingCourse(c);setIsEditModalOpen(true)}} title="Edit Course" className="text-blue-600 bg-blue-50 p-2 rounded hover:bg-blue-100"><Edit size={18}/></button><button onClick={()=>handleDeleteCourse(c.id)} title="Delete Course" className="text-red-600 bg-red-50 p-2 rounded hover:bg-red-100"><Archive size={18}/></button></td></tr>))}
                             {activeTab === 'users' && users.map(u => (<tr key={u.id} className="hover:bg-gray-50 transition"><td className="px-6 py-4"><div className="font-bold text-gray-900 flex items-center gap-2">{u.name}{!u.account_setup_complete && <span className="px-2 py-0.5 rounded text-xs font-bold bg-yellow-100 text-yellow-700 border border-yellow-200">Guest</span>}</div><div className="text-xs text-gray-500">{u.email}</div>{u.signup_source === 'guest_checkout' && <div className="text-xs text-gray-400 mt-0.5">Origin: Guest Checkout</div>}</td><td className="px-6 py-4"><span className={`px-2 py-1 rounded text-xs font-bold border ${u.role === 'Admin' ? 'bg-purple-100 border-purple-200 text-purple-700' : 'bg-blue-50 border-blue-200 text-blue-700'}`}>{u.role}</span></td><td className="px-6 py-4">{u.status === 'Banned' ? <span className="text-red-600 font-bold">Banned</span> : <span className="text-green-600 font-bold">Active</span>}</td><td className="px-6 py-4 text-right flex justify-end gap-2"><button onClick={()=>openGrantAccessModal(u)} title="Grant Course Access" className="p-2 bg-green-50 text-green-600 rounded hover:bg-green-100"><Unlock size={18}/></button><button onClick={()=>handleSendReset(u)} title="Send Password Reset" className="p-2 bg-blue-50 text-blue-600 rounded hover:bg-blue-100"><KeyRound size={18}/></button><button onClick={()=>handleToggleAdmin(u)} title={u.role === 'Admin' ? "Demote" : "Promote"} className="p-2 bg-purple-50 text-purple-600 rounded hover:bg-purple-100"><Shield size={18}/></button><button onClick={()=>u.status==='Banned'?handleUnban(u):openBanModal(u)} title={u.status === 'Banned' ? "Unban" : "Ban"} className="p-2 bg-orange-50 text-orange-600 rounded hover:bg-orange-100"><Ban size={18}/></button><button onClick={()=>handleDeleteUser(u)} title="Delete User" className="p-2 bg-red-50 text-red-600 rounded hover:bg-red-100"><Trash2 size={18}/></button></td></tr>))}
                             {activeTab === 'deleted_users' && users.map(u => (<tr key={u.id} className="hover:bg-gray-50 transition"><td className="px-6 py-4"><div className="font-bold text-gray-900">{u.name}</div><div className="text-xs text-gray-500">{u.email}</div></td><td className="px-6 py-4"><span className={`px-2 py-1 rounded text-xs font-bold border ${u.role === 'Admin' ? 'bg-purple-100 border-purple-200 text-purple-700' : 'bg-blue-50 border-blue-200 text-blue-700'}`}>{u.role}</span></td><td className="px-6 py-4"><span className="text-red-500 font-bold">Deleted</span></td><td className="px-6 py-4 text-right flex justify-end gap-2"><button onClick={()=>handleRestoreUser(u)} title="Restore User" className="p-2 bg-green-50 text-green-600 rounded hover:bg-green-100"><RefreshCcw size={18}/></button></td></tr>))}
-                            {activeTab === 'revenue' && transactions.map((t,i) => (<tr key={i} className="hover:bg-gray-50 transition"><td className="px-6 py-4 font-bold text-gray-900">{t.user}</td><td className="px-6 py-4 text-gray-700">{t.course}</td><td className="px-6 py-4 text-gray-500">{t.date}</td><td className="px-6 py-4 text-green-700 font-bold">Paid</td></tr>))}
+                            {activeTab === 'revenue' && transactions.map((t,i) => (<tr key={i} className="hover:bg-gray-50 transition"><td className="px-6 py-4 font-bold text-gray-900">{t.user}</td><td className="px-6 py-4 text-gray-700">{t.course}</td><td className="px-6 py-4 text-green-600 font-bold">${t.amount}</td><td className="px-6 py-4 text-gray-500">{t.date}</td><td className="px-6 py-4 text-green-700 font-bold">Paid</td></tr>))}
                             {activeTab === 'audit' && logs.map((l,i) => (<tr key={i} className="hover:bg-gray-50 transition"><td className="px-6 py-4 font-bold text-gray-900">{l.action}</td><td className="px-6 py-4 text-gray-500">{l.admin}</td><td className="px-6 py-4 italic text-gray-600">{l.details}</td><td className="px-6 py-4 text-gray-500">{l.date}</td></tr>))}
                             {activeTab === 'flagged' && flaggedPayments.length === 0 && (<tr><td colSpan="5" className="px-6 py-10 text-center text-gray-400">No flagged payments — nothing needs review.</td></tr>)}
                             {activeTab === 'flagged' && flaggedPayments.map(f => (<tr key={f.id} className="hover:bg-gray-50 transition"><td className="px-6 py-4"><div className="font-bold text-gray-900">{f.user_name}</div><div className="text-xs text-gray-500">{f.user_email}</div></td><td className="px-6 py-4 text-gray-700">{f.course_title}</td><td className="px-6 py-4 text-gray-500 text-xs">{f.created_at}</td><td className="px-6 py-4">{f.resolved ? <span className="text-green-600 font-bold">Resolved</span> : <span className="text-yellow-600 font-bold">Needs Review</span>}</td><td className="px-6 py-4 text-right">{!f.resolved && <button onClick={()=>handleResolveFlag(f)} className="px-3 py-1.5 bg-green-50 text-green-700 border border-green-200 rounded text-xs font-bold hover:bg-green-100">Mark Resolved</button>}</td></tr>))}
                         </tbody>
                     </table>
                 </div>
+                {(activeTab === 'users' || activeTab === 'deleted_users') && usersCursor && (
+                    <div className="p-4 border-t border-gray-200 text-center">
+                        <button onClick={loadMoreUsers} className="px-4 py-2 border border-gray-300 rounded-lg text-sm font-bold text-gray-600 hover:bg-gray-100">Load more</button>
+                    </div>
+                )}
+                {activeTab === 'revenue' && transactionsCursor && (
+                    <div className="p-4 border-t border-gray-200 text-center">
+                        <button onClick={loadMoreTransactions} className="px-4 py-2 border border-gray-300 rounded-lg text-sm font-bold text-gray-600 hover:bg-gray-100">Load more</button>
+                    </div>
+                )}
+                {activeTab === 'flagged' && flaggedCursor && (
+                    <div className="p-4 border-t border-gray-200 text-center">
+                        <button onClick={loadMoreFlagged} className="px-4 py-2 border border-gray-300 rounded-lg text-sm font-bold text-gray-600 hover:bg-gray-100">Load more</button>
+                    </div>
+                )}
             </div>
         )}
 
@@ -579,6 +638,10 @@ const AdminDashboard = () => {
                                 <span className="text-gray-700 font-medium">DB Response Time</span>
                                 <span className={`text-sm font-bold font-mono ${systemHealth.db_response_ms < 50 ? 'text-green-600' : systemHealth.db_response_ms < 200 ? 'text-yellow-600' : 'text-red-600'}`}>{systemHealth.db_response_ms}ms</span>
                             </div>
+                            <div className="flex justify-between items-center p-4 bg-gray-50 rounded-lg border border-gray-200">
+                                <span className="text-gray-700 font-medium">API Latency (avg / p95)</span>
+                                <span className="text-sm font-bold font-mono text-gray-700">{systemHealth.api_response_ms ?? '-'}ms / {systemHealth.api_p95_ms ?? '-'}ms</span>
+                            </div>
                             <div className="flex justify-between items-center p-4 bg-gray-50 rounded-lg border border-gray-200">
                                 <span className="text-gray-700 font-medium">Stripe Integration</span>
                                 {systemHealth.stripe_active
@@ -694,6 +757,11 @@ const AdminDashboard = () => {
         {/* --- ANALYTICS TAB --- */}
         {activeTab === 'analytics' && (
           <div className="space-y-6">
+            <div className="flex justify-end">
+              <select value={analyticsDays} onChange={e => setAnalyticsDays(parseInt(e.target.value))} className="bg-white border border-gray-300 rounded-lg px-3 py-2 text-sm text-gray-900 focus:outline-none focus:border-red-500">
+                {[7, 30, 90, 365].map(d => <option key={d} value={d}>Last {d} days</option>)}
+              </select>
+            </div>
             {!analytics ? (
               <div className="text-center py-20 text-gray-400">Loading analytics...</div>
             ) : (
@@ -757,9 +825,9 @@ const AdminDashboard = () => {
                   </div>
                 </div>
 
-                {/* Revenue Chart 30 days */}
+                {/* Revenue Chart */}
                 <div className="bg-white p-6 rounded-xl border border-gray-200 shadow-sm overflow-x-auto">
-                  <h3 className="font-bold text-gray-900 mb-4">Revenue — Last 30 Days</h3>
+                  <h3 className="font-bold text-gray-900 mb-4">Revenue — Last {analyticsDays} Days</h3>
                   <div className="h-64 min-w-[600px]">
                     <ResponsiveContainer width="100%" height="100%">
                       <AreaChart data={analytics.revenue_chart}>
@@ -776,7 +844,7 @@ const AdminDashboard = () => {
 
                 {/* User Growth Chart */}
                 <div className="bg-white p-6 rounded-xl border border-gray-200 shadow-sm overflow-x-auto">
-                  <h3 className="font-bold text-gray-900 mb-4">User Registrations — Last 30 Days</h3>
+                  <h3 className="font-bold text-gray-900 mb-4">User Registrations — Last {analyticsDays} Days</h3>
                   <div className="h-64 min-w-[600px]">
                     <ResponsiveContainer width="100%" height="100%">
                       <AreaChart data={analytics.growth}>
@@ -901,6 +969,7 @@ const AdminDashboard = () => {
                         <select className="w-full bg-white border border-gray-300 p-3 rounded text-gray-900 focus:border-red-600 outline-none transition" value={isEditModalOpen ? editingCourse.category : newCourse.category} onChange={e => isEditModalOpen ? setEditingCourse({...editingCourse, category: e.target.value}) : setNewCourse({...newCourse, category: e.target.value})}><option>HR</option><option>Development</option><option>Marketing</option><option>Business</option></select>
                       </div>
                       <input className="w-full bg-white border border-gray-300 p-3 rounded text-gray-900 focus:border-red-600 outline-none transition" type="number" placeholder="Price" value={isEditModalOpen ? editingCourse.price : newCourse.price} onChange={e => isEditModalOpen ? setEditingCourse({...editingCourse, price: parseFloat(e.target.value)}) : setNewCourse({...newCourse, price: parseFloat(e.target.value)})}/>
+                      <input className="w-full bg-white border border-gray-300 p-3 rounded text-gray-900 focus:border-red-600 outline-none transition" placeholder="Stripe Price ID (optional, e.g. price_...)" value={(isEditModalOpen ? editingCourse.stripe_price_id : newCourse.stripe_price_id) || ''} onChange={e => isEditModalOpen ? setEditingCourse({...editingCourse, stripe_price_id: e.target.value}) : setNewCourse({...newCourse, stripe_price_id: e.target.value})}/>
                       <textarea className="w-full bg-white border border-gray-300 p-3 rounded text-gray-900 focus:border-red-600 outline-none transition" rows="3" placeholder="Description" value={isEditModalOpen ? editingCourse.description : newCourse.description} onChange={e => isEditModalOpen ? setEditingCourse({...editingCourse, description: e.target.value}) : setNewCourse({...newCourse, description: e.target.value})}/>
                       <div className="border-t border-gray-100 pt-6">
                           <div className="flex justify-between items-center mb-4">
@@ -39,7 +39,7 @@ const Certificate = () => {
         }
 
         // 1. Get Course Info
-        const courseRes = await axios.get(`${API_BASE_URL}/api/courses`, {
+        const courseRes = await axios.get(`${API_BASE_URL}/api/courses?view=catalog`, {
             headers: { Authorization: `Bearer ${token}` }
         });
         const course = courseRes.data.find(c => c.id === parseInt(courseId));
@@ -73,7 +73,30 @@ const Certificate = () => {
     fetchData();
   }, [courseId, navigate]);
 
+  // Server-rendered PDF (cached per certificate); falls back to capturing
+  // the on-screen certificate if the server copy isn't available
   const handleDownload = async () => {
+    if (data.certId !== 'PENDING') {
+      try {
+        const res = await axios.get(`${API_BASE_URL}/api/certificates/${encodeURIComponent(data.certId)}/pdf`, {
+          headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+          responseType: 'blob'
+        });
+        const url = URL.createObjectURL(res.data);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = `Certificate_${user.name.replace(/\s+/g, '_')}.pdf`;
+        link.click();
+        URL.revokeObjectURL(url);
+        return;
+      } catch (error) {
+        console.error("Server certificate unavailable, rendering locally:", error);
+      }
+    }
+    await downloadRenderedCopy();
+  };
+
+  const downloadRenderedCopy = async () => {
     const element = certificateRef.current;
     const canvas = await html2canvas(element, { scale: 3, useCORS: true });
     const imgData = canvas.toDataURL('image/png');
@@ -25,7 +25,7 @@ const CourseView = () => {
   const fetchCourseData = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${API_BASE_URL}/api/courses`, {
+      const response = await axios.get(`${API_BASE_URL}/api/courses?view=catalog`, {
         headers: token ? { Authorization: `Bearer ${token}` } : {}
       });
       const found = response.data.find(c => c.id === parseInt(id));
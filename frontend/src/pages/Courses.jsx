@@ -31,7 +31,7 @@ const Courses = () => {
         const token = localStorage.getItem('token');
         
         // Fetch all courses
-        const coursesPromise = axios.get(`${API_BASE_URL}/api/courses`);
+        const coursesPromise = axios.get(`${API_BASE_URL}/api/courses?view=catalog`);
         
         // Fetch user enrollments if they are logged in and NOT an admin
         let enrollmentsPromise = Promise.resolve({ data: [] });
@@ -203,7 +203,7 @@ const Courses = () => {
                     <div className="flex items-center gap-4 text-gray-500 text-sm font-medium">
                       <div className="flex items-center gap-1.5">
                         <BookOpen size={16} className="text-red-600" />
-                        <span>{course.modules ? course.modules.length : 0} Modules</span>
+                        <span>{course.module_count || 0} Modules</span>
                       </div>
                       <div className="flex items-center gap-1.5">
                         <Clock size={16} className="text-red-600" />
@@ -32,7 +32,7 @@ const Home = () => {
 
   // Fetch courses so we can navigate directly to the right course page
   useEffect(() => {
-    fetch(`${import.meta.env.VITE_API_BASE_URL || 'https://api.aicoursehubpro.com'}/api/courses`)
+    fetch(`${import.meta.env.VITE_API_BASE_URL || 'https://api.aicoursehubpro.com'}/api/courses?view=catalog`)
       .then(r => r.json())
       .then(data => setCourses(Array.isArray(data) ? data : []))
       .catch(() => {});
@@ -22,7 +22,7 @@ const Pricing = () => {
     const fetchStats = async () => {
       try {
         // 1. Fetch total available courses
-        const coursesRes = await axios.get(`${API_BASE_URL}/api/courses`);
+        const coursesRes = await axios.get(`${API_BASE_URL}/api/courses?view=catalog`);
         setTotalCourses(coursesRes.data.length);
 
         // 2. Fetch owned courses if logged in and not an admin
@@ -60,7 +60,7 @@ const Dashboard = () => {
       const token = localStorage.getItem('token');
       if(!token) { navigate('/login'); return; }
 
-      const coursesRes = await axios.get(`${API_BASE_URL}/api/courses`, {
+      const coursesRes = await axios.get(`${API_BASE_URL}/api/courses?view=catalog`, {
         headers: { Authorization: `Bearer ${token}` }
       });
 